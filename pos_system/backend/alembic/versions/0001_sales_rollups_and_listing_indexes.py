@@ -0,0 +1,82 @@
+"""sales rollups and listing indexes
+
+Brings databases created by init_db() before migrations existed up to the
+current models: the sales rollup tables, the keyset listing indexes and
+fractional branch stock. Every step is skipped when already present, so it
+is also safe on a database created from the current models.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PAYMENT_METHODS = ("CASH", "CARD", "TRANSFER", "MIXED")
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "sales_rollups" not in existing:
+        payment_method = sa.Enum(*PAYMENT_METHODS, name="paymentmethod").with_variant(
+            postgresql.ENUM(*PAYMENT_METHODS, name="paymentmethod", create_type=False), "postgresql"
+        )
+        op.create_table(
+            "sales_rollups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("granularity", sa.String(10), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(), nullable=False),
+            sa.Column("branch_id", sa.Integer(), sa.ForeignKey("branches.id"), nullable=False),
+            sa.Column("cashier_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("payment_method", payment_method, nullable=False),
+            sa.Column("sale_count", sa.Integer()),
+            sa.Column("total_revenue", sa.Float()),
+            sa.Column("total_tax", sa.Float()),
+            sa.Column("total_discounts", sa.Float()),
+            sa.UniqueConstraint(
+                "granularity", "bucket_start", "branch_id", "cashier_id", "payment_method",
+                name="uq_sales_rollups_bucket"
+            ),
+        )
+
+    if "sales_rollup_state" not in existing:
+        op.create_table(
+            "sales_rollup_state",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("rebuilt_at", sa.DateTime()),
+            sa.Column("last_sale_id", sa.Integer(), nullable=True),
+        )
+
+    op.create_index("ix_sales_created_at_id", "sales", ["created_at", "id"], if_not_exists=True)
+    op.create_index("ix_products_name_id", "products", ["name", "id"], if_not_exists=True)
+    op.create_index("ix_users_created_at_id", "users", ["created_at", "id"], if_not_exists=True)
+
+    if op.get_bind().dialect.name == "postgresql":
+        # SQLite stores numbers by value and needs no change
+        op.alter_column("branch_products", "stock", type_=sa.Float(), existing_nullable=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column(
+            "branch_products", "stock", type_=sa.Integer(),
+            existing_nullable=True, postgresql_using="round(stock)::integer"
+        )
+
+    op.drop_index("ix_users_created_at_id", table_name="users", if_exists=True)
+    op.drop_index("ix_products_name_id", table_name="products", if_exists=True)
+    op.drop_index("ix_sales_created_at_id", table_name="sales", if_exists=True)
+    op.drop_table("sales_rollup_state")
+    op.drop_table("sales_rollups")
@@ -0,0 +1,53 @@
+"""sales query indexes
+
+Composite indexes for the sales listing filters (branch, cashier, customer,
+delivery person, status) in (created_at, id) order, a partial index for the
+open deliveries queue and the sale_items foreign key. Checked by
+python -m app.check_query_plans.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:01.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_DELIVERIES = "delivery_status IN ('PENDING', 'ASSIGNED')"
+
+SALES_INDEXES = {
+    "ix_sales_branch_created_at": ["branch_id", "created_at", "id"],
+    "ix_sales_cashier_created_at": ["cashier_id", "created_at", "id"],
+    "ix_sales_customer_created_at": ["customer_id", "created_at", "id"],
+    "ix_sales_delivery_person_created_at": ["delivery_person_id", "created_at", "id"],
+    "ix_sales_status_created_at": ["status", "created_at", "id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in SALES_INDEXES.items():
+        op.create_index(name, "sales", columns, if_not_exists=True)
+
+    op.create_index(
+        "ix_sales_open_deliveries", "sales", ["created_at", "id"],
+        sqlite_where=sa.text(OPEN_DELIVERIES),
+        postgresql_where=sa.text(OPEN_DELIVERIES),
+        if_not_exists=True
+    )
+    op.create_index("ix_sale_items_sale_id", "sale_items", ["sale_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sale_items_sale_id", table_name="sale_items", if_exists=True)
+    op.drop_index("ix_sales_open_deliveries", table_name="sales", if_exists=True)
+    for name in reversed(list(SALES_INDEXES)):
+        op.drop_index(name, table_name="sales", if_exists=True)
@@ -0,0 +1,104 @@
+"""product search
+
+SQLite: FTS5 table over product names with sync triggers, filled from the
+existing products. PostgreSQL: unaccent/pg_trgm, the pos_unaccent()
+wrapper and GIN trigram/tsvector indexes on the name, plus pattern indexes
+for SKU/barcode prefixes. See app.services.search.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:02.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        name, content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_search_insert AFTER INSERT ON products BEGIN
+        INSERT INTO product_search(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_search_delete AFTER DELETE ON products BEGIN
+        INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_search_update AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO product_search(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    "INSERT INTO product_search(product_search) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS products_search_update",
+    "DROP TRIGGER IF EXISTS products_search_delete",
+    "DROP TRIGGER IF EXISTS products_search_insert",
+    "DROP TABLE IF EXISTS product_search",
+]
+
+POSTGRESQL_UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION pos_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products
+    USING gin (pos_unaccent(lower(name)) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_products_name_tsv ON products
+    USING gin (to_tsvector('simple', pos_unaccent(lower(name))))
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_prefix ON products (sku text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_barcode_prefix ON products (barcode text_pattern_ops)",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_products_barcode_prefix",
+    "DROP INDEX IF EXISTS ix_products_sku_prefix",
+    "DROP INDEX IF EXISTS ix_products_name_tsv",
+    "DROP INDEX IF EXISTS ix_products_name_trgm",
+    "DROP FUNCTION IF EXISTS pos_unaccent(text)",
+]
+
+
+def _run(statements) -> None:
+    for statement in statements:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        _run(SQLITE_UPGRADE)
+    elif dialect == "postgresql":
+        _run(POSTGRESQL_UPGRADE)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        _run(SQLITE_DOWNGRADE)
+    elif dialect == "postgresql":
+        _run(POSTGRESQL_DOWNGRADE)
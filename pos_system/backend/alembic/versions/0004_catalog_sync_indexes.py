@@ -0,0 +1,42 @@
+"""catalog sync indexes
+
+updated_at and category_id indexes behind branch catalog versions and
+since= deltas, and the (branch_id, product_id) lookup of a product's stock
+row in a branch.
+See app.services.catalog.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:03.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_products_updated_at", "products", ["updated_at"], if_not_exists=True)
+    op.create_index("ix_products_category_id", "products", ["category_id"], if_not_exists=True)
+    op.create_index(
+        "ix_branch_products_branch_product", "branch_products", ["branch_id", "product_id"],
+        if_not_exists=True
+    )
+    op.create_index(
+        "ix_branch_products_branch_updated_at", "branch_products", ["branch_id", "updated_at"],
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_branch_products_branch_updated_at", table_name="branch_products", if_exists=True)
+    op.drop_index("ix_branch_products_branch_product", table_name="branch_products", if_exists=True)
+    op.drop_index("ix_products_category_id", table_name="products", if_exists=True)
+    op.drop_index("ix_products_updated_at", table_name="products", if_exists=True)
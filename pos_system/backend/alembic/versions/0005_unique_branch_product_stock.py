@@ -0,0 +1,35 @@
+"""unique branch stock rows
+
+Makes the (branch_id, product_id) index of branch_products unique, so
+bulk stock movements can upsert on it (ON CONFLICT). Duplicate rows must
+be merged before upgrading.
+See app.services.stock_import.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:04.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index("ix_branch_products_branch_product", table_name="branch_products", if_exists=True)
+    op.create_index(
+        "ix_branch_products_branch_product", "branch_products", ["branch_id", "product_id"],
+        unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_branch_products_branch_product", table_name="branch_products")
+    op.create_index("ix_branch_products_branch_product", "branch_products", ["branch_id", "product_id"])
@@ -0,0 +1,102 @@
+"""stock ledger
+
+Adds the append-only stock movement ledger and its per-branch snapshots,
+and gives every existing branch an opening snapshot of its current stock:
+stock at times before the upgrade is unknown, after it is the snapshot
+plus the movements since. Tables already created by init_db() are kept.
+See app.services.stock_ledger.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:05.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MOVEMENT_KINDS = ("SALE", "CANCEL", "RESTOCK", "ADJUSTMENT")
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "stock_movements" not in existing:
+        kind = sa.Enum(*MOVEMENT_KINDS, name="movementkind").with_variant(
+            postgresql.ENUM(*MOVEMENT_KINDS, name="movementkind"), "postgresql"
+        )
+        op.create_table(
+            "stock_movements",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("branch_id", sa.Integer(), sa.ForeignKey("branches.id"), nullable=False),
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), nullable=False),
+            sa.Column("kind", kind, nullable=False),
+            sa.Column("quantity", sa.Float(), nullable=False),
+            sa.Column("sale_id", sa.Integer(), nullable=True),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+    op.create_index(
+        "ix_stock_movements_branch_created_at", "stock_movements", ["branch_id", "created_at"],
+        if_not_exists=True
+    )
+    op.create_index(
+        "ix_stock_movements_branch_product_created_at", "stock_movements",
+        ["branch_id", "product_id", "created_at"], if_not_exists=True
+    )
+
+    if "stock_snapshots" not in existing:
+        op.create_table(
+            "stock_snapshots",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("branch_id", sa.Integer(), sa.ForeignKey("branches.id"), nullable=False),
+            sa.Column("taken_at", sa.DateTime(), nullable=False),
+            sa.Column("created_at", sa.DateTime()),
+        )
+    op.create_index(
+        "ix_stock_snapshots_branch_taken_at", "stock_snapshots", ["branch_id", "taken_at"],
+        unique=True, if_not_exists=True
+    )
+
+    if "stock_snapshot_items" not in existing:
+        op.create_table(
+            "stock_snapshot_items",
+            sa.Column("snapshot_id", sa.Integer(), sa.ForeignKey("stock_snapshots.id"), primary_key=True),
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id"), primary_key=True),
+            sa.Column("stock", sa.Float(), nullable=False),
+        )
+
+    # Opening snapshots of the branches that have none yet
+    now = sa.bindparam("now", datetime.utcnow(), type_=sa.DateTime())
+    op.execute(sa.text(
+        "INSERT INTO stock_snapshots (branch_id, taken_at, created_at) "
+        "SELECT id, :now, :now FROM branches "
+        "WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots WHERE stock_snapshots.branch_id = branches.id)"
+    ).bindparams(now))
+    op.execute(sa.text(
+        "INSERT INTO stock_snapshot_items (snapshot_id, product_id, stock) "
+        "SELECT stock_snapshots.id, branch_products.product_id, branch_products.stock "
+        "FROM stock_snapshots JOIN branch_products ON branch_products.branch_id = stock_snapshots.branch_id "
+        "WHERE stock_snapshots.taken_at = :now AND branch_products.stock <> 0"
+    ).bindparams(now))
+
+
+def downgrade() -> None:
+    op.drop_table("stock_snapshot_items")
+    op.drop_index("ix_stock_snapshots_branch_taken_at", table_name="stock_snapshots")
+    op.drop_table("stock_snapshots")
+    op.drop_index("ix_stock_movements_branch_product_created_at", table_name="stock_movements")
+    op.drop_index("ix_stock_movements_branch_created_at", table_name="stock_movements")
+    op.drop_table("stock_movements")
+    if op.get_bind().dialect.name == "postgresql":
+        sa.Enum(name="movementkind").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,35 @@
+"""user token version
+
+Adds users.token_version, bumped on deactivation, password or profile
+change, so every worker stops trusting a user's earlier stateless tokens
+(AUTH_STATELESS_TOKENS), not only the one that made the change. A column
+already created by init_db() is kept.
+See app.core.tokens.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:06.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    if "token_version" not in columns:
+        op.add_column("users", sa.Column("token_version", sa.Integer(), server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("token_version")
@@ -9,12 +9,13 @@ from app.db.session import get_db
 from app.models.user import User
 from app.schemas.user import LoginRequest, LoginResponse, UserDetailResponse, Token
 from app.core.security import (
-    verify_password, 
+    verify_password_async, 
     create_access_token, 
     get_current_user,
-    get_password_hash
+    token_claims
 )
 from app.core.config import settings
+from app.core.principal import principal_cache
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -37,8 +38,10 @@ async def login(
         )
     )
     user = result.scalar_one_or_none()
+    # Give the connection back to the pool while the password is checked
+    await db.commit()
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user or not await verify_password_async(login_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
@@ -54,10 +57,11 @@ async def login(
     # Update last login
     user.last_login = datetime.utcnow()
     await db.commit()
+    principal_cache.invalidate_user(user.id)
     
     # Create access token
     access_token = create_access_token(
-        data={"sub": str(user.id)},
+        data=token_claims(user),
         expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     
@@ -106,8 +110,10 @@ async def login_form(
         )
     )
     user = result.scalar_one_or_none()
+    # Give the connection back to the pool while the password is checked
+    await db.commit()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
@@ -122,9 +128,10 @@ async def login_form(
     
     user.last_login = datetime.utcnow()
     await db.commit()
+    principal_cache.invalidate_user(user.id)
     
     access_token = create_access_token(
-        data={"sub": str(user.id)},
+        data=token_claims(user),
         expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     
@@ -167,7 +174,7 @@ async def refresh_token(
     Refresh access token
     """
     access_token = create_access_token(
-        data={"sub": str(current_user.id)},
+        data=token_claims(current_user),
         expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     
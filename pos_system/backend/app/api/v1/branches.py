@@ -1,18 +1,28 @@
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.db.session import get_db
+from app.db.session import AsyncSessionLocal, get_db
 from app.models.user import User
 from app.models.branch import Branch, BranchProduct
 from app.models.product import Product
+from app.models.stock import MovementKind, StockMovement
 from app.schemas.branch import (
     BranchCreate, BranchUpdate, BranchResponse,
     BranchProductCreate, BranchProductUpdate, BranchProductResponse,
-    StockUpdateRequest
+    StockUpdateRequest, StockMovementRow, StockMovementResult,
+    StockLedgerEntry, StockAtResponse, LowStockItem
 )
-from app.core.security import get_current_user, require_roles
+from app.core.security import get_current_user, require_roles, get_read_db
+from app.core.serialization import projection, rows_response
+from app.services.stock import InsufficientStockError, adjust_stock
+from app.services.ingest import csv_rows, json_rows
+from app.services.low_stock import low_stock, reorder_quantity, stage_levels
+from app.services.stock_import import import_stock_movements
+from app.services.stock_ledger import NoStockHistoryError, record_movements, stock_at, take_snapshot
 
 router = APIRouter(prefix="/branches", tags=["Branches"])
 
@@ -23,12 +33,12 @@ async def get_branches(
     limit: int = Query(100, ge=1, le=100),
     is_active: Optional[bool] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all branches
     """
-    query = select(Branch)
+    query = select(*projection(BranchResponse, Branch))
     
     if is_active is not None:
         query = query.where(Branch.is_active == is_active)
@@ -36,14 +46,14 @@ async def get_branches(
     query = query.offset(skip).limit(limit).order_by(Branch.name)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    return rows_response(BranchResponse, result.all())
 
 
 @router.get("/{branch_id}", response_model=BranchResponse)
 async def get_branch(
     branch_id: int,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get branch by ID
@@ -79,6 +89,10 @@ async def create_branch(
     
     branch = Branch(**branch_data.model_dump())
     db.add(branch)
+    await db.flush()
+    
+    # Opening (empty) snapshot: the ledger covers the branch from the start
+    await take_snapshot(db, branch.id, datetime.utcnow())
     await db.commit()
     await db.refresh(branch)
     
@@ -145,18 +159,112 @@ async def get_branch_inventory(
     branch_id: int,
     low_stock: bool = False,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get branch inventory
     """
-    query = select(BranchProduct).where(BranchProduct.branch_id == branch_id)
+    query = select(*projection(BranchProductResponse, BranchProduct)).where(BranchProduct.branch_id == branch_id)
     
     if low_stock:
         query = query.where(BranchProduct.stock <= BranchProduct.min_stock)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    return rows_response(BranchProductResponse, result.all())
+
+
+@router.get("/{branch_id}/inventory/low-stock", response_model=List[LowStockItem])
+async def get_low_stock(
+    branch_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Products of a branch at or below their minimum stock, with the quantity
+    to reorder to bring each back to its maximum. Kept up to date by the
+    stock writes themselves, so this does not scan the inventory; subscribe
+    to .../low-stock/stream to be notified instead of polling.
+    """
+    items = await low_stock.items(db, branch_id)
+    return rows_response(LowStockItem, [
+        (product_id, level.stock, level.min_stock, level.max_stock, reorder_quantity(level))
+        for product_id, level in sorted(items.items())
+    ])
+
+
+@router.get("/{branch_id}/inventory/low-stock/stream", response_class=StreamingResponse)
+async def stream_low_stock(
+    branch_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Low-stock alerts of a branch as server-sent events: a snapshot event
+    with every low product first, then low (fell to its minimum), restored
+    (restocked above it) and changed events as sales, cancellations and
+    stock updates commit, each with its reorder_quantity.
+    """
+    return StreamingResponse(
+        low_stock.stream(branch_id, AsyncSessionLocal, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{branch_id}/inventory/movements", response_model=List[StockLedgerEntry])
+async def get_stock_movements(
+    branch_id: int,
+    product_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Stock movement ledger of a branch (sales, cancellations, restocks and
+    adjustments), newest first
+    """
+    query = select(*projection(StockLedgerEntry, StockMovement)).where(StockMovement.branch_id == branch_id)
+    
+    if product_id:
+        query = query.where(StockMovement.product_id == product_id)
+    if date_from:
+        query = query.where(StockMovement.created_at >= date_from)
+    if date_to:
+        query = query.where(StockMovement.created_at <= date_to)
+    
+    query = query.order_by(StockMovement.created_at.desc(), StockMovement.id.desc()).offset(skip).limit(limit)
+    
+    result = await db.execute(query)
+    return rows_response(StockLedgerEntry, result.all())
+
+
+@router.get("/{branch_id}/inventory/at", response_model=List[StockAtResponse])
+async def get_stock_at(
+    branch_id: int,
+    at: datetime = Query(..., description="Fecha y hora (UTC) del stock a consultar"),
+    product_id: Optional[List[int]] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Branch stock at a past date and time (e.g. at yesterday's close), from
+    the latest ledger snapshot before it plus the movements since. Products
+    with no stock then are left out unless asked for with product_id.
+    """
+    try:
+        stock = await stock_at(db, branch_id, at, product_id)
+    except NoStockHistoryError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay historial de stock de la sucursal para esa fecha"
+        )
+    
+    if product_id:
+        stock = {requested: stock.get(requested, 0.0) for requested in product_id}
+    return rows_response(StockAtResponse, sorted(stock.items()))
 
 
 @router.post("/{branch_id}/inventory", response_model=BranchProductResponse, status_code=status.HTTP_201_CREATED)
@@ -192,6 +300,10 @@ async def add_product_to_branch(
         is_available=data.is_available
     )
     db.add(branch_product)
+    stage_levels(db, branch_id, [(data.product_id, data.stock, data.min_stock, data.max_stock)])
+    await record_movements(
+        db, branch_id, MovementKind.RESTOCK, {data.product_id: data.stock}, user_id=current_user.id
+    )
     await db.commit()
     await db.refresh(branch_product)
     
@@ -210,32 +322,88 @@ async def update_stock(
     Update product stock in branch
     """
     result = await db.execute(
-        select(BranchProduct).where(
+        select(BranchProduct, Product)
+        .join(Product, Product.id == BranchProduct.product_id)
+        .where(
             (BranchProduct.branch_id == branch_id) &
             (BranchProduct.product_id == product_id)
         )
     )
-    branch_product = result.scalar_one_or_none()
+    row = result.one_or_none()
     
-    if not branch_product:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado en esta sucursal"
         )
+    branch_product, product = row
     
-    new_stock = branch_product.stock + data.quantity
-    if new_stock < 0:
+    if not product.allow_decimal_qty and data.quantity != int(data.quantity):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="El stock no puede ser negativo"
+            detail=f"{product.name} no admite cantidades fraccionarias"
         )
     
-    branch_product.stock = new_stock
-    if data.quantity > 0:
-        from datetime import datetime
-        branch_product.last_restock = datetime.utcnow()
+    try:
+        await adjust_stock(db, branch_id, product_id, data.quantity, user_id=current_user.id)
+    except InsufficientStockError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El stock no puede ser negativo"
+        )
     
     await db.commit()
     await db.refresh(branch_product)
     
     return branch_product
+
+
+@router.post(
+    "/{branch_id}/inventory/movements",
+    response_model=StockMovementResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {
+                    "type": "object",
+                    "properties": {"movements": {"type": "array", "items": StockMovementRow.model_json_schema()}},
+                }},
+                "text/csv": {"schema": {"type": "string", "example": "product_id,delta,stock,min_stock,max_stock,custom_price\n1,24,,,,\n2,,50,10,200,"}},
+            },
+        }
+    }
+)
+async def apply_stock_movements(
+    branch_id: int,
+    request: Request,
+    current_user: User = Depends(require_roles("admin", "superadmin")),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Apply a batch of stock movements (delivery receipt, physical count) to
+    branch inventory in one transaction. Each row has a delta or an
+    absolute stock, and optionally min/max stock, custom price and
+    availability. Send {"movements": [...]} as JSON or stream a CSV file
+    (Content-Type: text/csv) with those columns as its header. Rows that
+    fail are listed in errors; the rest are applied.
+    """
+    result = await db.execute(select(Branch.id).where(Branch.id == branch_id))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sucursal no encontrada"
+        )
+    
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        rows = csv_rows(request.stream())
+    else:
+        try:
+            rows = json_rows(await request.body(), "movements")
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Se esperaba JSON con una lista de movimientos o un archivo CSV"
+            )
+    
+    return await import_stock_movements(db, branch_id, rows, user_id=current_user.id)
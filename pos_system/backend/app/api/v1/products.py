@@ -1,5 +1,5 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_
 
@@ -7,12 +7,24 @@ from app.db.session import get_db
 from app.models.user import User
 from app.models.product import Product, Category
 from app.models.branch import BranchProduct
+from app.models.loading import load_profile
 from app.schemas.product import (
     CategoryCreate, CategoryUpdate, CategoryResponse,
     ProductCreate, ProductUpdate, ProductResponse, 
-    ProductDetailResponse, ProductWithStockResponse
+    ProductDetailResponse, ProductWithStockResponse, BranchCatalogResponse,
+    ProductImportRow, ProductImportResult
+)
+from app.core.security import get_current_user, require_roles, get_read_db
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_after, set_next_cursor
+from app.core.serialization import json_response, projection, rows_response
+from app.services.search import product_matches
+from app.services.barcodes import barcode_index, lookup_code
+from app.services.ingest import csv_rows, json_rows, ndjson_rows
+from app.services.product_import import import_products
+from app.services.catalog import (
+    InvalidCatalogVersion, catalog_delta, catalog_snapshot, catalog_version, product_with_stock,
+    snapshot_cache, version_settled
 )
-from app.core.security import get_current_user, require_roles
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -23,12 +35,12 @@ router = APIRouter(prefix="/products", tags=["Products"])
 async def get_categories(
     is_active: Optional[bool] = True,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all categories
     """
-    query = select(Category)
+    query = select(*projection(CategoryResponse, Category))
     
     if is_active is not None:
         query = query.where(Category.is_active == is_active)
@@ -36,7 +48,7 @@ async def get_categories(
     query = query.order_by(Category.sort_order, Category.name)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    return rows_response(CategoryResponse, result.all())
 
 
 @router.post("/categories", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
@@ -89,6 +101,8 @@ async def update_category(
     
     await db.commit()
     await db.refresh(category)
+    # Scanner responses embed the category
+    barcode_index.clear()
     
     return category
 
@@ -113,6 +127,7 @@ async def delete_category(
     
     category.is_active = False
     await db.commit()
+    barcode_index.clear()
     
     return None
 
@@ -121,19 +136,24 @@ async def delete_category(
 
 @router.get("/", response_model=List[ProductResponse])
 async def get_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     category_id: Optional[int] = None,
     is_active: Optional[bool] = True,
     is_featured: Optional[bool] = None,
     search: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get all products
+    Get all products by name, or by relevance when searching. Pass the
+    X-Next-Cursor header of a page as cursor to get the next one (keyset
+    pagination, skip ignored).
     """
-    query = select(Product)
+    query = select(*projection(ProductResponse, Product))
+    order = (Product.name, Product.id)
     
     if category_id:
         query = query.where(Product.category_id == category_id)
@@ -144,48 +164,49 @@ async def get_products(
     if is_featured is not None:
         query = query.where(Product.is_featured == is_featured)
     
-    if search:
-        search_filter = f"%{search}%"
-        query = query.where(
-            or_(
-                Product.name.ilike(search_filter),
-                Product.sku.ilike(search_filter),
-                Product.barcode.ilike(search_filter)
-            )
-        )
+    matches = product_matches(db.get_bind().dialect.name, search) if search else None
+    if matches is not None:
+        query = query.join(matches, matches.c.product_id == Product.id).add_columns(matches.c.rank)
+        order = (matches.c.rank, Product.name, Product.id)
     
-    query = query.offset(skip).limit(limit).order_by(Product.name)
+    if cursor:
+        types = (int, str, int) if matches is not None else (str, int)
+        query = query.where(keyset_after(order, decode_cursor(cursor, types)))
+    else:
+        query = query.offset(skip)
+    
+    query = query.limit(limit).order_by(*order)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    rows = result.all()
+    if matches is None:
+        set_next_cursor(response, rows, limit, ("name", "id"))
+    elif len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor((rows[-1].rank, rows[-1].name, rows[-1].id))
+    return rows_response(ProductResponse, rows, headers=response.headers)
 
 
 @router.get("/by-barcode/{barcode}", response_model=ProductDetailResponse)
 async def get_product_by_barcode(
     barcode: str,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db),
+    primary_db: AsyncSession = Depends(get_db)
 ):
     """
-    Get product by barcode (for scanner)
+    Get product by barcode or SKU (for scanner), served from the in-memory
+    barcode index when possible (and filled from the primary)
     """
-    result = await db.execute(
-        select(Product).where(
-            or_(Product.barcode == barcode, Product.sku == barcode)
-        )
-    )
-    product = result.scalar_one_or_none()
+    body = await lookup_code(db, barcode, primary_db=primary_db)
     
-    if not product:
+    if body is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado"
         )
     
-    return ProductDetailResponse(
-        **product.__dict__,
-        price_with_tax=product.price_with_tax
-    )
+    # Already serialized with ProductDetailResponse
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/branch/{branch_id}", response_model=List[ProductWithStockResponse])
@@ -195,12 +216,12 @@ async def get_products_with_stock(
     search: Optional[str] = None,
     available_only: bool = True,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get products with stock info for specific branch
     """
-    query = select(Product, BranchProduct).outerjoin(
+    query = select(Product, BranchProduct).options(*load_profile("product.detail")).outerjoin(
         BranchProduct,
         (Product.id == BranchProduct.product_id) & (BranchProduct.branch_id == branch_id)
     ).where(Product.is_active == True)
@@ -208,15 +229,10 @@ async def get_products_with_stock(
     if category_id:
         query = query.where(Product.category_id == category_id)
     
-    if search:
-        search_filter = f"%{search}%"
-        query = query.where(
-            or_(
-                Product.name.ilike(search_filter),
-                Product.sku.ilike(search_filter),
-                Product.barcode.ilike(search_filter)
-            )
-        )
+    matches = product_matches(db.get_bind().dialect.name, search) if search else None
+    if matches is not None:
+        # Best matches first
+        query = query.join(matches, matches.c.product_id == Product.id).order_by(matches.c.rank, Product.name)
     
     if available_only:
         query = query.where(
@@ -227,46 +243,65 @@ async def get_products_with_stock(
         )
     
     result = await db.execute(query)
-    products = []
-    
-    for product, branch_product in result.fetchall():
-        products.append(ProductWithStockResponse(
-            id=product.id,
-            sku=product.sku,
-            barcode=product.barcode,
-            name=product.name,
-            description=product.description,
-            price=product.price,
-            cost=product.cost,
-            tax_rate=product.tax_rate,
-            category_id=product.category_id,
-            unit=product.unit,
-            image_url=product.image_url,
-            allow_decimal_qty=product.allow_decimal_qty,
-            is_active=product.is_active,
-            is_featured=product.is_featured,
-            created_at=product.created_at,
-            updated_at=product.updated_at,
-            category=product.category,
-            price_with_tax=product.price_with_tax,
-            stock=branch_product.stock if branch_product else 0,
-            branch_price=branch_product.custom_price if branch_product else None,
-            is_available=branch_product.is_available if branch_product else True
-        ))
-    
-    return products
+    
+    return json_response(
+        List[ProductWithStockResponse],
+        [product_with_stock(product, branch_product) for product, branch_product in result.fetchall()]
+    )
+
+
+@router.get("/branch/{branch_id}/catalog", response_model=BranchCatalogResponse)
+async def get_branch_catalog(
+    branch_id: int,
+    request: Request,
+    since: Optional[str] = Query(None, description="Versión del catálogo que ya tiene la caja"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Catalog of a branch for offline tills. Without since, every active
+    product with its stock (ETag = catalog version, 304 when unchanged);
+    with since, only the products changed after that version.
+    """
+    version = await catalog_version(db, branch_id)
+    etag = f'"{branch_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    # A version younger than the overlap window may still gain late commits
+    settled = version_settled(version)
+    if settled and (since == version or (since is None and request.headers.get("if-none-match") == etag)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if since is None:
+        body = snapshot_cache.get(branch_id, version) if settled else None
+        if body is None:
+            body = (await catalog_snapshot(db, branch_id, version)).model_dump_json().encode()
+            if settled:
+                snapshot_cache.set(branch_id, version, body)
+    else:
+        try:
+            body = (await catalog_delta(db, branch_id, since, version)).model_dump_json().encode()
+        except InvalidCatalogVersion:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Versión de catálogo inválida"
+            )
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/{product_id}", response_model=ProductDetailResponse)
 async def get_product(
     product_id: int,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get product by ID
     """
-    result = await db.execute(select(Product).where(Product.id == product_id))
+    result = await db.execute(
+        select(Product).options(*load_profile("product.detail")).where(Product.id == product_id)
+    )
     product = result.scalar_one_or_none()
     
     if not product:
@@ -311,10 +346,62 @@ async def create_product(
     db.add(product)
     await db.commit()
     await db.refresh(product)
+    barcode_index.invalidate_product(product.id)
     
     return product
 
 
+@router.post(
+    "/import",
+    response_model=ProductImportResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string", "example": "sku,barcode,name,price,cost,category\nBEB010,7501234567999,Agua Mineral 600ml,15,8,bebidas"}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "application/json": {"schema": {
+                    "type": "object",
+                    "properties": {"products": {"type": "array", "items": ProductImportRow.model_json_schema()}},
+                }},
+            },
+        }
+    }
+)
+async def import_product_catalog(
+    request: Request,
+    current_user: User = Depends(require_roles("admin", "superadmin")),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create or update products by SKU from a catalog file (Admin only).
+    Stream a CSV (Content-Type: text/csv) or NDJSON (application/x-ndjson)
+    file, or send {"products": [...]} as JSON. Each row names a category by
+    slug (category) or id (category_id); fields left out keep their current
+    value. Rows that fail are listed in errors; the rest are applied.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("text/csv"):
+        rows = csv_rows(request.stream())
+    elif content_type.startswith("application/x-ndjson"):
+        rows = ndjson_rows(request.stream())
+    else:
+        try:
+            rows = json_rows(await request.body(), "products")
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Se esperaba JSON con una lista de productos o un archivo CSV o NDJSON"
+            )
+    
+    state = await import_products(db, rows)
+    await db.commit()
+    for product_id in state.updated_ids:
+        barcode_index.invalidate_product(product_id)
+    
+    return state.result()
+
+
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
@@ -340,6 +427,7 @@ async def update_product(
     
     await db.commit()
     await db.refresh(product)
+    barcode_index.invalidate_product(product.id)
     
     return product
 
@@ -364,5 +452,6 @@ async def delete_product(
     
     product.is_active = False
     await db.commit()
+    barcode_index.invalidate_product(product.id)
     
     return None
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,6 +11,8 @@ from app.schemas.role import (
     RoleCreate, RoleUpdate, RoleResponse, RoleDetailResponse,
     PermissionCreate, PermissionResponse, RolePermissionUpdate
 )
+from app.core.principal import principal_cache
+from app.core.tokens import role_versions
 from app.core.security import require_roles
 
 router = APIRouter(prefix="/roles", tags=["Roles & Permissions"])
@@ -161,8 +164,9 @@ async def update_role(
     for field, value in update_data.items():
         setattr(role, field, value)
     
-    # Update permissions if provided
+    # Update permissions if provided (bumping the role's permission version)
     if permission_ids is not None:
+        role.updated_at = datetime.utcnow()
         await db.execute(
             role_permissions.delete().where(role_permissions.c.role_id == role_id)
         )
@@ -172,7 +176,9 @@ async def update_role(
             )
     
     await db.commit()
+    principal_cache.invalidate_role(role_id)
     await db.refresh(role)
+    role_versions.bump(role_id, role.updated_at)
     
     return role
 
@@ -196,6 +202,9 @@ async def update_role_permissions(
             detail="Rol no encontrado"
         )
     
+    # Bump the role's permission version
+    role.updated_at = datetime.utcnow()
+    
     # Clear existing permissions
     await db.execute(
         role_permissions.delete().where(role_permissions.c.role_id == role_id)
@@ -208,7 +217,9 @@ async def update_role_permissions(
         )
     
     await db.commit()
+    principal_cache.invalidate_role(role_id)
     await db.refresh(role)
+    role_versions.bump(role_id, role.updated_at)
     
     return role
 
@@ -246,5 +257,7 @@ async def delete_role(
     
     await db.delete(role)
     await db.commit()
+    principal_cache.invalidate_role(role_id)
+    role_versions.forget(role_id)
     
     return None
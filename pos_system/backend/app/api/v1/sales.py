@@ -1,21 +1,31 @@
 from datetime import datetime
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, update
+from sqlalchemy.orm.attributes import set_committed_value
 import uuid
 
-from app.db.session import get_db
+from app.db.session import get_db, read_session_factory
 from app.models.user import User
-from app.models.sale import Sale, SaleItem, SaleStatus, DeliveryStatus, PaymentMethod
+from app.models.sale import Sale, SaleItem, SaleStatus, DeliveryStatus, PaymentMethod, open_delivery_clause
 from app.models.product import Product
 from app.models.branch import Branch, BranchProduct
+from app.models.loading import load_profile
 from app.schemas.sale import (
     SaleCreate, SaleUpdate, SaleResponse, SaleDetailResponse,
     DeliveryAssignRequest, DeliveryUpdateRequest,
-    SaleStatusEnum, DeliveryStatusEnum
+    SaleStatusEnum, DeliveryStatusEnum,
+    ColumnarExportRequest, ColumnarExportResponse
 )
-from app.core.security import get_current_user, require_roles
+from app.core.security import get_current_user, require_roles, require_permissions, get_read_db
+from app.core.pagination import decode_cursor, keyset_after, set_next_cursor
+from app.core.serialization import json_response, projection, rows_response
+from app.services.stock import InsufficientStockError, reserve_stock, release_stock
+from app.services.rollups import record_sale, remove_sale, summarize_sales
+from app.services.exports import ExportFormat, MEDIA_TYPES, export_filename, stream_sales
+from app.services.analytics import export_columnar
 
 router = APIRouter(prefix="/sales", tags=["Sales"])
 
@@ -23,36 +33,31 @@ router = APIRouter(prefix="/sales", tags=["Sales"])
 def generate_sale_number(branch_code: str) -> str:
     """Generate unique sale number"""
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    unique_id = str(uuid.uuid4())[:4].upper()
+    unique_id = uuid.uuid4().hex[:8].upper()
     return f"{branch_code}-{timestamp}-{unique_id}"
 
 
-@router.get("/", response_model=List[SaleResponse])
-async def get_sales(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=500),
+def sales_list_query(
+    role_name: str,
+    user_id: int,
     branch_id: Optional[int] = None,
     cashier_id: Optional[int] = None,
     customer_id: Optional[int] = None,
     status: Optional[SaleStatusEnum] = None,
     delivery_status: Optional[DeliveryStatusEnum] = None,
     date_from: Optional[datetime] = None,
-    date_to: Optional[datetime] = None,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    date_to: Optional[datetime] = None
 ):
-    """
-    Get sales with filters
-    """
+    """Sales listing visible to a user's role, newest first (no paging)"""
     query = select(Sale)
     
     # Filter by user role
-    if current_user.role.name == "cashier":
-        query = query.where(Sale.cashier_id == current_user.id)
-    elif current_user.role.name == "delivery":
-        query = query.where(Sale.delivery_person_id == current_user.id)
-    elif current_user.role.name == "customer":
-        query = query.where(Sale.customer_id == current_user.id)
+    if role_name == "cashier":
+        query = query.where(Sale.cashier_id == user_id)
+    elif role_name == "delivery":
+        query = query.where(Sale.delivery_person_id == user_id)
+    elif role_name == "customer":
+        query = query.where(Sale.customer_id == user_id)
     else:
         # Admin can filter by any field
         if branch_id:
@@ -74,22 +79,101 @@ async def get_sales(
     if date_to:
         query = query.where(Sale.created_at <= date_to)
     
-    query = query.offset(skip).limit(limit).order_by(Sale.created_at.desc())
+    return query.order_by(Sale.created_at.desc(), Sale.id.desc())
+
+
+@router.get("/", response_model=List[SaleResponse])
+async def get_sales(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    branch_id: Optional[int] = None,
+    cashier_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    status: Optional[SaleStatusEnum] = None,
+    delivery_status: Optional[DeliveryStatusEnum] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get sales with filters, newest first. Pass the X-Next-Cursor header of
+    a page as cursor to get the next one (keyset pagination, skip ignored).
+    """
+    query = sales_list_query(
+        current_user.role.name, current_user.id,
+        branch_id=branch_id,
+        cashier_id=cashier_id,
+        customer_id=customer_id,
+        status=status,
+        delivery_status=delivery_status,
+        date_from=date_from,
+        date_to=date_to
+    )
+    
+    if cursor:
+        query = query.where(
+            keyset_after((Sale.created_at, Sale.id), decode_cursor(cursor, (datetime, int)), descending=True)
+        )
+    else:
+        query = query.offset(skip)
+    
+    query = query.with_only_columns(*projection(SaleResponse, Sale)).limit(limit)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    sales = result.all()
+    set_next_cursor(response, sales, limit, ("created_at", "id"))
+    return rows_response(SaleResponse, sales, headers=response.headers)
+
+
+@router.get("/export")
+async def export_sales(
+    format: ExportFormat = "csv",
+    branch_id: Optional[int] = None,
+    cashier_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    status: Optional[SaleStatusEnum] = None,
+    delivery_status: Optional[DeliveryStatusEnum] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user: User = Depends(require_permissions("reports.export"))
+):
+    """
+    Export every sale matching the filters of the sales listing as CSV or
+    NDJSON, streamed while it is read (no row limit)
+    """
+    query = sales_list_query(
+        current_user.role.name, current_user.id,
+        branch_id=branch_id,
+        cashier_id=cashier_id,
+        customer_id=customer_id,
+        status=status,
+        delivery_status=delivery_status,
+        date_from=date_from,
+        date_to=date_to
+    )
+    
+    return StreamingResponse(
+        stream_sales(query, format, read_session_factory(current_user.id)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    )
 
 
 @router.get("/{sale_id}", response_model=SaleDetailResponse)
 async def get_sale(
     sale_id: int,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get sale by ID with details
     """
-    result = await db.execute(select(Sale).where(Sale.id == sale_id))
+    result = await db.execute(
+        select(Sale).options(*load_profile("sale.detail")).where(Sale.id == sale_id)
+    )
     sale = result.scalar_one_or_none()
     
     if not sale:
@@ -107,34 +191,7 @@ async def get_sale(
         if current_user.role.name == "customer" and sale.customer_id != current_user.id:
             raise HTTPException(status_code=403, detail="No tienes acceso a esta venta")
     
-    return SaleDetailResponse(
-        id=sale.id,
-        sale_number=sale.sale_number,
-        branch_id=sale.branch_id,
-        cashier_id=sale.cashier_id,
-        customer_id=sale.customer_id,
-        delivery_person_id=sale.delivery_person_id,
-        subtotal=sale.subtotal,
-        tax_amount=sale.tax_amount,
-        discount_amount=sale.discount_amount,
-        total=sale.total,
-        payment_method=sale.payment_method,
-        amount_received=sale.amount_received,
-        change_given=sale.change_given,
-        status=sale.status,
-        delivery_status=sale.delivery_status,
-        delivery_address=sale.delivery_address,
-        delivery_notes=sale.delivery_notes,
-        notes=sale.notes,
-        created_at=sale.created_at,
-        completed_at=sale.completed_at,
-        delivered_at=sale.delivered_at,
-        items=sale.items,
-        branch_name=sale.branch.name if sale.branch else None,
-        cashier_name=sale.cashier.full_name if sale.cashier else None,
-        customer_name=sale.customer.full_name if sale.customer else None,
-        delivery_person_name=sale.delivery_person.full_name if sale.delivery_person else None
-    )
+    return json_response(SaleDetailResponse, sale)
 
 
 @router.post("/", response_model=SaleDetailResponse, status_code=status.HTTP_201_CREATED)
@@ -156,40 +213,44 @@ async def create_sale(
             detail="Sucursal no encontrada"
         )
     
-    # Process items and calculate totals
-    subtotal = 0
-    tax_amount = 0
-    discount_amount = 0
-    sale_items = []
+    # Load every product in the basket with its branch stock row at once
+    product_ids = {item.product_id for item in sale_data.items}
+    rows = await db.execute(
+        select(Product, BranchProduct)
+        .outerjoin(
+            BranchProduct,
+            (BranchProduct.product_id == Product.id) &
+            (BranchProduct.branch_id == sale_data.branch_id)
+        )
+        .where(Product.id.in_(product_ids))
+    )
+    catalog = {product.id: (product, branch_product) for product, branch_product in rows.all()}
     
+    # Basket total per product (a product may repeat)
+    requested = {}
     for item_data in sale_data.items:
-        # Get product
-        product_result = await db.execute(select(Product).where(Product.id == item_data.product_id))
-        product = product_result.scalar_one_or_none()
-        
-        if not product:
+        if item_data.product_id not in catalog:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Producto {item_data.product_id} no encontrado"
             )
-        
-        # Get branch-specific stock
-        bp_result = await db.execute(
-            select(BranchProduct).where(
-                (BranchProduct.branch_id == sale_data.branch_id) &
-                (BranchProduct.product_id == item_data.product_id)
-            )
-        )
-        branch_product = bp_result.scalar_one_or_none()
-        
-        # Check stock
-        if branch_product and branch_product.stock < item_data.quantity:
+        product = catalog[item_data.product_id][0]
+        if not product.allow_decimal_qty and item_data.quantity != int(item_data.quantity):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Stock insuficiente para {product.name}. Disponible: {branch_product.stock}"
+                detail=f"{product.name} no admite cantidades fraccionarias"
             )
+        requested[item_data.product_id] = requested.get(item_data.product_id, 0) + item_data.quantity
+    
+    # Calculate line and sale totals in a single pass
+    subtotal = 0
+    tax_amount = 0
+    discount_amount = 0
+    item_rows = []
+    
+    for item_data in sale_data.items:
+        product, branch_product = catalog[item_data.product_id]
         
-        # Calculate item totals
         unit_price = branch_product.custom_price if (branch_product and branch_product.custom_price) else product.price
         item_subtotal = unit_price * item_data.quantity
         item_tax = item_subtotal * product.tax_rate
@@ -200,24 +261,18 @@ async def create_sale(
         tax_amount += item_tax
         discount_amount += item_discount
         
-        # Create sale item
-        sale_item = SaleItem(
-            product_id=product.id,
-            quantity=item_data.quantity,
-            unit_price=unit_price,
-            tax_rate=product.tax_rate,
-            discount=item_discount,
-            subtotal=item_subtotal,
-            tax_amount=item_tax,
-            total=item_total,
-            product_name=product.name,
-            product_sku=product.sku
-        )
-        sale_items.append(sale_item)
-        
-        # Update stock
-        if branch_product:
-            branch_product.stock -= int(item_data.quantity)
+        item_rows.append({
+            "product_id": product.id,
+            "quantity": item_data.quantity,
+            "unit_price": unit_price,
+            "tax_rate": product.tax_rate,
+            "discount": item_discount,
+            "subtotal": item_subtotal,
+            "tax_amount": item_tax,
+            "total": item_total,
+            "product_name": product.name,
+            "product_sku": product.sku
+        })
     
     total = subtotal + tax_amount - discount_amount
     
@@ -245,40 +300,35 @@ async def create_sale(
     db.add(sale)
     await db.flush()
     
-    # Link items to sale
-    for item in sale_items:
-        item.sale_id = sale.id
-        db.add(item)
+    # Take stock for the whole basket atomically, recorded in the ledger
+    # under the sale (a failure rolls the sale back with it)
+    try:
+        await reserve_stock(db, sale_data.branch_id, requested, sale_id=sale.id, user_id=current_user.id)
+    except InsufficientStockError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Stock insuficiente para {catalog[e.product_id][0].name}. Disponible: {e.available:g}"
+        )
+    
+    # Persist all lines with one executemany INSERT, then read them back
+    # in a single query (RETURNING with ordered rows is per-row on SQLite)
+    for row in item_rows:
+        row["sale_id"] = sale.id
+    await db.execute(insert(SaleItem), item_rows)
+    items_result = await db.scalars(
+        select(SaleItem).where(SaleItem.sale_id == sale.id).order_by(SaleItem.id)
+    )
+    sale_items = items_result.all()
+    
+    await record_sale(db, sale)
     
     await db.commit()
-    await db.refresh(sale)
     
-    return SaleDetailResponse(
-        id=sale.id,
-        sale_number=sale.sale_number,
-        branch_id=sale.branch_id,
-        cashier_id=sale.cashier_id,
-        customer_id=sale.customer_id,
-        delivery_person_id=sale.delivery_person_id,
-        subtotal=sale.subtotal,
-        tax_amount=sale.tax_amount,
-        discount_amount=sale.discount_amount,
-        total=sale.total,
-        payment_method=sale.payment_method,
-        amount_received=sale.amount_received,
-        change_given=sale.change_given,
-        status=sale.status,
-        delivery_status=sale.delivery_status,
-        delivery_address=sale.delivery_address,
-        delivery_notes=sale.delivery_notes,
-        notes=sale.notes,
-        created_at=sale.created_at,
-        completed_at=sale.completed_at,
-        delivered_at=sale.delivered_at,
-        items=sale.items,
-        branch_name=branch.name,
-        cashier_name=current_user.full_name
-    )
+    # What the response shows, without loading it back
+    set_committed_value(sale, "items", sale_items)
+    set_committed_value(sale, "branch", branch)
+    set_committed_value(sale, "cashier", current_user)
+    return json_response(SaleDetailResponse, sale, status_code=status.HTTP_201_CREATED)
 
 
 @router.put("/{sale_id}/cancel", response_model=SaleResponse)
@@ -290,7 +340,9 @@ async def cancel_sale(
     """
     Cancel sale (Admin only)
     """
-    result = await db.execute(select(Sale).where(Sale.id == sale_id))
+    result = await db.execute(
+        select(Sale).options(*load_profile("sale.items")).where(Sale.id == sale_id)
+    )
     sale = result.scalar_one_or_none()
     
     if not sale:
@@ -305,19 +357,29 @@ async def cancel_sale(
             detail="La venta ya está cancelada"
         )
     
+    # Flip the status conditionally so two concurrent cancels cannot both
+    # restore stock
+    status_result = await db.execute(
+        update(Sale)
+        .where((Sale.id == sale_id) & (Sale.status != SaleStatus.CANCELLED))
+        .values(status=SaleStatus.CANCELLED)
+        .execution_options(synchronize_session=False)
+    )
+    if status_result.rowcount != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La venta ya está cancelada"
+        )
+    
     # Restore stock
+    restored = {}
     for item in sale.items:
-        bp_result = await db.execute(
-            select(BranchProduct).where(
-                (BranchProduct.branch_id == sale.branch_id) &
-                (BranchProduct.product_id == item.product_id)
-            )
-        )
-        branch_product = bp_result.scalar_one_or_none()
-        if branch_product:
-            branch_product.stock += int(item.quantity)
+        restored[item.product_id] = restored.get(item.product_id, 0) + item.quantity
+    await release_stock(db, sale.branch_id, restored, sale_id=sale.id, user_id=current_user.id)
+    
+    if sale.status == SaleStatus.COMPLETED:
+        await remove_sale(db, sale)
     
-    sale.status = SaleStatus.CANCELLED
     await db.commit()
     await db.refresh(sale)
     
@@ -326,33 +388,36 @@ async def cancel_sale(
 
 # ==================== DELIVERY ENDPOINTS ====================
 
-@router.get("/delivery/pending", response_model=List[SaleResponse])
-async def get_pending_deliveries(
-    branch_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
-    """
-    Get pending deliveries
-    """
-    query = select(Sale).where(
-        Sale.delivery_status.in_([DeliveryStatus.PENDING, DeliveryStatus.ASSIGNED])
-    )
+def pending_deliveries_query(role_name: str, user_id: int, branch_id: Optional[int] = None):
+    """Open deliveries visible to a user's role, oldest first"""
+    query = select(Sale).where(open_delivery_clause())
     
     if branch_id:
         query = query.where(Sale.branch_id == branch_id)
     
     # Delivery person sees only assigned deliveries
-    if current_user.role.name == "delivery":
+    if role_name == "delivery":
         query = query.where(
-            (Sale.delivery_person_id == current_user.id) |
+            (Sale.delivery_person_id == user_id) |
             (Sale.delivery_status == DeliveryStatus.PENDING)
         )
     
-    query = query.order_by(Sale.created_at.asc())
+    return query.order_by(Sale.created_at.asc(), Sale.id.asc())
+
+
+@router.get("/delivery/pending", response_model=List[SaleResponse])
+async def get_pending_deliveries(
+    branch_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get pending deliveries
+    """
+    query = pending_deliveries_query(current_user.role.name, current_user.id, branch_id)
     
-    result = await db.execute(query)
-    return result.scalars().all()
+    result = await db.execute(query.with_only_columns(*projection(SaleResponse, Sale)))
+    return rows_response(SaleResponse, result.all())
 
 
 @router.put("/{sale_id}/assign-delivery", response_model=SaleResponse)
@@ -446,36 +511,57 @@ async def get_sales_summary(
     branch_id: Optional[int] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
+    group_by: Optional[Literal["branch", "cashier", "payment_method"]] = None,
     current_user: User = Depends(require_roles("admin", "superadmin")),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get sales summary report
+    Get sales summary report, optionally broken down by branch, cashier or
+    payment method
     """
-    query = select(
-        func.count(Sale.id).label("total_sales"),
-        func.sum(Sale.total).label("total_revenue"),
-        func.sum(Sale.tax_amount).label("total_tax"),
-        func.sum(Sale.discount_amount).label("total_discounts"),
-        func.avg(Sale.total).label("average_sale")
-    ).where(Sale.status == SaleStatus.COMPLETED)
-    
-    if branch_id:
-        query = query.where(Sale.branch_id == branch_id)
-    
-    if date_from:
-        query = query.where(Sale.created_at >= date_from)
-    
-    if date_to:
-        query = query.where(Sale.created_at <= date_to)
+    empty = {"total_sales": 0, "total_revenue": 0.0, "total_tax": 0.0, "total_discounts": 0.0, "average_sale": 0.0}
+    
+    if not group_by:
+        totals = await summarize_sales(db, branch_id, date_from, date_to)
+        return totals.get(None, empty)
+    
+    groups = await summarize_sales(db, branch_id, date_from, date_to, group_by)
+    summary = dict(empty)
+    for entry in groups.values():
+        for key in ("total_sales", "total_revenue", "total_tax", "total_discounts"):
+            summary[key] += entry[key]
+    if summary["total_sales"]:
+        summary["average_sale"] = summary["total_revenue"] / summary["total_sales"]
+    
+    column = "payment_method" if group_by == "payment_method" else f"{group_by}_id"
+    summary["breakdown"] = [
+        {column: key.value if isinstance(key, PaymentMethod) else key, **entry}
+        for key, entry in sorted(groups.items(), key=lambda item: -item[1]["total_revenue"])
+    ]
+    return summary
+
+
+@router.post("/reports/columnar-export", response_model=ColumnarExportResponse)
+async def export_sales_columnar(
+    data: ColumnarExportRequest,
+    current_user: User = Depends(require_roles("admin", "superadmin")),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Write the closed days of sales and sale lines not exported yet as
+    Parquet partitions (by branch and day) under ANALYTICS_EXPORT_DIR
+    """
+    if data.date_from and data.date_to and data.date_from > data.date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La fecha inicial debe ser anterior a la final"
+        )
     
-    result = await db.execute(query)
-    row = result.fetchone()
-    
-    return {
-        "total_sales": row.total_sales or 0,
-        "total_revenue": float(row.total_revenue or 0),
-        "total_tax": float(row.total_tax or 0),
-        "total_discounts": float(row.total_discounts or 0),
-        "average_sale": float(row.average_sale or 0)
-    }
+    result = await export_columnar(
+        db,
+        date_from=data.date_from,
+        date_to=data.date_to,
+        branch_ids=data.branch_ids,
+        force=data.force
+    )
+    return ColumnarExportResponse(**vars(result))
@@ -1,5 +1,6 @@
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
@@ -10,11 +11,16 @@ from app.schemas.user import (
     UserCreate, UserUpdate, UserResponse, 
     UserDetailResponse, UserPasswordUpdate
 )
+from app.core.principal import principal_cache
+from app.core.tokens import user_token_versions
+from app.core.pagination import decode_cursor, keyset_after, set_next_cursor
+from app.core.serialization import projection, rows_response
 from app.core.security import (
     get_current_user, 
-    get_password_hash, 
-    verify_password,
-    require_roles
+    get_password_hash_async, 
+    verify_password_async,
+    require_roles,
+    revoke_tokens
 )
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -22,8 +28,10 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
     branch_id: Optional[int] = None,
     role_id: Optional[int] = None,
     is_active: Optional[bool] = None,
@@ -32,9 +40,10 @@ async def get_users(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all users with optional filters (Admin only)
+    Get all users with optional filters (Admin only). Pass the X-Next-Cursor
+    header of a page as cursor to get the next one (skip ignored).
     """
-    query = select(User)
+    query = select(*projection(UserResponse, User))
     
     if branch_id:
         query = query.join(user_branches).where(user_branches.c.branch_id == branch_id)
@@ -53,10 +62,19 @@ async def get_users(
             (User.email.ilike(search_filter))
         )
     
-    query = query.offset(skip).limit(limit).order_by(User.created_at.desc())
+    if cursor:
+        query = query.where(
+            keyset_after((User.created_at, User.id), decode_cursor(cursor, (datetime, int)), descending=True)
+        )
+    else:
+        query = query.offset(skip)
+    
+    query = query.limit(limit).order_by(User.created_at.desc(), User.id.desc())
     
     result = await db.execute(query)
-    return result.scalars().all()
+    users = result.all()
+    set_next_cursor(response, users, limit, ("created_at", "id"))
+    return rows_response(UserResponse, users, headers=response.headers)
 
 
 @router.get("/{user_id}", response_model=UserDetailResponse)
@@ -130,7 +148,7 @@ async def create_user(
     user = User(
         email=user_data.email,
         username=user_data.username,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await get_password_hash_async(user_data.password),
         full_name=user_data.full_name,
         phone=user_data.phone,
         role_id=user_data.role_id,
@@ -205,7 +223,10 @@ async def update_user(
                 user_branches.insert().values(user_id=user_id, branch_id=branch_id)
             )
     
+    token_version = await revoke_tokens(db, user_id)
     await db.commit()
+    principal_cache.invalidate_user(user_id)
+    user_token_versions.bump(user_id, token_version, user.is_active)
     await db.refresh(user)
     
     return user
@@ -227,14 +248,17 @@ async def update_password(
             detail="Solo puedes cambiar tu propia contraseña"
         )
     
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Contraseña actual incorrecta"
         )
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    current_user.hashed_password = await get_password_hash_async(password_data.new_password)
+    token_version = await revoke_tokens(db, user_id)
     await db.commit()
+    principal_cache.invalidate_user(user_id)
+    user_token_versions.bump(user_id, token_version, current_user.is_active)
     
     return {"message": "Contraseña actualizada exitosamente"}
 
@@ -265,6 +289,9 @@ async def delete_user(
     
     # Soft delete - deactivate instead of delete
     user.is_active = False
+    token_version = await revoke_tokens(db, user_id)
     await db.commit()
+    principal_cache.invalidate_user(user_id)
+    user_token_versions.bump(user_id, token_version, False)
     
     return None
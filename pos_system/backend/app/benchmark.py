@@ -0,0 +1,570 @@
+"""
+Script to benchmark the API end to end against a seeded dataset
+Run: python -m app.benchmark [--scale small|medium|large] [--duration 30] [--concurrency 8] [--output results.json]
+     python -m app.benchmark --profile default --profile sqlite-rollback-journal --profile pool-small ...
+
+Seeds a synthetic dataset (python -m app.init_data's generator) into its
+own database, ./benchmark.db by default; it never touches DATABASE_URL.
+Pass --database-url postgresql+asyncpg://... to run against a local
+PostgreSQL database instead. A database that already holds the dataset is
+reused, so runs after the first one start right away, and the sales a
+run rings up are taken out again when it ends (stock included), so every
+run starts from the same data.
+
+The app is driven in-process through httpx by --concurrency workers for
+--duration seconds, each picking scenarios at random by weight:
+
+    checkout          scan 1-5 barcodes, then ring up the sale (cashier)
+    barcode_scan      one scanner lookup (cashier)
+    catalog_refresh   branch catalog sync with If-None-Match / since= (cashier)
+    admin_dashboard   sales summary by branch, latest sales, low stock (admin)
+    delivery_polling  open deliveries queue (delivery)
+
+Requests of the first --warmup seconds are not counted. Afterwards one
+delivery receipt of --receipt-lines stock movements is timed through the
+bulk movements endpoint (JSON and CSV) and, on a sample, one PUT per line.
+The report, one JSON document, has throughput and p50/p95/p99 latency per
+route and per scenario, the receipt timings, plus the git commit and
+database it ran on, so results of two commits can be compared.
+
+--profile picks the engine settings of ENGINE_PROFILES to run with (pool
+size, SQLite pragmas, pre-ping; "default" is the configured ones). Given
+more than once, or as "all", each profile runs in turn in its own process,
+since engine settings are read on import, over the same dataset, and the
+report has every profile's results plus a comparison of throughput and
+latency on the sales and products routes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+SCALES: Dict[str, Dict[str, int]] = {
+    "small": {"branches": 3, "products": 2000, "sales": 50000, "days": 90},
+    "medium": {"branches": 10, "products": 20000, "sales": 500000, "days": 365},
+    "large": {"branches": 20, "products": 100000, "sales": 3000000, "days": 730},
+}
+
+SCENARIO_WEIGHTS: Dict[str, int] = {
+    "checkout": 40,
+    "barcode_scan": 25,
+    "catalog_refresh": 10,
+    "admin_dashboard": 10,
+    "delivery_polling": 15,
+}
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./benchmark.db"
+
+# Engine settings (app.core.config) compared by --profile; SQLite pragmas
+# only apply to SQLite databases
+ENGINE_PROFILES: Dict[str, Dict[str, str]] = {
+    "default": {},
+    "sqlite-rollback-journal": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0"},
+    "sqlite-no-mmap": {"SQLITE_MMAP_SIZE": "0"},
+    "pool-small": {"DB_POOL_SIZE": "1", "DB_MAX_OVERFLOW": "0"},
+    "pool-large": {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "20"},
+    "no-pre-ping": {"DB_POOL_PRE_PING": "false"},
+}
+
+# Routes compared across profiles
+PROFILE_ROUTES = (
+    "POST /api/v1/sales/",
+    "GET /api/v1/sales/",
+    "GET /api/v1/sales/reports/summary",
+    "GET /api/v1/products/by-barcode/{barcode}",
+    "GET /api/v1/products/branch/{branch_id}/catalog",
+)
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), round(fraction * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: Dict[str, int], seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": sum(errors.values()),
+        "errors_by_kind": dict(sorted(errors.items())),
+        "throughput_rps": round(len(ordered) / seconds, 2) if seconds else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+@dataclass
+class Samples:
+    """Latencies (seconds) and errors (by status code or exception) of one route or scenario"""
+    latencies: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class Dataset:
+    """Ids and codes the scenarios pick from"""
+    branch_ids: List[int]
+    barcodes: List[str]
+    product_ids: Dict[str, int]
+    tokens: Dict[str, str]
+
+
+class Recorder:
+    def __init__(self):
+        self.routes: Dict[str, Samples] = {}
+        self.scenarios: Dict[str, Samples] = {}
+        self.recording = False
+
+    def add(self, table: Dict[str, Samples], key: str, seconds: float, error: Optional[str] = None) -> None:
+        if not self.recording:
+            return
+        samples = table.setdefault(key, Samples())
+        samples.latencies.append(seconds)
+        if error is not None:
+            samples.errors[error] = samples.errors.get(error, 0) + 1
+
+
+class Worker:
+    """One simulated client: a till, a dashboard or a delivery app in turn"""
+
+    def __init__(self, client, dataset: Dataset, recorder: Recorder, rng: random.Random):
+        self.client = client
+        self.dataset = dataset
+        self.recorder = recorder
+        self.rng = rng
+        # Last catalog version seen per branch, as a till would keep it
+        self.catalog_versions: Dict[int, Tuple[str, str]] = {}
+
+    async def request(self, route: str, method: str, url: str, role: str, **kwargs):
+        headers = {"Authorization": f"Bearer {self.dataset.tokens[role]}", **kwargs.pop("headers", {})}
+        started_at = time.perf_counter()
+        response = await self.client.request(method, url, headers=headers, **kwargs)
+        self.recorder.add(
+            self.recorder.routes, route, time.perf_counter() - started_at,
+            str(response.status_code) if response.status_code >= 400 else None
+        )
+        return response
+
+    def barcode(self) -> str:
+        # Skewed towards the best sellers, like the sales generator
+        barcodes = self.dataset.barcodes
+        return barcodes[int(len(barcodes) * self.rng.random() ** 3)]
+
+    async def scan(self) -> Optional[int]:
+        code = self.barcode()
+        response = await self.request(
+            "GET /api/v1/products/by-barcode/{barcode}", "GET", f"/api/v1/products/by-barcode/{code}", "cashier"
+        )
+        return self.dataset.product_ids[code] if response.status_code == 200 else None
+
+    async def checkout(self) -> None:
+        items = []
+        for _ in range(self.rng.randint(1, 5)):
+            product_id = await self.scan()
+            if product_id is not None:
+                items.append({"product_id": product_id, "quantity": 1})
+        if items:
+            await self.request(
+                "POST /api/v1/sales/", "POST", "/api/v1/sales/", "cashier",
+                json={"branch_id": self.rng.choice(self.dataset.branch_ids), "items": items, "amount_received": 10000}
+            )
+
+    async def barcode_scan(self) -> None:
+        await self.scan()
+
+    async def catalog_refresh(self) -> None:
+        branch_id = self.rng.choice(self.dataset.branch_ids)
+        known = self.catalog_versions.get(branch_id)
+        params, headers = {}, {}
+        if known:
+            etag, version = known
+            params["since"] = version
+            headers["If-None-Match"] = etag
+        response = await self.request(
+            "GET /api/v1/products/branch/{branch_id}/catalog", "GET", f"/api/v1/products/branch/{branch_id}/catalog",
+            "cashier", params=params, headers=headers
+        )
+        if response.status_code == 200:
+            self.catalog_versions[branch_id] = (response.headers.get("ETag", ""), response.json()["version"])
+
+    async def admin_dashboard(self) -> None:
+        branch_id = self.rng.choice(self.dataset.branch_ids)
+        date_from = (datetime.utcnow() - timedelta(days=30)).isoformat()
+        await self.request(
+            "GET /api/v1/sales/reports/summary", "GET", "/api/v1/sales/reports/summary", "admin",
+            params={"group_by": "branch", "date_from": date_from}
+        )
+        await self.request("GET /api/v1/sales/", "GET", "/api/v1/sales/", "admin", params={"limit": 50})
+        await self.request(
+            "GET /api/v1/branches/{branch_id}/inventory", "GET", f"/api/v1/branches/{branch_id}/inventory", "admin",
+            params={"low_stock": "true"}
+        )
+
+    async def delivery_polling(self) -> None:
+        await self.request("GET /api/v1/sales/delivery/pending", "GET", "/api/v1/sales/delivery/pending", "delivery")
+
+    async def run(self, deadline: float) -> None:
+        names = list(SCENARIO_WEIGHTS)
+        weights = [SCENARIO_WEIGHTS[name] for name in names]
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            scenario: Callable[[], Awaitable[None]] = getattr(self, name)
+            started_at = time.perf_counter()
+            error = None
+            try:
+                await scenario()
+            except Exception as e:
+                error = type(e).__name__
+            self.recorder.add(self.recorder.scenarios, name, time.perf_counter() - started_at, error)
+
+
+async def prepare(scale: Dict[str, int], seed: int) -> Dict[str, Any]:
+    """Seed the dataset unless the database already holds it; returns what it holds"""
+    from sqlalchemy import func, select
+
+    from app.db.session import AsyncSessionLocal
+    from app.init_data import SYNTHETIC_SKU_PREFIX, init_data, seed_synthetic_data
+    from app.models.branch import Branch
+    from app.models.product import Product
+    from app.models.sale import Sale, SaleItem
+
+    await init_data()
+    async with AsyncSessionLocal() as db:
+        seeded = (await db.execute(
+            select(func.count(Product.id)).where(Product.sku.startswith(SYNTHETIC_SKU_PREFIX))
+        )).scalar()
+        if seeded:
+            print(f"Usando el conjunto de datos existente ({seeded} productos sintéticos)")
+        else:
+            print(f"Generando conjunto de datos: {scale}")
+            started_at = time.perf_counter()
+            await seed_synthetic_data(db, seed=seed, **scale)
+            print(f"Datos generados en {time.perf_counter() - started_at:.1f}s")
+
+        counts = {
+            table: (await db.execute(select(func.count(model.id)))).scalar()
+            for table, model in (("branches", Branch), ("products", Product), ("sales", Sale), ("sale_items", SaleItem))
+        }
+        return {"reused": bool(seeded), **counts}
+
+
+async def next_sale_id() -> int:
+    from sqlalchemy import func, select
+
+    from app.db.session import AsyncSessionLocal
+    from app.models.sale import Sale
+
+    async with AsyncSessionLocal() as db:
+        return ((await db.execute(select(func.max(Sale.id)))).scalar() or 0) + 1
+
+
+async def undo_sales(first_sale_id: int) -> int:
+    """
+    Take the sales rung up by a run out again (stock, rollups and rows), so
+    every run starts from the same data
+    """
+    from sqlalchemy import select
+
+    from app.db.session import AsyncSessionLocal
+    from app.models.loading import load_profile
+    from app.models.sale import Sale, SaleStatus
+    from app.services.rollups import remove_sale
+    from app.services.stock import release_stock
+
+    async with AsyncSessionLocal() as db:
+        sales = (await db.scalars(
+            select(Sale).options(*load_profile("sale.items")).where(Sale.id >= first_sale_id)
+        )).all()
+        for sale in sales:
+            if sale.status == SaleStatus.COMPLETED:
+                sold: Dict[int, float] = {}
+                for item in sale.items:
+                    sold[item.product_id] = sold.get(item.product_id, 0) + item.quantity
+                await release_stock(db, sale.branch_id, sold, sale_id=sale.id)
+                await remove_sale(db, sale)
+            await db.delete(sale)
+        await db.commit()
+        return len(sales)
+
+
+async def load_dataset(client) -> Dataset:
+    from sqlalchemy import select
+
+    from app.db.session import AsyncSessionLocal
+    from app.models.branch import Branch
+    from app.models.product import Product
+
+    async with AsyncSessionLocal() as db:
+        branch_ids = list((await db.execute(select(Branch.id).order_by(Branch.id))).scalars())
+        products = (await db.execute(
+            select(Product.barcode, Product.id).where(Product.barcode.is_not(None)).order_by(Product.id)
+        )).all()
+
+    tokens = {}
+    for role, username, password in (
+        ("admin", "admin", "admin123"), ("cashier", "cajero1", "password123"), ("delivery", "repartidor1", "password123")
+    ):
+        response = await client.post("/api/v1/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+        tokens[role] = response.json()["access_token"]
+
+    return Dataset(
+        branch_ids=branch_ids,
+        barcodes=[barcode for barcode, _ in products],
+        product_ids={barcode: product_id for barcode, product_id in products},
+        tokens=tokens
+    )
+
+
+async def benchmark_receipt(client, dataset: Dataset, lines: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Time one delivery receipt of lines stock movements sent to the bulk
+    endpoint as JSON and as a streamed CSV, against PUT .../stock per line
+    (timed on a sample, extrapolated). All stock added is taken out again.
+    """
+    from sqlalchemy import select
+
+    from app.db.session import AsyncSessionLocal
+    from app.models.branch import BranchProduct
+
+    branch_id = dataset.branch_ids[0]
+    async with AsyncSessionLocal() as db:
+        product_ids = list((await db.execute(
+            select(BranchProduct.product_id).where(BranchProduct.branch_id == branch_id).order_by(BranchProduct.product_id)
+        )).scalars())
+    movements = [{"product_id": rng.choice(product_ids), "delta": rng.randint(1, 50)} for _ in range(lines)]
+    headers = {"Authorization": f"Bearer {dataset.tokens['admin']}"}
+    url = f"/api/v1/branches/{branch_id}/inventory/movements"
+    added: Dict[int, float] = {}
+    results: Dict[str, Any] = {"lines": lines, "branch_id": branch_id}
+
+    def record(movement: Dict[str, Any]) -> None:
+        added[movement["product_id"]] = added.get(movement["product_id"], 0) + movement["delta"]
+
+    async def csv_body():
+        yield b"product_id,delta\n"
+        for start in range(0, lines, 1000):
+            yield "".join(f"{m['product_id']},{m['delta']}\n" for m in movements[start:start + 1000]).encode()
+
+    for name, kwargs in (
+        ("json", {"json": {"movements": movements}}),
+        ("csv", {"content": csv_body(), "headers": {**headers, "Content-Type": "text/csv"}}),
+    ):
+        started_at = time.perf_counter()
+        response = await client.post(url, **{"headers": headers, **kwargs})
+        seconds = time.perf_counter() - started_at
+        response.raise_for_status()
+        body = response.json()
+        if body["failed"] == 0:
+            for movement in movements:
+                record(movement)
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "lines_per_second": round(lines / seconds, 1),
+            "failed": body["failed"],
+        }
+
+    sample = movements[:min(lines, 200)]
+    started_at = time.perf_counter()
+    for movement in sample:
+        response = await client.put(
+            f"/api/v1/branches/{branch_id}/inventory/{movement['product_id']}/stock",
+            headers=headers, json={"quantity": movement["delta"]}
+        )
+        if response.status_code == 200:
+            record(movement)
+    per_line = (time.perf_counter() - started_at) / len(sample)
+    results["per_line_put"] = {
+        "sampled_lines": len(sample),
+        "seconds_per_line": round(per_line, 5),
+        "extrapolated_seconds": round(per_line * lines, 3),
+    }
+    results["speedup_vs_per_line"] = round(per_line * lines / results["json"]["seconds"], 1)
+
+    undo = [{"product_id": product_id, "delta": -delta} for product_id, delta in added.items()]
+    (await client.post(url, headers=headers, json={"movements": undo})).raise_for_status()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+
+    from app.core.config import settings
+    from app.db.session import engine
+    from app.main import app
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    dataset_info = await prepare(scale, args.seed)
+    first_sale_id = await next_sale_id()
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        dataset = await load_dataset(client)
+        workers = [
+            Worker(client, dataset, recorder, random.Random(args.seed * 1000 + i)) for i in range(args.concurrency)
+        ]
+
+        print(f"Calentando {args.warmup}s y midiendo {args.duration}s con {args.concurrency} clientes...")
+        started_at = time.perf_counter()
+        deadline = started_at + args.warmup + args.duration
+        runs = asyncio.gather(*(worker.run(deadline) for worker in workers))
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        measured_from = time.perf_counter()
+        await runs
+        seconds = time.perf_counter() - measured_from
+
+        receipt = None
+        if args.receipt_lines:
+            print(f"Midiendo una recepción de mercancía de {args.receipt_lines} líneas...")
+            receipt = await benchmark_receipt(client, dataset, args.receipt_lines, random.Random(args.seed))
+
+    undone = await undo_sales(first_sale_id)
+    print(f"{undone} ventas del benchmark revertidas")
+
+    def table(samples: Dict[str, Samples]) -> Dict[str, Any]:
+        return {key: summarize(value.latencies, value.errors, seconds) for key, value in sorted(samples.items())}
+
+    all_latencies = [latency for samples in recorder.routes.values() for latency in samples.latencies]
+    all_errors: Dict[str, int] = {}
+    for samples in recorder.routes.values():
+        for error, count in samples.errors.items():
+            all_errors[error] = all_errors.get(error, 0) + count
+    return {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "debug": settings.DEBUG,
+            "profile": args.profile[0],
+            "engine_settings": {
+                key: getattr(settings, key) for key in (
+                    "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_PRE_PING",
+                    "SQLITE_JOURNAL_MODE", "SQLITE_SYNCHRONOUS", "SQLITE_MMAP_SIZE",
+                )
+            },
+            "scale": args.scale,
+            "requested_scale": scale,
+            "dataset": dataset_info,
+            "concurrency": args.concurrency,
+            "duration_seconds": round(seconds, 2),
+            "warmup_seconds": args.warmup,
+            "seed": args.seed,
+        },
+        "total": summarize(all_latencies, all_errors, seconds),
+        "routes": table(recorder.routes),
+        "scenarios": table(recorder.scenarios),
+        "receipt": receipt,
+    }
+
+
+def run_profiles(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run each profile in its own process and compare them"""
+    import tempfile
+
+    results: Dict[str, Any] = {}
+    for name in args.profile:
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            command = [
+                sys.executable, "-m", "app.benchmark", "--profile", name, "--output", output,
+                "--database-url", args.database_url, "--scale", args.scale,
+                "--duration", str(args.duration), "--warmup", str(args.warmup),
+                "--concurrency", str(args.concurrency), "--receipt-lines", str(args.receipt_lines),
+                "--seed", str(args.seed),
+            ]
+            for key in ("branches", "products", "sales", "days"):
+                if getattr(args, key) is not None:
+                    command += [f"--{key}", str(getattr(args, key))]
+            print(f"Perfil {name}: {ENGINE_PROFILES[name] or 'configuración actual'}", flush=True)
+            subprocess.run(command, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            with open(output, encoding="utf-8") as f:
+                results[name] = json.load(f)
+
+    def compared(result: Dict[str, Any]) -> Dict[str, Any]:
+        keys = ("throughput_rps", "p50_ms", "p99_ms", "errors")
+        routes = {route: result["routes"][route] for route in PROFILE_ROUTES if route in result["routes"]}
+        return {
+            "total": {key: result["total"][key] for key in keys},
+            "routes": {route: {key: summary[key] for key in keys} for route, summary in routes.items()},
+        }
+
+    return {
+        "profiles": {name: {"settings": ENGINE_PROFILES[name], **result} for name, result in results.items()},
+        "comparison": {name: compared(result) for name, result in results.items()},
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mide rendimiento y latencia de la API sobre un conjunto de datos sintético")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL, help=f"Base de datos del benchmark (por defecto, {DEFAULT_DATABASE_URL})")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Tamaño del conjunto de datos")
+    parser.add_argument("--branches", type=int, help="Sucursales sintéticas (sustituye a la escala)")
+    parser.add_argument("--products", type=int, help="Productos sintéticos (sustituye a la escala)")
+    parser.add_argument("--sales", type=int, help="Ventas sintéticas (sustituye a la escala)")
+    parser.add_argument("--days", type=int, help="Días de historial (sustituye a la escala)")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de medición")
+    parser.add_argument("--warmup", type=float, default=5, help="Segundos de calentamiento, no medidos")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes simultáneos")
+    parser.add_argument("--receipt-lines", type=int, default=10000, help="Líneas de la recepción de mercancía medida al final (0 para omitirla)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos y de los escenarios")
+    parser.add_argument(
+        "--profile", action="append", choices=sorted(ENGINE_PROFILES) + ["all"],
+        help="Configuración del motor de base de datos; repetida (o all) compara varias en procesos separados"
+    )
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    args = parser.parse_args()
+    if not args.profile:
+        args.profile = ["default"]
+    elif "all" in args.profile:
+        args.profile = list(ENGINE_PROFILES)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if len(args.profile) > 1:
+        results = run_profiles(args)
+    else:
+        # Settings are read on import: point the app at the benchmark database first
+        os.environ["DATABASE_URL"] = args.database_url
+        os.environ.pop("DATABASE_READ_URL", None)
+        os.environ.update(ENGINE_PROFILES[args.profile[0]])
+        results = asyncio.run(benchmark(args))
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"Resultados en {args.output}")
+    else:
+        print(report)
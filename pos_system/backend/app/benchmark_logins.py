@@ -0,0 +1,161 @@
+"""
+Script to measure how a burst of logins affects the rest of the API
+Run: python -m app.benchmark_logins [--logins 200] [--probes 4] [--max-p99-ms 250] [--output results.json]
+
+Initializes a temporary SQLite database (BCRYPT_ROUNDS as configured) and,
+while --probes clients keep calling an endpoint that does not hash
+(GET /products/by-barcode/{barcode}, as a scanner does, with a token issued
+beforehand), fires --logins simultaneous POST /auth/login calls. The
+probe latency is measured for --baseline seconds with no logins first,
+then for as long as the burst lasts.
+
+Prints one JSON document: probe p50/p99/max latency without and during the
+burst, login outcomes (200, or 503 once the hashing queue is full) and
+latency, and the hashing pool settings. Exits with status 1 if the probe
+p99 during the burst is over --max-p99-ms.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from app.benchmark import percentile
+
+PROBE_URL = "/api/v1/products/by-barcode/{barcode}"
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+async def benchmark_logins(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+    from sqlalchemy import select
+
+    # app.core first: it resolves the app.core <-> app.db import order
+    from app.core.config import settings
+    from app.core.hashing import password_hasher
+    from app.db.session import AsyncSessionLocal
+    from app.init_data import init_data
+    from app.main import app
+    from app.models.product import Product
+
+    await init_data()
+    async with AsyncSessionLocal() as db:
+        barcode = (await db.execute(
+            select(Product.barcode).where(Product.barcode.is_not(None)).order_by(Product.id).limit(1)
+        )).scalar_one()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        credentials = {"username": "cajero1", "password": "password123"}
+        response = await client.post("/api/v1/auth/login", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        url = PROBE_URL.format(barcode=barcode)
+
+        async def probe(until: asyncio.Event, latencies: List[float]) -> None:
+            while not until.is_set():
+                started_at = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - started_at)
+                response.raise_for_status()
+                await asyncio.sleep(args.probe_interval)
+
+        async def probe_during(work) -> List[float]:
+            latencies: List[float] = []
+            done = asyncio.Event()
+            probes = [asyncio.create_task(probe(done, latencies)) for _ in range(args.probes)]
+            try:
+                await work()
+            finally:
+                done.set()
+                await asyncio.gather(*probes)
+            return latencies
+
+        print(f"Midiendo {PROBE_URL} sin inicios de sesión durante {args.baseline}s...")
+        baseline = await probe_during(lambda: asyncio.sleep(args.baseline))
+
+        login_latencies: List[float] = []
+        outcomes: Dict[str, int] = {}
+
+        async def login() -> None:
+            started_at = time.perf_counter()
+            response = await client.post("/api/v1/auth/login", json=credentials)
+            login_latencies.append(time.perf_counter() - started_at)
+            outcome = f"HTTP {response.status_code}"
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        async def burst() -> None:
+            await asyncio.gather(*(login() for _ in range(args.logins)))
+
+        print(f"Midiendo {PROBE_URL} durante {args.logins} inicios de sesión simultáneos...")
+        started_at = time.perf_counter()
+        during = await probe_during(burst)
+        burst_seconds = time.perf_counter() - started_at
+
+    return {
+        "meta": {
+            "logins": args.logins,
+            "probes": args.probes,
+            "cpus": os.cpu_count(),
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "password_hash": {
+                key: value for key, value in password_hasher.stats().items()
+                if key in ("workers", "max_concurrency", "max_queue", "queue_timeout_seconds", "nice")
+            },
+        },
+        "probe": {
+            "endpoint": f"GET {PROBE_URL}",
+            "baseline": latency_summary(baseline),
+            "during_burst": latency_summary(during),
+        },
+        "logins": {
+            "seconds": round(burst_seconds, 3),
+            "outcomes": dict(sorted(outcomes.items())),
+            **latency_summary(login_latencies),
+        },
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mide cómo afecta una ráfaga de inicios de sesión al resto de la API")
+    parser.add_argument("--logins", type=int, default=200, help="Inicios de sesión simultáneos")
+    parser.add_argument("--probes", type=int, default=4, help="Clientes que consultan el endpoint de prueba")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="Segundos entre consultas de cada cliente")
+    parser.add_argument("--baseline", type=float, default=3, help="Segundos de medición sin inicios de sesión")
+    parser.add_argument("--max-p99-ms", type=float, default=250, help="p99 máximo del endpoint de prueba durante la ráfaga")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    # Settings are read on import: point the app at the benchmark database first
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(directory, 'logins.db')}"
+    os.environ.pop("DATABASE_READ_URL", None)
+    try:
+        results = asyncio.run(benchmark_logins(args))
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"Resultados en {args.output}")
+    else:
+        print(report)
+    sys.exit(0 if results["probe"]["during_burst"]["p99_ms"] <= args.max_p99_ms else 1)
@@ -0,0 +1,162 @@
+"""
+Script to check that authentication cost does not grow with a user's sales
+Run: python -m app.check_auth_scaling [--sizes 0,1000,10000,100000] [--requests 200]
+
+Initializes a temporary SQLite database and gives the sample cashier
+(cajero1) an ever longer sales history, one sale line each, up to every
+size of --sizes. At each size it times --requests authenticated
+GET /auth/me calls, warm (principal cached) and cold (principal cache
+cleared before each call, so the user is loaded from the database), and
+records the peak memory (tracemalloc) of the cold calls.
+
+Exits with status 1 if, at any size, the cold median latency is over
+LATENCY_GROWTH times the one with no sales (plus LATENCY_SLACK_MS), or the
+peak memory is over MEMORY_GROWTH_BYTES above it: e.g. after a relationship
+to the user's sales starts loading by default again.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+DEFAULT_SIZES = "0,1000,10000,100000"
+DEFAULT_REQUESTS = 200
+LATENCY_GROWTH = 1.5
+LATENCY_SLACK_MS = 1.0
+MEMORY_GROWTH_BYTES = 1024 * 1024
+
+# Completed sales of one line each for the cashier, ids start to stop
+SEED_SALES = """
+WITH RECURSIVE n(i) AS (SELECT :start UNION ALL SELECT i + 1 FROM n WHERE i < :stop)
+INSERT INTO sales (
+    sale_number, branch_id, cashier_id, subtotal, tax_amount, discount_amount, total, payment_method,
+    amount_received, change_given, status, delivery_status, created_at, completed_at
+)
+SELECT 'AUTH-' || i, :branch_id, :cashier_id, 100, 16, 0, 116, 'CASH', 116, 0, 'COMPLETED', 'NOT_REQUIRED',
+    datetime('now', '-' || (i % 365) || ' days'), datetime('now', '-' || (i % 365) || ' days')
+FROM n
+"""
+
+SEED_SALE_ITEMS = """
+INSERT INTO sale_items (
+    sale_id, product_id, quantity, unit_price, tax_rate, discount, subtotal, tax_amount, total, product_name, product_sku
+)
+SELECT id, :product_id, 1, 100, 0.16, 0, 100, 16, 116, 'Producto', 'SKU'
+FROM sales WHERE sale_number LIKE 'AUTH-%' AND id NOT IN (SELECT sale_id FROM sale_items)
+"""
+
+
+async def check_auth_scaling(args: argparse.Namespace) -> bool:
+    import httpx
+    from sqlalchemy import func, select, text
+
+    # app.core first: it resolves the app.core <-> app.db import order
+    from app.core.principal import principal_cache
+    from app.db.session import AsyncSessionLocal
+    from app.init_data import init_data
+    from app.main import app
+    from app.models.branch import Branch
+    from app.models.product import Product
+    from app.models.user import User
+
+    await init_data()
+    async with AsyncSessionLocal() as db:
+        cashier_id = (await db.execute(select(User.id).where(User.username == "cajero1"))).scalar_one()
+        ids = {
+            "cashier_id": cashier_id,
+            "branch_id": (await db.execute(select(func.min(Branch.id)))).scalar(),
+            "product_id": (await db.execute(select(func.min(Product.id)))).scalar(),
+        }
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results: List[Dict[str, float]] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        response = await client.post("/api/v1/auth/login", json={"username": "cajero1", "password": "password123"})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        async def timed(cold: bool) -> List[float]:
+            latencies = []
+            for _ in range(args.requests):
+                if cold:
+                    principal_cache.clear()
+                started_at = time.perf_counter()
+                response = await client.get("/api/v1/auth/me", headers=headers)
+                latencies.append(time.perf_counter() - started_at)
+                response.raise_for_status()
+            return latencies
+
+        seeded = 0
+        for size in sizes:
+            if size > seeded:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(text(SEED_SALES), {"start": seeded + 1, "stop": size, **ids})
+                    await db.execute(text(SEED_SALE_ITEMS), ids)
+                    await db.commit()
+                seeded = size
+
+            await timed(cold=True)  # Warm up statement caches at this size
+            warm = await timed(cold=False)
+            cold = await timed(cold=True)
+
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            await timed(cold=True)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results.append({
+                "sales": size,
+                "warm_ms": statistics.median(warm) * 1000,
+                "cold_ms": statistics.median(cold) * 1000,
+                "cold_p95_ms": sorted(cold)[int(len(cold) * 0.95) - 1] * 1000,
+                "peak_bytes": peak,
+            })
+            print(
+                f"{size:>7} ventas: GET /auth/me {results[-1]['warm_ms']:.2f} ms en caché, "
+                f"{results[-1]['cold_ms']:.2f} ms sin caché (p95 {results[-1]['cold_p95_ms']:.2f} ms), "
+                f"pico de memoria {peak / 1024:.0f} KiB"
+            )
+
+    base = results[0]
+    failures = 0
+    for result in results[1:]:
+        latency_limit = base["cold_ms"] * LATENCY_GROWTH + LATENCY_SLACK_MS
+        if result["cold_ms"] > latency_limit:
+            failures += 1
+            print(f"[FAIL] {result['sales']} ventas: {result['cold_ms']:.2f} ms sin caché, máximo {latency_limit:.2f} ms")
+        memory_limit = base["peak_bytes"] + MEMORY_GROWTH_BYTES
+        if result["peak_bytes"] > memory_limit:
+            failures += 1
+            print(f"[FAIL] {result['sales']} ventas: pico de {result['peak_bytes'] / 1024:.0f} KiB, máximo {memory_limit / 1024:.0f} KiB")
+
+    print("Latencia y memoria de la autenticación estables" if failures == 0 else f"{failures} fallo(s)")
+    return failures == 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Comprueba que la autenticación no crece con las ventas del usuario")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Ventas del cajero en cada medición, separadas por comas")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Peticiones medidas en cada tamaño")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    # Settings are read on import: point the app at the check database first
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(directory, 'auth_scaling.db')}"
+    os.environ.pop("DATABASE_READ_URL", None)
+    try:
+        passed = asyncio.run(check_auth_scaling(args))
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,84 @@
+"""
+Script to check that the streaming sales export runs in constant memory
+Run: python -m app.check_export_memory [rows] [csv|ndjson]
+
+Fills a temporary SQLite database with synthetic sales (1,000,000 by
+default; pass 10000000 for the full-size check), exports all of them
+through the same code as GET /sales/export and discards the output.
+Exits with status 1 if the process' peak RSS grew by more than
+MAX_GROWTH_MB during the export. Memory-mapped I/O is turned off for the
+run so that reading the database file does not count as memory use.
+"""
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.config import settings
+from app.db.session import Base, create_engine_for
+from app.api.v1.sales import sales_list_query
+from app.services.exports import stream_sales
+
+MAX_GROWTH_MB = 64
+DEFAULT_ROWS = 1_000_000
+
+SEED_SALES = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows)
+INSERT INTO sales (
+    sale_number, branch_id, cashier_id, subtotal, tax_amount, discount_amount, total,
+    payment_method, amount_received, change_given, status, delivery_status, created_at, completed_at
+)
+SELECT
+    'EXP-' || i, 1 + i % 5, 1 + i % 20, 100.0 + i % 900, 16.0, 0, 116.0 + i % 900,
+    'CASH', 1000, 0, 'COMPLETED', 'NOT_REQUIRED',
+    datetime('2024-01-01', '+' || (i % 525600) || ' minutes'),
+    datetime('2024-01-01', '+' || (i % 525600) || ' minutes')
+FROM n
+"""
+
+
+def peak_rss_mb() -> float:
+    # KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def check_export_memory(rows: int, export_format: str) -> bool:
+    settings.SQLITE_MMAP_SIZE = 0
+    directory = tempfile.mkdtemp()
+    engine = create_engine_for(f"sqlite+aiosqlite:///{os.path.join(directory, 'export.db')}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        print(f"Generando {rows} ventas de prueba...")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text(SEED_SALES), {"rows": rows})
+
+        baseline = peak_rss_mb()
+        started_at = time.perf_counter()
+        exported = 0
+        async for chunk in stream_sales(sales_list_query("admin", 1), export_format, session_factory):
+            exported += len(chunk)
+        elapsed = time.perf_counter() - started_at
+        growth = peak_rss_mb() - baseline
+    finally:
+        await engine.dispose()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    print(f"{rows} ventas, {exported / 1024 / 1024:.0f} MB de {export_format} en {elapsed:.1f}s ({rows / elapsed:.0f} filas/s)")
+    print(f"Memoria máxima: {baseline:.0f} MB antes, +{growth:.1f} MB durante la exportación (límite +{MAX_GROWTH_MB} MB)")
+    return growth <= MAX_GROWTH_MB
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    export_format = sys.argv[2] if len(sys.argv) > 2 else "csv"
+    sys.exit(0 if asyncio.run(check_export_memory(rows, export_format)) else 1)
@@ -0,0 +1,174 @@
+"""
+Script to check the low-stock tracker and measure the polling it replaces
+Run: python -m app.check_low_stock [products]
+
+Fills a temporary SQLite database with BRANCHES branches stocking
+products products each (20,000 by default), some of them already low,
+and runs WRITES random sales, cancellations, stock updates and bulk counts
+through the same stock functions as the API, a few of them rolled back.
+Exits with status 1 if any branch's tracked low-stock set then differs
+from a scan of branch_products, or if a subscriber missed a crossing.
+
+It then times the scan a dashboard poll of GET .../inventory?low_stock=true
+runs against a read of the tracker, and prints the load that DASHBOARDS
+dashboards polling every POLL_SECONDS would put on the database, next to
+what the tracker costs instead (one resync per branch every
+LOW_STOCK_RESYNC_SECONDS per worker).
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+# app.core first: it resolves the app.core <-> app.db import order
+from app.core.config import settings
+from app.core.serialization import projection
+from app.db.session import Base, PrimarySession, create_engine_for
+from app.models.branch import BranchProduct
+from app.schemas.branch import BranchProductResponse
+from app.services.low_stock import StockLevel, low_stock
+from app.services.stock import InsufficientStockError, adjust_stock, release_stock, reserve_stock
+from app.services.stock_import import import_stock_movements
+
+DEFAULT_PRODUCTS = 20_000
+BRANCHES = 5
+WRITES = 2000
+DASHBOARDS = 50
+POLL_SECONDS = 10
+POLLS = 50
+
+# Stock 0-1000 with min 5 and max 100: about 0.6% of the rows start low
+SEED_STOCK = """
+WITH RECURSIVE b(branch_id) AS (SELECT 1 UNION ALL SELECT branch_id + 1 FROM b WHERE branch_id < :branches),
+p(product_id) AS (SELECT 1 UNION ALL SELECT product_id + 1 FROM p WHERE product_id < :products)
+INSERT INTO branch_products (branch_id, product_id, stock, min_stock, max_stock, is_available, updated_at)
+SELECT branch_id, product_id, ABS(RANDOM()) % 1000, 5, 100, 1, CURRENT_TIMESTAMP
+FROM b, p
+"""
+
+
+async def scan(db: AsyncSession, branch_id: int) -> List:
+    """What GET /branches/{id}/inventory?low_stock=true runs on every poll"""
+    result = await db.execute(
+        select(*projection(BranchProductResponse, BranchProduct))
+        .where((BranchProduct.branch_id == branch_id) & (BranchProduct.stock <= BranchProduct.min_stock))
+    )
+    return result.all()
+
+
+async def random_write(db: AsyncSession, branch_id: int, hot: List[int], rng: random.Random) -> None:
+    """One sale, cancellation, stock update or bulk count on the hot products"""
+    roll = rng.random()
+    if roll < 0.6:
+        await reserve_stock(db, branch_id, {rng.choice(hot): rng.randint(1, 6) for _ in range(rng.randint(1, 4))})
+    elif roll < 0.75:
+        await release_stock(db, branch_id, {rng.choice(hot): rng.randint(1, 6)})
+    elif roll < 0.95:
+        await adjust_stock(db, branch_id, rng.choice(hot), rng.choice([-3, -1, 2, 10, 50]))
+    else:
+        await import_stock_movements(db, branch_id, [
+            {"product_id": rng.choice(hot), "stock": rng.randint(0, 20)} for _ in range(5)
+        ])
+
+
+async def check_low_stock(products: int) -> bool:
+    directory = tempfile.mkdtemp()
+    engine = create_engine_for(f"sqlite+aiosqlite:///{os.path.join(directory, 'low_stock.db')}")
+    # PrimarySession: commits are applied to the tracker as in the API
+    session_factory = async_sessionmaker(engine, sync_session_class=PrimarySession, expire_on_commit=False)
+    rng = random.Random(0)
+    failures = 0
+
+    try:
+        print(f"Generando {BRANCHES} sucursales con {products} productos cada una...")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text(SEED_STOCK), {"branches": BRANCHES, "products": products})
+
+        async with session_factory() as db:
+            for branch_id in range(1, BRANCHES + 1):
+                await low_stock.items(db, branch_id)
+        initial = low_stock.stats()["products"]
+        queue = low_stock.subscribe(1)
+
+        print(f"Aplicando {WRITES} escrituras de stock...")
+        hot = rng.sample(range(1, products + 1), 200)  # Few products, so they cross their threshold often
+        started_at = time.perf_counter()
+        expected_events = 0
+        for _ in range(WRITES):
+            branch_id = rng.randint(1, BRANCHES)
+            async with session_factory() as db:
+                before = dict(low_stock.tracked(1))
+                try:
+                    await random_write(db, branch_id, hot, rng)
+                except InsufficientStockError:
+                    await db.rollback()
+                    continue
+                if rng.random() < 0.05:
+                    await db.rollback()
+                else:
+                    await db.commit()
+                if branch_id == 1:
+                    expected_events += len(low_stock.tracked(1).keys() ^ before.keys())
+        elapsed = time.perf_counter() - started_at
+        print(f"  {WRITES / elapsed:.0f} escrituras/s, {low_stock.crossings} cruces del mínimo")
+
+        async with session_factory() as db:
+            for branch_id in range(1, BRANCHES + 1):
+                scanned = {
+                    row.product_id: StockLevel(row.stock, row.min_stock, row.max_stock)
+                    for row in await scan(db, branch_id)
+                }
+                if scanned != low_stock.tracked(branch_id):
+                    failures += 1
+                    print(f"[FAIL] sucursal {branch_id}: el seguimiento no coincide con branch_products")
+
+        crossings = 0
+        while not queue.empty():
+            payload = queue.get_nowait()
+            crossings += payload is not None and payload["event"] in ("low", "restored")
+        low_stock.unsubscribe(1, queue)
+        if crossings != expected_events:
+            failures += 1
+            print(f"[FAIL] el suscriptor recibió {crossings} cruces de {expected_events}")
+
+        async with session_factory() as db:
+            scan_times = []
+            for _ in range(POLLS):
+                started_at = time.perf_counter()
+                await scan(db, rng.randint(1, BRANCHES))
+                scan_times.append(time.perf_counter() - started_at)
+            read_times = []
+            for _ in range(POLLS):
+                started_at = time.perf_counter()
+                await low_stock.items(db, rng.randint(1, BRANCHES))
+                read_times.append(time.perf_counter() - started_at)
+    finally:
+        await engine.dispose()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    scan_ms = statistics.median(scan_times) * 1000
+    polls_per_minute = DASHBOARDS * 60 / POLL_SECONDS
+    resyncs_per_minute = BRANCHES * 60 / settings.LOW_STOCK_RESYNC_SECONDS
+    print(f"{initial} productos bajos al inicio, {low_stock.stats()['products']} al final")
+    print(f"Consulta de stock bajo: escaneo {scan_ms:.1f} ms (lee {products} filas), seguimiento "
+          f"{statistics.median(read_times) * 1e6:.0f} µs (sin SQL)")
+    print(f"{DASHBOARDS} paneles consultando cada {POLL_SECONDS}s: {polls_per_minute:.0f} escaneos/min, "
+          f"{polls_per_minute * scan_ms / 1000:.1f} s de base de datos/min, {polls_per_minute * products:.0f} filas leídas/min")
+    print(f"Con el seguimiento y eventos: {resyncs_per_minute:.0f} relecturas/min por proceso "
+          f"({resyncs_per_minute * scan_ms / 1000:.2f} s de base de datos/min), 0 consultas por panel")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PRODUCTS
+    sys.exit(0 if asyncio.run(check_low_stock(rows)) else 1)
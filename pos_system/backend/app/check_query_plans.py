@@ -0,0 +1,167 @@
+"""
+Script to check that listing and report queries are served by indexes
+Run: python -m app.check_query_plans
+
+Runs the queries behind the sales, products and users listings, product
+search, branch catalog deltas, sale detail, pending deliveries and the sales
+summary against the configured
+database and asks the planner (EXPLAIN) how it executes each statement.
+Exits with status 1 if any of them scans a whole table. Meant for CI after
+`alembic upgrade head`, and after any change to these queries or indexes.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import event, select, text
+
+from app.core.pagination import keyset_after
+from app.db.session import AsyncSessionLocal, engine
+from app.models.product import Product
+from app.models.sale import Sale, SaleItem
+from app.models.user import User
+from app.schemas.sale import SaleStatusEnum
+from app.services import catalog, rollups
+from app.services.search import product_matches
+from app.api.v1.sales import sales_list_query, pending_deliveries_query
+
+# Tables that grow with the business; small lookup tables may be scanned
+CHECKED_TABLES = ("sales", "sale_items", "sales_rollups", "products", "branch_products", "users")
+
+NOW = datetime(2024, 6, 15, 13, 30)
+CURSOR = (NOW, 1000)
+
+
+def sales_cases():
+    listing = [
+        ("admin", {}),
+        ("admin", {"branch_id": 1}),
+        ("admin", {"cashier_id": 2}),
+        ("admin", {"customer_id": 3}),
+        ("admin", {"status": SaleStatusEnum.COMPLETED}),
+        ("admin", {"date_from": NOW - timedelta(days=7), "date_to": NOW}),
+        ("admin", {"branch_id": 1, "date_from": NOW - timedelta(days=7)}),
+        ("cashier", {}),
+        ("delivery", {}),
+        ("customer", {}),
+    ]
+    for role_name, filters in listing:
+        query = sales_list_query(role_name, 2, **filters)
+        label = f"sales list {role_name} {sorted(filters)}"
+        yield label, query.limit(100)
+        yield label + " cursor", query.where(
+            keyset_after((Sale.created_at, Sale.id), CURSOR, descending=True)
+        ).limit(100)
+
+    yield "pending deliveries admin", pending_deliveries_query("admin", 1)
+    yield "pending deliveries admin branch", pending_deliveries_query("admin", 1, branch_id=1)
+    yield "pending deliveries delivery", pending_deliveries_query("delivery", 4)
+    # What the sale.detail / sale.items profiles emit for the lines
+    yield "sale lines", select(SaleItem).where(SaleItem.sale_id.in_([1, 2]))
+
+
+def catalog_cases(dialect: str):
+    products = select(Product).where(Product.is_active == True).order_by(Product.name, Product.id)
+    yield "products list", products.limit(100)
+    yield "products list cursor", products.where(
+        keyset_after((Product.name, Product.id), ("M", 10))
+    ).limit(100)
+    for term in ("cafe", "coca co", "BEB-0", "7501"):
+        matches = product_matches(dialect, term)
+        yield f"products search {term!r}", select(Product).join(
+            matches, matches.c.product_id == Product.id
+        ).order_by(matches.c.rank, Product.name).limit(100)
+    users = select(User).order_by(User.created_at.desc(), User.id.desc())
+    yield "users list", users.limit(100)
+    yield "users list cursor", users.where(
+        keyset_after((User.created_at, User.id), CURSOR, descending=True)
+    ).limit(100)
+
+
+def catalog_sync_cases():
+    since = (NOW - timedelta(minutes=5)).isoformat()
+    yield "catalog version", lambda db: catalog.catalog_version(db, 1)
+    yield "catalog delta", lambda db: catalog.catalog_delta(db, 1, since, NOW.isoformat())
+
+
+def summary_cases():
+    ranges = [
+        (None, None, None),
+        (1, None, None),
+        (None, NOW - timedelta(days=30, minutes=17), NOW),
+        (1, NOW - timedelta(days=30, minutes=17), NOW),
+    ]
+    for branch_id, date_from, date_to in ranges:
+        yield f"summary branch={branch_id} from={date_from} to={date_to}", (branch_id, date_from, date_to)
+
+
+def full_scans(dialect: str, plan: List[Tuple]) -> List[str]:
+    problems = []
+    for row in plan:
+        detail = str(row[-1])
+        for table in CHECKED_TABLES:
+            if dialect == "sqlite" and detail.startswith(f"SCAN {table}") and "INDEX" not in detail:
+                problems.append(detail)
+            if dialect == "postgresql" and f"Seq Scan on {table} " in detail + " ":
+                problems.append(detail.strip())
+    return problems
+
+
+def report(label: str, dialect: str, plans: List[Tuple[str, List[Tuple]]]) -> bool:
+    problems = [problem for _, plan in plans for problem in full_scans(dialect, plan)]
+    print(f"[{'FULL SCAN' if problems else 'ok'}] {label}")
+    for problem in problems:
+        print(f"    {problem}")
+    return bool(problems)
+
+
+async def check_query_plans() -> int:
+    """Print every plan; return the number of queries that scan a table"""
+    dialect = engine.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        print(f"Base de datos no soportada: {dialect}")
+        return 1
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    plans: List[Tuple[str, List[Tuple]]] = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            cursor.execute(prefix + statement, parameters)
+            plans.append((statement, cursor.fetchall()))
+
+    failures = 0
+    async with AsyncSessionLocal() as db:
+        if dialect == "postgresql":
+            # An empty table is cheaper to scan than to search: only fall
+            # back to a scan when no index can serve the query
+            await db.execute(text("SET LOCAL enable_seqscan = off"))
+        # Check the rollup plan of the summary even if no rebuild ran here
+        rollups._ready = True
+
+        event.listen(engine.sync_engine, "before_cursor_execute", explain)
+        try:
+            for label, query in list(sales_cases()) + list(catalog_cases(dialect)):
+                plans.clear()
+                await db.execute(query)
+                failures += report(label, dialect, plans)
+
+            for label, call in catalog_sync_cases():
+                plans.clear()
+                await call(db)
+                failures += report(label, dialect, plans)
+
+            for label, (branch_id, date_from, date_to) in summary_cases():
+                plans.clear()
+                await rollups.summarize_sales(db, branch_id, date_from, date_to)
+                failures += report(label, dialect, plans)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", explain)
+            await db.rollback()
+
+    print(f"\n{failures} consulta(s) con recorrido completo de tabla" if failures else "\nTodas las consultas usan índices")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(check_query_plans()) else 0)
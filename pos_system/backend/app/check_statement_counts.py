@@ -0,0 +1,98 @@
+"""
+Script to check how many SQL statements the read endpoints issue
+Run: python -m app.check_statement_counts
+
+Calls each listing and detail endpoint in-process, as the first admin
+user of the configured database, and reads the statements it ran from
+the X-DB-* headers of app.core.metrics. Exits with status 1 if any
+endpoint goes over its route's query budget (QUERY_BUDGETS), e.g. after a
+relationship starts loading by default or a listing goes back to full
+entities. Run it after python -m app.init_data; detail cases are skipped
+when there is no row to show.
+"""
+import asyncio
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import func, select
+
+from app.main import app
+from app.core.config import settings
+from app.core.security import create_access_token, token_claims
+from app.db.session import AsyncSessionLocal
+from app.models.branch import Branch
+from app.models.product import Product
+from app.models.role import Role
+from app.models.sale import Sale
+from app.models.user import User
+
+# Read endpoints checked against their budget; {ids} are filled from the database
+CHECKED_PATHS: List[str] = [
+    "/api/v1/sales/?limit=500",
+    "/api/v1/sales/{sale_id}",
+    "/api/v1/sales/delivery/pending",
+    "/api/v1/products/?limit=500",
+    "/api/v1/products/?search=a&limit=500",
+    "/api/v1/products/categories",
+    "/api/v1/products/{product_id}",
+    "/api/v1/products/branch/{branch_id}",
+    "/api/v1/products/branch/{branch_id}/catalog",
+    "/api/v1/users/?limit=100",
+    "/api/v1/branches/",
+    "/api/v1/branches/{branch_id}/inventory",
+    "/api/v1/branches/{branch_id}/inventory/low-stock",
+]
+
+
+async def sample_ids() -> Tuple[Optional[User], Dict[str, Optional[int]]]:
+    async with AsyncSessionLocal() as db:
+        admin = (await db.execute(
+            select(User).join(Role).where(Role.name.in_(["superadmin", "admin"]), User.is_active == True)
+            .order_by(User.id).limit(1)
+        )).scalar_one_or_none()
+        claims = token_claims(admin) if admin else None
+        ids = {
+            "sale_id": (await db.execute(select(func.min(Sale.id)))).scalar(),
+            "product_id": (await db.execute(select(func.min(Product.id)))).scalar(),
+            "branch_id": (await db.execute(select(func.min(Branch.id)))).scalar(),
+        }
+    return claims, ids
+
+
+async def check_statement_counts() -> int:
+    """Print the count of every endpoint; return how many are over their budget"""
+    claims, ids = await sample_ids()
+    if claims is None:
+        print("No hay un usuario administrador; ejecuta primero python -m app.init_data")
+        return 1
+    headers = {"Authorization": f"Bearer {create_access_token(data=claims)}"}
+
+    # The metrics middleware adds the X-DB-* headers in debug mode
+    settings.DEBUG = True
+    failures = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        for path in CHECKED_PATHS:
+            missing = [name for name, value in ids.items() if "{" + name + "}" in path and value is None]
+            if missing:
+                print(f"[skip] {path} (sin datos)")
+                continue
+            url = path.format(**ids)
+            response = await client.get(url, headers=headers)
+            statements = int(response.headers["X-DB-Budgeted-Statements"])
+            budget = response.headers.get("X-DB-Query-Budget")
+            over = budget is None or statements > int(budget) or response.status_code >= 400
+            failures += over
+            print(
+                f"[{'EXCEDE' if over else 'ok'}] {url}: {statements} consulta(s), "
+                + (f"máximo {budget}" if budget is not None else "sin límite en QUERY_BUDGETS")
+                + (f" (HTTP {response.status_code})" if response.status_code >= 400 else "")
+            )
+
+    print(f"\n{failures} endpoint(s) fuera de límite" if failures else "\nTodos los endpoints dentro de su límite")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(check_statement_counts()) else 0)
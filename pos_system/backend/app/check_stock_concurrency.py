@@ -0,0 +1,185 @@
+"""
+Script to check that concurrent sales neither oversell nor lose stock updates
+Run: python -m app.check_stock_concurrency [--sales 300] [--skus 4] [--stock 100] [--database-url URL]
+
+Initializes its own database (a temporary SQLite file by default; pass
+--database-url postgresql+asyncpg://... to exercise the row locks of a
+local PostgreSQL database instead), gives --skus products --stock units
+each in the main branch, and fires --sales simultaneous POST /sales/ calls
+through the app in-process, each buying 1-3 units of one to all of those
+products, so they contend for the same rows and demand runs well past the
+stock. Sales turned down for lack of stock (HTTP 400) are expected.
+
+Exits with status 1 if, for any product:
+  - final stock plus the units of the completed sales differs from the
+    starting stock (a lost update or a sale that did not take its stock);
+  - final stock, or the stock after any movement of the ledger, is negative
+    (an oversell);
+  - the ledger does not add up to the stock column;
+or if a sale failed with anything other than HTTP 201 or 400.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+DEFAULT_SALES = 300
+DEFAULT_SKUS = 4
+DEFAULT_STOCK = 100.0
+
+
+async def check_stock_concurrency(args: argparse.Namespace) -> bool:
+    import httpx
+    from sqlalchemy import func, select
+
+    # app.core first: it resolves the app.core <-> app.db import order
+    from app.core.config import settings  # noqa: F401
+    from app.db.session import AsyncSessionLocal, engine
+    from app.init_data import init_data
+    from app.main import app
+    from app.models.branch import Branch, BranchProduct
+    from app.models.product import Product
+    from app.models.sale import Sale, SaleItem, SaleStatus
+    from app.models.stock import StockMovement
+    from app.services.stock_ledger import stock_at
+
+    await init_data()
+    async with AsyncSessionLocal() as db:
+        branch_id = (await db.execute(select(func.min(Branch.id)))).scalar()
+        product_ids = list((await db.execute(
+            select(Product.id).where(Product.is_active == True).order_by(Product.id).limit(args.skus)
+        )).scalars())
+        first_sale_id = ((await db.execute(select(func.max(Sale.id)))).scalar() or 0) + 1
+
+    rng = random.Random(args.seed)
+    failures = 0
+    outcomes: Dict[str, int] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=None) as client:
+        response = await client.post("/api/v1/auth/login", json={"username": "admin", "password": "admin123"})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # Same starting stock for every product, through the bulk endpoint so the ledger has it
+        response = await client.post(
+            f"/api/v1/branches/{branch_id}/inventory/movements", headers=headers,
+            json={"movements": [{"product_id": product_id, "stock": args.stock} for product_id in product_ids]}
+        )
+        response.raise_for_status()
+        async with AsyncSessionLocal() as db:
+            starting = dict((await db.execute(
+                select(BranchProduct.product_id, BranchProduct.stock)
+                .where((BranchProduct.branch_id == branch_id) & BranchProduct.product_id.in_(product_ids))
+            )).all())
+
+        baskets: List[List[Dict]] = [
+            [
+                {"product_id": product_id, "quantity": rng.randint(1, 3)}
+                for product_id in rng.sample(product_ids, rng.randint(1, len(product_ids)))
+            ]
+            for _ in range(args.sales)
+        ]
+        demand = sum(item["quantity"] for basket in baskets for item in basket)
+        print(
+            f"{args.sales} ventas simultáneas sobre {len(product_ids)} productos "
+            f"({demand:.0f} unidades pedidas, {sum(starting.values()):.0f} en stock) en {engine.dialect.name}..."
+        )
+
+        async def sell(basket: List[Dict]) -> None:
+            try:
+                response = await client.post(
+                    "/api/v1/sales/", headers=headers,
+                    json={"branch_id": branch_id, "items": basket, "amount_received": 100000}
+                )
+                outcome = f"HTTP {response.status_code}"
+            except Exception as e:
+                outcome = type(e).__name__
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(sell(basket) for basket in baskets))
+        elapsed = time.perf_counter() - started_at
+    print(f"  {elapsed:.1f}s, respuestas: " + ", ".join(f"{outcome}: {count}" for outcome, count in sorted(outcomes.items())))
+
+    unexpected = {outcome: count for outcome, count in outcomes.items() if outcome not in ("HTTP 201", "HTTP 400")}
+    if unexpected:
+        failures += 1
+        print(f"[FAIL] ventas con respuestas inesperadas: {unexpected}")
+
+    async with AsyncSessionLocal() as db:
+        final = dict((await db.execute(
+            select(BranchProduct.product_id, BranchProduct.stock)
+            .where((BranchProduct.branch_id == branch_id) & BranchProduct.product_id.in_(product_ids))
+        )).all())
+        sold = dict((await db.execute(
+            select(SaleItem.product_id, func.sum(SaleItem.quantity))
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .where(
+                (Sale.id >= first_sale_id) & (Sale.branch_id == branch_id) &
+                (Sale.status == SaleStatus.COMPLETED) & SaleItem.product_id.in_(product_ids)
+            )
+            .group_by(SaleItem.product_id)
+        )).all())
+        ledger = await stock_at(db, branch_id, datetime.utcnow())
+        movements = (await db.execute(
+            select(StockMovement.product_id, StockMovement.quantity)
+            .where((StockMovement.branch_id == branch_id) & StockMovement.product_id.in_(product_ids))
+            .order_by(StockMovement.id)
+        )).all()
+
+    running: Dict[int, float] = {}
+    lowest: Dict[int, float] = {}
+    for product_id, quantity in movements:
+        running[product_id] = running.get(product_id, 0) + quantity
+        lowest[product_id] = min(lowest.get(product_id, 0), running[product_id])
+
+    for product_id in product_ids:
+        stock = final.get(product_id, 0)
+        units = sold.get(product_id, 0)
+        print(f"  producto {product_id}: inicial {starting[product_id]:.0f}, vendido {units:.0f}, final {stock:.0f}")
+        if abs(stock + units - starting[product_id]) > 1e-6:
+            failures += 1
+            print(f"[FAIL] producto {product_id}: final + vendido = {stock + units:.0f}, se esperaba {starting[product_id]:.0f}")
+        if stock < 0 or lowest.get(product_id, 0) < 0:
+            failures += 1
+            print(f"[FAIL] producto {product_id}: stock negativo (final {stock:.0f}, mínimo en el historial {lowest.get(product_id, 0):.0f})")
+        if abs(ledger.get(product_id, 0) - stock) > 1e-6:
+            failures += 1
+            print(f"[FAIL] producto {product_id}: el historial suma {ledger.get(product_id, 0):.0f}, la columna {stock:.0f}")
+
+    print("Sin sobreventa ni actualizaciones perdidas" if failures == 0 else f"{failures} fallo(s)")
+    return failures == 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Comprueba que las ventas simultáneas no sobrevenden ni pierden stock")
+    parser.add_argument("--database-url", help="Base de datos de la prueba (por defecto, un SQLite temporal)")
+    parser.add_argument("--sales", type=int, default=DEFAULT_SALES, help="Ventas simultáneas")
+    parser.add_argument("--skus", type=int, default=DEFAULT_SKUS, help="Productos compartidos por las ventas")
+    parser.add_argument("--stock", type=float, default=DEFAULT_STOCK, help="Stock inicial de cada producto")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de las cestas")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    directory = None
+    if args.database_url is None:
+        directory = tempfile.mkdtemp()
+        args.database_url = f"sqlite+aiosqlite:///{os.path.join(directory, 'concurrency.db')}"
+    # Settings are read on import: point the app at the check database first
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("DATABASE_READ_URL", None)
+    try:
+        passed = asyncio.run(check_stock_concurrency(args))
+    finally:
+        if directory is not None:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+    sys.exit(0 if passed else 1)
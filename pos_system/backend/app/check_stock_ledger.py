@@ -0,0 +1,170 @@
+"""
+Script to benchmark and check point-in-time stock queries on the ledger
+Run: python -m app.check_stock_ledger [movements]
+
+Fills a temporary SQLite database with a year of stock movements
+(1,000,000 by default) for BRANCHES branches of PRODUCTS products each,
+over an opening snapshot, and takes the daily snapshots
+python -m app.snapshot_stock would have taken. Then asks for the stock of
+a whole branch at QUERIES random times, through stock_at (latest snapshot
+plus the tail) and by summing the full history from the opening snapshot,
+and prints the latency of each. Exits with status 1 if any answer differs,
+or if stock now differs from the branch_products column.
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+# app.core first: it resolves the app.core <-> app.db import order
+from app.core.config import settings  # noqa: F401
+from app.db.session import Base, create_engine_for
+from app.models.branch import BranchProduct
+from app.models.stock import StockMovement, StockSnapshot, StockSnapshotItem
+from app.services.stock_ledger import stock_at, take_snapshot
+
+DEFAULT_MOVEMENTS = 1_000_000
+BRANCHES = 5
+PRODUCTS = 200
+QUERIES = 200
+OPENING_STOCK = 1000.0
+START = datetime(2024, 1, 1)
+DAYS = 365
+
+# Mostly sales of 1-3 units, with restocks, cancellations and shrinkage,
+# spread evenly over the year in id order
+SEED_MOVEMENTS = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows)
+INSERT INTO stock_movements (branch_id, product_id, kind, quantity, created_at)
+SELECT
+    1 + i % :branches,
+    1 + (i * 7) % :products,
+    CASE WHEN i % 10 = 0 THEN 'RESTOCK' WHEN i % 97 = 2 THEN 'CANCEL' WHEN i % 50 = 1 THEN 'ADJUSTMENT' ELSE 'SALE' END,
+    CASE WHEN i % 10 = 0 THEN 24 WHEN i % 97 = 2 THEN 1 WHEN i % 50 = 1 THEN -1 ELSE -(1 + i % 3) END,
+    strftime('%Y-%m-%d %H:%M:%S.000000', '2024-01-01', '+' || (i * 31536000 / (:rows + 1)) || ' seconds')
+FROM n
+"""
+
+SEED_STOCK = """
+WITH RECURSIVE b(branch_id) AS (SELECT 1 UNION ALL SELECT branch_id + 1 FROM b WHERE branch_id < :branches),
+p(product_id) AS (SELECT 1 UNION ALL SELECT product_id + 1 FROM p WHERE product_id < :products)
+INSERT INTO branch_products (branch_id, product_id, stock, min_stock, max_stock, is_available, updated_at)
+SELECT branch_id, product_id, :opening + COALESCE((
+    SELECT SUM(quantity) FROM stock_movements m WHERE m.branch_id = b.branch_id AND m.product_id = p.product_id
+), 0), 5, 100, 1, CURRENT_TIMESTAMP
+FROM b, p
+"""
+
+
+async def full_history(db: AsyncSession, branch_id: int, opening_id: int, at: datetime) -> Dict[int, float]:
+    """Stock at a time without intermediate snapshots: opening plus every movement up to it"""
+    opening = dict((await db.execute(
+        select(StockSnapshotItem.product_id, StockSnapshotItem.stock).where(StockSnapshotItem.snapshot_id == opening_id)
+    )).all())
+    moved = await db.execute(
+        select(StockMovement.product_id, func.sum(StockMovement.quantity))
+        .where((StockMovement.branch_id == branch_id) & (StockMovement.created_at <= at))
+        .group_by(StockMovement.product_id)
+    )
+    for product_id, quantity in moved.all():
+        opening[product_id] = opening.get(product_id, 0) + quantity
+    return opening
+
+
+def same_stock(a: Dict[int, float], b: Dict[int, float]) -> bool:
+    return all(abs(a.get(product_id, 0) - b.get(product_id, 0)) < 1e-6 for product_id in set(a) | set(b))
+
+
+def summary(seconds: List[float]) -> str:
+    ms = sorted(value * 1000 for value in seconds)
+    return f"p50 {statistics.median(ms):.1f} ms, p95 {ms[int(len(ms) * 0.95) - 1]:.1f} ms"
+
+
+async def check_stock_ledger(movements: int) -> bool:
+    directory = tempfile.mkdtemp()
+    engine = create_engine_for(f"sqlite+aiosqlite:///{os.path.join(directory, 'ledger.db')}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    rng = random.Random(0)
+
+    try:
+        print(f"Generando {movements} movimientos de stock en {DAYS} días...")
+        started_at = time.perf_counter()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            params = {"rows": movements, "branches": BRANCHES, "products": PRODUCTS, "opening": OPENING_STOCK}
+            await conn.execute(text(SEED_MOVEMENTS), params)
+            await conn.execute(text(SEED_STOCK), params)
+        print(f"  {time.perf_counter() - started_at:.1f}s")
+
+        async with session_factory() as db:
+            # Opening balances, as left by the migration or a new branch
+            opening_ids = {}
+            for branch_id in range(1, BRANCHES + 1):
+                opening_ids[branch_id] = (await db.execute(
+                    StockSnapshot.__table__.insert().values(branch_id=branch_id, taken_at=START).returning(StockSnapshot.id)
+                )).scalar_one()
+                await db.execute(StockSnapshotItem.__table__.insert(), [
+                    {"snapshot_id": opening_ids[branch_id], "product_id": product_id, "stock": OPENING_STOCK}
+                    for product_id in range(1, PRODUCTS + 1)
+                ])
+
+            print("Tomando snapshots diarios...")
+            started_at = time.perf_counter()
+            for day in range(1, DAYS + 1):
+                for branch_id in range(1, BRANCHES + 1):
+                    await take_snapshot(db, branch_id, START + timedelta(days=day))
+            await db.commit()
+            print(f"  {DAYS * BRANCHES} snapshots en {time.perf_counter() - started_at:.1f}s")
+
+            ledger_times: List[float] = []
+            history_times: List[float] = []
+            mismatches = 0
+            for _ in range(QUERIES):
+                branch_id = rng.randint(1, BRANCHES)
+                at = START + timedelta(seconds=rng.randint(0, DAYS * 86400))
+
+                started_at = time.perf_counter()
+                fast = await stock_at(db, branch_id, at)
+                ledger_times.append(time.perf_counter() - started_at)
+
+                started_at = time.perf_counter()
+                slow = await full_history(db, branch_id, opening_ids[branch_id], at)
+                history_times.append(time.perf_counter() - started_at)
+
+                if not same_stock(fast, slow):
+                    mismatches += 1
+                    print(f"[FAIL] sucursal {branch_id} a las {at}: snapshot + movimientos no coincide con el historial completo")
+
+            now = START + timedelta(days=DAYS + 1)
+            for branch_id in range(1, BRANCHES + 1):
+                column = dict((await db.execute(
+                    select(BranchProduct.product_id, BranchProduct.stock).where(BranchProduct.branch_id == branch_id)
+                )).all())
+                if not same_stock(await stock_at(db, branch_id, now), column):
+                    mismatches += 1
+                    print(f"[FAIL] sucursal {branch_id}: el stock actual no coincide con branch_products")
+    finally:
+        await engine.dispose()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    per_branch_day = movements / BRANCHES / DAYS
+    print(f"{QUERIES} consultas de stock de una sucursal ({PRODUCTS} productos) en un momento al azar:")
+    print(f"  snapshot + movimientos (~{per_branch_day:.0f} por día): {summary(ledger_times)}")
+    print(f"  historial completo:                  {summary(history_times)}")
+    print(f"  {statistics.median(history_times) / statistics.median(ledger_times):.0f}x más rápido (mediana)")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MOVEMENTS
+    sys.exit(0 if asyncio.run(check_stock_ledger(rows)) else 1)
@@ -3,8 +3,12 @@ from app.core.config import settings
 from app.core.security import (
     verify_password,
     get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
+    get_current_principal,
     get_current_user,
+    get_read_db,
     require_permissions,
     require_roles
 )
@@ -1,17 +1,78 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./pos_system.db"
+    DATABASE_READ_URL: Optional[str] = None  # Read replica, falls back to DATABASE_URL
+    READ_YOUR_WRITES_SECONDS: int = 5  # Keep a user's reads on the primary after a write
+    DB_ECHO: bool = False  # Log every SQL statement
+    
+    # Connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500  # asyncpg prepared statements per connection
+    
+    # SQLite pragmas
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
     
     # JWT
     SECRET_KEY: str = "your-super-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 480
     
+    # Authenticated principal cache (0 disables)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Access-token fast path
+    TOKEN_CACHE_SIZE: int = 4096
+    AUTH_STATELESS_TOKENS: bool = False  # Authorize from token claims without SQL
+    ROLE_VERSION_REFRESH_SECONDS: int = 30
+    TOKEN_VERSION_REFRESH_SECONDS: int = 30
+    
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 0  # 0: one per CPU, leaving one to the event loop
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 0  # 0: as many as workers
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # Callers waiting beyond this get HTTP 503
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    PASSWORD_HASH_NICE: int = 10  # Scheduling priority of hashing threads (0 leaves it)
+    
+    # Scanner barcode/SKU index (0 disables)
+    BARCODE_INDEX_TTL_SECONDS: int = 300
+    BARCODE_INDEX_MAX_ENTRIES: int = 200000
+    
+    # Branch catalog sync
+    CATALOG_DELTA_OVERLAP_SECONDS: int = 30
+    CATALOG_SNAPSHOT_CACHE_SIZE: int = 16
+    
+    # Streaming exports (rows fetched per batch)
+    EXPORT_YIELD_PER: int = 1000
+    
+    # Columnar (Parquet) analytics export
+    ANALYTICS_EXPORT_DIR: str = "./analytics"
+    ANALYTICS_ROW_GROUP_ROWS: int = 100000
+    
+    # Stock ledger snapshots (python -m app.snapshot_stock)
+    STOCK_SNAPSHOT_INTERVAL_HOURS: int = 24
+    STOCK_SNAPSHOT_SETTLE_SECONDS: int = 60
+    
+    # Low-stock tracker (re-read from the database this often per branch)
+    LOW_STOCK_RESYNC_SECONDS: int = 60
+    
+    # Request metrics (/metrics) and per-route SQL statement budgets
+    METRICS_ENABLED: bool = True
+    QUERY_BUDGETS: Dict[str, int] = {}  # Overrides, e.g. {"GET /api/v1/sales/": 2}
+    
     # App
     APP_NAME: str = "POS System"
     DEBUG: bool = True
@@ -0,0 +1,139 @@
+"""
+Bounded worker pool for password hashing.
+
+bcrypt costs hundreds of milliseconds per call by design and releases the
+GIL while it runs, so hashing is pushed to a small thread pool instead of
+blocking the event loop. The pool leaves a CPU to the event loop and its
+threads run at a lower scheduling priority (nice) where the platform
+allows it, so requests that do not hash keep their latency while hashes
+queue. A semaphore caps how many hashes run at once;
+callers beyond the cap wait in line, and that line is reported as
+queue depth. The line is bounded too: a caller that would make it longer
+than max_queue, or that waits more than queue_timeout_seconds, gets
+PasswordHasherBusy (HTTP 503 with Retry-After, see app.main) instead of
+piling up work, so a burst of logins cannot hold requests open for
+minutes.
+"""
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    def __init__(self, retry_after_seconds: int):
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(f"Password hashing queue is full; retry in {retry_after_seconds}s")
+
+
+def default_workers() -> int:
+    """One thread per CPU but the one left to the event loop, at least one"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout_seconds: float,
+        nice: int = 0
+    ):
+        self.workers = workers or default_workers()
+        self.max_concurrency = max_concurrency or self.workers
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.nice = nice
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Metrics
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a hashing function in the pool once a slot is free"""
+        if self._semaphore.locked() and self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after_seconds())
+
+        queued_at = time.perf_counter()
+        self.queue_depth += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after_seconds()) from None
+        finally:
+            self.queue_depth -= 1
+
+        started_at = time.perf_counter()
+        self.wait_seconds_total += started_at - queued_at
+        self.in_flight += 1
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash", initializer=self._lower_priority
+                )
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.run_seconds_total += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    def _lower_priority(self) -> None:
+        # Only Linux takes a thread id as a process id here, making it per thread
+        if self.nice and sys.platform.startswith("linux"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except OSError:
+                pass
+
+    def retry_after_seconds(self) -> int:
+        """Rough time for the current line to clear, from the mean hash time"""
+        mean_seconds = self.run_seconds_total / self.completed if self.completed else 0.25
+        return max(1, math.ceil(mean_seconds * (self.queue_depth + 1) / self.max_concurrency))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout_seconds,
+            "nice": self.nice,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    queue_timeout_seconds=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+    nice=settings.PASSWORD_HASH_NICE
+)
@@ -0,0 +1,258 @@
+"""
+Per-request database instrumentation and Prometheus metrics.
+
+RequestMetricsMiddleware wraps every HTTP request in track_statements(),
+so the engine events of app.db.session count what the request runs: SQL
+statements, time spent in them, rows fetched and time spent waiting for a
+pooled connection. Totals are kept per route template ("GET
+/api/v1/sales/{sale_id}"), not per URL, and served in the Prometheus text
+format at /metrics together with the process-wide stats of the password
+hasher, the connection pool and the barcode index.
+
+With DEBUG on, every response carries its own numbers:
+
+    X-DB-Statements: 7
+    X-DB-Budgeted-Statements: 2
+    X-DB-Time-Ms: 0.84
+    X-DB-Rows: 7
+    X-DB-Pool-Wait-Ms: 0.01
+    X-DB-Query-Budget: 2
+
+Routes can have a query budget, the most statements a request should
+need, not counting the lookup of the caller (exempt_from_budget()), which
+is cached and runs only now and then. A request over its budget is logged
+and counted (pos_query_budget_exceeded_total), and
+python -m app.check_statement_counts exits 1 when a route goes over it.
+Budgets are keyed by route and can be overridden per deployment with the
+QUERY_BUDGETS setting.
+
+Headers go out before a streamed body, so for streaming responses they
+only cover the statements run up to the first byte.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.db.session import StatementStats, track_statements
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# Most statements a request to each route should run
+QUERY_BUDGETS: Dict[str, int] = {
+    "GET /api/v1/auth/me": 1,
+    "GET /api/v1/sales/": 1,
+    "GET /api/v1/sales/{sale_id}": 2,
+    "GET /api/v1/sales/delivery/pending": 1,
+    "GET /api/v1/products/": 1,
+    "GET /api/v1/products/categories": 1,
+    "GET /api/v1/products/{product_id}": 2,
+    "GET /api/v1/products/branch/{branch_id}": 2,
+    "GET /api/v1/products/branch/{branch_id}/catalog": 3,
+    "GET /api/v1/users/": 1,
+    "GET /api/v1/branches/": 1,
+    "GET /api/v1/branches/{branch_id}/inventory": 1,
+    "GET /api/v1/branches/{branch_id}/inventory/low-stock": 1,  # 0 between resyncs
+    # Writes, with stocked products (stock ledger included): the same count
+    # whatever the number of lines
+    "POST /api/v1/sales/": 9,
+    "PUT /api/v1/sales/{sale_id}/cancel": 9,
+}
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def query_budget(route: str) -> Optional[int]:
+    """Statement budget of a route key, QUERY_BUDGETS setting first"""
+    return settings.QUERY_BUDGETS.get(route, QUERY_BUDGETS.get(route))
+
+
+def route_key(scope: Scope) -> str:
+    """"METHOD /path/{template}" of the route that handled a request"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return f"{scope['method']} {path}" if path else UNMATCHED_ROUTE
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    """Totals of the requests served by one route"""
+
+    __slots__ = (
+        "responses", "latency", "statements", "db_seconds", "rows", "pool_wait_seconds", "budget_exceeded"
+    )
+
+    def __init__(self):
+        self.responses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.pool_wait_seconds = 0.0
+        self.budget_exceeded = 0
+
+
+class RequestMetrics:
+    """Per-route request and database totals since the process started"""
+
+    def __init__(self):
+        self._routes: Dict[str, RouteMetrics] = {}
+
+    def record(self, route: str, status_code: int, seconds: float, stats: StatementStats) -> None:
+        metrics = self._routes.get(route)
+        if metrics is None:
+            metrics = self._routes[route] = RouteMetrics()
+        metrics.responses[status_code] = metrics.responses.get(status_code, 0) + 1
+        metrics.latency.observe(seconds)
+        metrics.statements.observe(stats.count)
+        metrics.db_seconds += stats.seconds
+        metrics.rows += stats.rows
+        metrics.pool_wait_seconds += stats.pool_wait_seconds
+
+        budget = query_budget(route)
+        if budget is not None and stats.budgeted > budget:
+            metrics.budget_exceeded += 1
+            logger.warning("%s ran %d SQL statements, budget is %d", route, stats.budgeted, budget)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            route: {
+                "requests": metrics.latency.count,
+                "statements": metrics.statements.sum,
+                "db_seconds": metrics.db_seconds,
+                "rows": metrics.rows,
+                "pool_wait_seconds": metrics.pool_wait_seconds,
+                "budget_exceeded": metrics.budget_exceeded,
+            }
+            for route, metrics in self._routes.items()
+        }
+
+    def reset(self) -> None:
+        self._routes.clear()
+
+    def render(self, collectors: Optional[Mapping[str, Mapping[str, Any]]] = None) -> str:
+        """
+        Prometheus text exposition of the route totals, plus one metric per
+        numeric key of each collector's stats (pos_<name>_<key>; keys ending
+        in _total are counters, the rest gauges)
+        """
+        lines: List[str] = []
+        routes = sorted(self._routes.items())
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(route: str, **extra: Any) -> str:
+            method, _, path = route.partition(" ")
+            pairs = {"method": method, "route": path} if path else {"route": route}
+            pairs.update({key: str(value) for key, value in extra.items()})
+            return ",".join(f'{key}="{_escape(value)}"' for key, value in pairs.items())
+
+        def histogram(name: str, help_text: str, attribute: str) -> None:
+            family(name, "histogram", help_text)
+            for route, metrics in routes:
+                values: Histogram = getattr(metrics, attribute)
+                for bound, count in zip(values.buckets, values.counts):
+                    lines.append(f"{name}_bucket{{{labels(route, le=_number(bound))}}} {count}")
+                lines.append(f'{name}_bucket{{{labels(route, le="+Inf")}}} {values.count}')
+                lines.append(f"{name}_sum{{{labels(route)}}} {_number(values.sum)}")
+                lines.append(f"{name}_count{{{labels(route)}}} {values.count}")
+
+        def counter(name: str, help_text: str, attribute: str) -> None:
+            family(name, "counter", help_text)
+            for route, metrics in routes:
+                lines.append(f"{name}{{{labels(route)}}} {_number(getattr(metrics, attribute))}")
+
+        family("pos_http_responses_total", "counter", "HTTP responses by route and status code")
+        for route, metrics in routes:
+            for status_code, count in sorted(metrics.responses.items()):
+                lines.append(f"pos_http_responses_total{{{labels(route, status=status_code)}}} {count}")
+        histogram("pos_http_request_duration_seconds", "Request latency by route", "latency")
+        histogram("pos_db_statements_per_request", "SQL statements run per request", "statements")
+        counter("pos_db_statement_seconds_total", "Time spent in SQL statements", "db_seconds")
+        counter("pos_db_rows_fetched_total", "Rows fetched by SQL statements", "rows")
+        counter("pos_db_request_pool_wait_seconds_total", "Time requests waited for a pooled connection", "pool_wait_seconds")
+        counter("pos_query_budget_exceeded_total", "Requests that ran more statements than their route's budget", "budget_exceeded")
+
+        for collector, stats in (collectors or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"pos_{collector}_{key}"
+                family(name, "counter" if key.endswith("_total") else "gauge", f"{collector} {key.replace('_', ' ')}")
+                lines.append(f"{name} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    """Record statements, DB time, rows and pool wait of every HTTP request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+
+        with track_statements() as stats:
+            async def send_with_metrics(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    if settings.DEBUG:
+                        headers = MutableHeaders(scope=message)
+                        headers["X-DB-Statements"] = str(stats.count)
+                        headers["X-DB-Budgeted-Statements"] = str(stats.budgeted)
+                        headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.2f}"
+                        headers["X-DB-Rows"] = str(stats.rows)
+                        headers["X-DB-Pool-Wait-Ms"] = f"{stats.pool_wait_seconds * 1000:.2f}"
+                        budget = query_budget(route_key(scope))
+                        if budget is not None:
+                            headers["X-DB-Query-Budget"] = str(budget)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            finally:
+                request_metrics.record(route_key(scope), status_code, time.perf_counter() - started_at, stats)
@@ -0,0 +1,83 @@
+"""
+Keyset (cursor) pagination.
+
+Listings are ordered on a unique key such as (created_at, id). The last row
+of a full page is encoded into an opaque cursor returned in the X-Next-Cursor
+response header; passing it back as ?cursor= continues right after that row
+with a range condition on the key instead of OFFSET. Page N then costs the
+same as page 1, and rows inserted meanwhile do not shift the pages.
+
+Offset pages (?skip=) also return X-Next-Cursor, so a client can switch to
+cursors after the first page.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import ColumnElement
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> List[Any]:
+    """Decode a cursor into values of the given types (datetime, str, int)"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(types):
+            raise ValueError(cursor)
+        values = []
+        for value, value_type in zip(raw, types):
+            if value_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            elif isinstance(value, value_type):
+                values.append(value)
+            else:
+                raise ValueError(cursor)
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
+
+def keyset_after(
+    columns: Sequence[ColumnElement],
+    values: Sequence[Any],
+    descending: bool = False
+) -> ColumnElement:
+    """
+    Rows strictly after values in (columns) order. The leading column is
+    also bounded on its own so the index range scan starts at the cursor.
+    """
+    def beyond(column, value):
+        return column < value if descending else column > value
+
+    leading = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    alternatives = []
+    for position in range(len(columns)):
+        equal = [columns[i] == values[i] for i in range(position)]
+        alternatives.append(and_(*equal, beyond(columns[position], values[position])))
+    return and_(leading, or_(*alternatives))
+
+
+def set_next_cursor(
+    response: Response,
+    rows: Sequence[Any],
+    limit: int,
+    attributes: Sequence[str]
+) -> Optional[str]:
+    """Put the cursor after the last row of a full page into the response headers"""
+    if len(rows) < limit:
+        return None
+    cursor = encode_cursor([getattr(rows[-1], attribute) for attribute in attributes])
+    response.headers[NEXT_CURSOR_HEADER] = cursor
+    return cursor
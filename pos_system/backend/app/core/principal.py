@@ -0,0 +1,90 @@
+"""
+In-process cache of authenticated principals.
+
+Holds what authorization needs about a token's user (role, permissions,
+branches, active flag) plus a detached snapshot of the User row, so a warm
+request resolves its user without touching the database. Entries expire
+after PRINCIPAL_CACHE_TTL_SECONDS and are dropped explicitly when the user or
+its role changes. The cache is per process: other workers only see a change
+once their own entries expire.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional, Tuple, TYPE_CHECKING
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.models.user import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    role_id: int
+    role_name: str
+    permissions: FrozenSet[str]
+    branch_ids: FrozenSet[int]
+    is_active: bool
+    # Detached snapshot, merged into each request session with load=False.
+    # None when the principal was built from stateless token claims.
+    user: Optional["User"] = field(default=None, repr=False, compare=False)
+
+
+class PrincipalCache:
+    """TTL cache of principals keyed by (user id, token)"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[int, str], Tuple[float, Principal]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, user_id: int, token: str) -> Optional[Principal]:
+        entry = self._entries.get((user_id, token))
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop((user_id, token), None)
+            return None
+        return principal
+
+    def set(self, token: str, principal: Principal) -> None:
+        if not self.enabled:
+            return
+        if len(self._entries) >= self.max_entries:
+            self._evict()
+        self._entries[(principal.user_id, token)] = (time.monotonic() + self.ttl_seconds, principal)
+
+    def invalidate_user(self, user_id: int) -> None:
+        for key in [key for key in self._entries if key[0] == user_id]:
+            self._entries.pop(key, None)
+
+    def invalidate_role(self, role_id: int) -> None:
+        for key in [key for key, (_, p) in self._entries.items() if p.role_id == role_id]:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        # Still full: drop the oldest insertions
+        overflow = len(self._entries) - self.max_entries + 1
+        for key in list(self._entries)[:max(overflow, 0)]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES
+)
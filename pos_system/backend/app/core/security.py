@@ -5,13 +5,16 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.hashing import password_hasher
+from app.core.principal import Principal, principal_cache
+from app.core.tokens import verified_tokens, role_versions, user_token_versions, role_version
+from app.db.session import AsyncSessionLocal, exempt_from_budget, get_db, read_session_factory
 from app.models.user import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
@@ -23,6 +26,16 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the hashing pool, for use inside request handlers"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool, for use inside request handlers"""
+    return await password_hasher.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -34,18 +47,93 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def token_claims(user: User) -> dict:
+    """Claims for a user's access token (role data only in stateless mode)"""
+    claims = {"sub": str(user.id)}
+    if settings.AUTH_STATELESS_TOKENS and user.role:
+        claims.update({
+            "tv": user.token_version,
+            "rid": user.role_id,
+            "role": user.role.name,
+            "pv": role_version(user.role.updated_at),
+            "br": sorted(b.id for b in user.branches),
+        })
+    return claims
+
+
 def decode_token(token: str) -> Optional[dict]:
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    verified_tokens.set(token, payload)
+    return payload
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
+async def principal_from_claims(user_id: int, payload: dict) -> Optional[Principal]:
+    """Build a principal from stateless token claims, or None if they are stale"""
+    role_id = payload.get("rid")
+    version = payload.get("pv")
+    if role_id is None or version is None or payload.get("tv") is None:
+        return None
+    with exempt_from_budget():
+        user_version = await user_token_versions.current(user_id)
+        if user_version is None or user_version[0] != payload["tv"]:
+            return None
+        if await role_versions.current(role_id) != version:
+            return None
+        permissions = await role_versions.permissions(role_id, version)
+    
+    return Principal(
+        user_id=user_id,
+        role_id=role_id,
+        role_name=payload.get("role", ""),
+        permissions=permissions,
+        branch_ids=frozenset(payload.get("br", [])),
+        is_active=user_version[1]
+    )
+
+
+async def revoke_tokens(db: AsyncSession, user_id: int) -> int:
+    """
+    Bump the user's token version in the session's transaction, so stateless
+    tokens issued before it stop being trusted; returns the new version
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    )
+    return result.scalar_one()
+
+
+async def load_principal(user_id: int) -> Optional[Principal]:
+    """Load a user and its authorization data in a private session"""
+    with exempt_from_budget():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(User).where(User.id == user_id))
+            user = result.scalar_one_or_none()
+            if user is None:
+                return None
+            
+            return Principal(
+                user_id=user.id,
+                role_id=user.role_id,
+                role_name=user.role.name if user.role else "",
+                permissions=frozenset(p.code for p in user.role.permissions) if user.role else frozenset(),
+                branch_ids=frozenset(b.id for b in user.branches),
+                is_active=user.is_active,
+                user=user
+            )
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -60,19 +148,55 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalar_one_or_none()
+    principal = principal_cache.get(int(user_id), token)
+    if principal is None and settings.AUTH_STATELESS_TOKENS:
+        principal = await principal_from_claims(int(user_id), payload)
+    if principal is None:
+        principal = await load_principal(int(user_id))
+        if principal is None:
+            raise credentials_exception
+        principal_cache.set(token, principal)
     
-    if user is None:
-        raise credentials_exception
-    
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuario inactivo"
         )
     
-    return user
+    return principal
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    if principal.user is None:
+        # Authorized from token claims; load the row once per token
+        loaded = await load_principal(principal.user_id)
+        if loaded is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="No se pudieron validar las credenciales",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        principal_cache.set(token, loaded)
+        principal = loaded
+    
+    # Lets the session flag this user for read-your-writes after a commit
+    db.info["user_id"] = principal.user_id
+    
+    # The snapshot is never attached to a request session, so a copy is
+    # merged in without emitting SQL
+    return await db.merge(principal.user, load=False)
+
+
+async def get_read_db(
+    principal: Principal = Depends(get_current_principal)
+) -> AsyncSession:
+    """Read-only session on the replica, or the primary right after the user's own writes"""
+    async with read_session_factory(principal.user_id)() as session:
+        yield session
 
 
 async def get_current_active_user(
@@ -86,19 +210,19 @@ async def get_current_active_user(
 def require_permissions(*required_permissions: str):
     """Decorator to check if user has required permissions"""
     async def permission_checker(
-        current_user: User = Depends(get_current_user),
+        token: str = Depends(oauth2_scheme),
+        principal: Principal = Depends(get_current_principal),
         db: AsyncSession = Depends(get_db)
     ) -> User:
-        user_permissions = await current_user.get_permissions(db)
-        
         for perm in required_permissions:
-            if perm not in user_permissions:
+            if perm not in principal.permissions:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail=f"Permiso requerido: {perm}"
                 )
         
-        return current_user
+        # Resolve the user only once authorized
+        return await get_current_user(token, principal, db)
     
     return permission_checker
 
@@ -106,17 +230,17 @@ def require_permissions(*required_permissions: str):
 def require_roles(*required_roles: str):
     """Decorator to check if user has required roles"""
     async def role_checker(
-        current_user: User = Depends(get_current_user),
+        token: str = Depends(oauth2_scheme),
+        principal: Principal = Depends(get_current_principal),
         db: AsyncSession = Depends(get_db)
     ) -> User:
-        await db.refresh(current_user, ["role"])
-        
-        if current_user.role.name not in required_roles:
+        if principal.role_name not in required_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Rol requerido: {', '.join(required_roles)}"
             )
         
-        return current_user
+        # Resolve the user only once authorized
+        return await get_current_user(token, principal, db)
     
     return role_checker
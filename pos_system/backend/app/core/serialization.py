@@ -0,0 +1,68 @@
+"""
+Response serialization fast path.
+
+A handler that returns ORM objects with a response_model makes FastAPI
+validate them into models, dump the models to dicts and encode the dicts
+with json.dumps: three passes over every field. json_response() validates
+the objects once, from their attributes, with a TypeAdapter built once per
+response type, and has pydantic-core write the JSON bytes directly.
+
+Listings of flat response models skip validation altogether: they select
+only the columns named by the model's fields (projection()) and
+rows_response() encodes the rows with orjson. The values come straight
+from columns of the same types, so there is nothing left to validate.
+
+Handlers keep their response_model for the OpenAPI schema; FastAPI sends a
+returned Response as it is. Responses that still go through FastAPI's own
+path (dicts, plain models) are encoded with orjson by the app's default
+response class.
+"""
+from functools import lru_cache
+from typing import Any, Mapping, Optional, Sequence, Tuple, Type
+
+import orjson
+from fastapi import Response, status
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def type_adapter(response_type: Any) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def json_response(
+    response_type: Any,
+    data: Any,
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """
+    JSON response of data (ORM objects, dicts or models) as response_type,
+    e.g. json_response(List[SaleResponse], sales). Pass the injected
+    response's headers (headers=response.headers) to keep the ones a
+    handler set on it.
+    """
+    adapter = type_adapter(response_type)
+    body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+@lru_cache(maxsize=None)
+def projection(response_model: Type[BaseModel], entity: Any) -> Tuple:
+    """Columns of entity for each field of a flat response model, in field order"""
+    return tuple(getattr(entity, name) for name in response_model.model_fields)
+
+
+def rows_response(
+    response_model: Type[BaseModel],
+    rows: Sequence[Sequence[Any]],
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """
+    JSON array of rows selected with projection(response_model, ...);
+    columns after the projected ones (e.g. a search rank) are left out
+    """
+    fields = tuple(response_model.model_fields)
+    body = orjson.dumps([dict(zip(fields, row)) for row in rows])
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
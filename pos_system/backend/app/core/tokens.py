@@ -0,0 +1,179 @@
+"""
+Access-token fast path.
+
+VerifiedTokenCache remembers the payload of tokens whose signature already
+checked out, so a repeat token skips the HMAC and JSON decode until it
+expires.
+
+With AUTH_STATELESS_TOKENS enabled, access tokens also carry the user's role
+id and name, the role's permission-set version (roles.updated_at) and branch
+ids. Authorization can then be decided from the token alone. A token is only
+trusted while:
+  - its permission-set version matches the role's current one, re-read from
+    the database at most every ROLE_VERSION_REFRESH_SECONDS and bumped
+    locally as soon as this process changes a role;
+  - its token version matches the user's current one (users.token_version,
+    bumped on deactivation, password or profile change), read by primary key
+    when the user is first seen, kept for TOKEN_VERSION_REFRESH_SECONDS in
+    an LRU of TOKEN_CACHE_SIZE users and bumped locally as soon as this
+    process changes a user. The same read carries the user's active flag.
+Otherwise the request falls back to the database-backed principal.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+
+
+class VerifiedTokenCache:
+    """LRU of token -> decoded payload for signatures already verified"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        payload = self._entries.get(token)
+        if payload is None:
+            self.misses += 1
+            return None
+        if payload.get("exp", 0) <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[token] = payload
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def role_version(updated_at: Optional[datetime]) -> str:
+    """Permission-set version carried in tokens for a role"""
+    return updated_at.isoformat() if updated_at else ""
+
+
+class RoleVersions:
+    """Current permission-set version and permission codes per role"""
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[int, str] = {}
+        self._refreshed_at = 0.0
+        self._permissions: Dict[Tuple[int, str], FrozenSet[str]] = {}
+
+    async def current(self, role_id: int) -> Optional[str]:
+        if time.monotonic() - self._refreshed_at > self.refresh_seconds:
+            await self._refresh()
+        return self._versions.get(role_id)
+
+    async def permissions(self, role_id: int, version: str) -> FrozenSet[str]:
+        key = (role_id, version)
+        if key not in self._permissions:
+            from app.db.session import AsyncSessionLocal
+            from app.models.role import Permission, role_permissions
+
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Permission.code)
+                    .join(role_permissions, Permission.id == role_permissions.c.permission_id)
+                    .where(role_permissions.c.role_id == role_id)
+                )
+                self._permissions[key] = frozenset(result.scalars().all())
+        return self._permissions[key]
+
+    def bump(self, role_id: int, updated_at: Optional[datetime]) -> None:
+        """Record a role change made by this process"""
+        self._versions[role_id] = role_version(updated_at)
+        for key in [key for key in self._permissions if key[0] == role_id]:
+            del self._permissions[key]
+
+    def forget(self, role_id: int) -> None:
+        self._versions.pop(role_id, None)
+        for key in [key for key in self._permissions if key[0] == role_id]:
+            del self._permissions[key]
+
+    async def _refresh(self) -> None:
+        from app.db.session import AsyncSessionLocal
+        from app.models.role import Role
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Role.id, Role.updated_at))
+            self._versions = {role_id: role_version(updated_at) for role_id, updated_at in result.all()}
+        self._refreshed_at = time.monotonic()
+
+
+class UserTokenVersions:
+    """LRU of user id -> current token version and active flag, read on demand"""
+
+    def __init__(self, refresh_seconds: int, max_entries: int):
+        self.refresh_seconds = refresh_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[int, bool, float]]" = OrderedDict()
+
+    async def current(self, user_id: int) -> Optional[Tuple[int, bool]]:
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[2] > self.refresh_seconds:
+            entry = await self._load(user_id)
+            if entry is None:
+                return None
+        else:
+            self._entries.move_to_end(user_id)
+        return entry[0], entry[1]
+
+    def bump(self, user_id: int, token_version: int, is_active: bool) -> None:
+        """Record a user change made by this process"""
+        self._store(user_id, (token_version, is_active, time.monotonic()))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def _load(self, user_id: int) -> Optional[Tuple[int, bool, float]]:
+        from app.db.session import AsyncSessionLocal
+        from app.models.user import User
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(User.token_version, User.is_active).where(User.id == user_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            self._entries.pop(user_id, None)
+            return None
+        entry = (row[0], row[1], time.monotonic())
+        # Versions only grow: keep a bump made here while the read ran
+        known = self._entries.get(user_id)
+        if known is not None and known[0] > entry[0]:
+            entry = (known[0], known[1], entry[2])
+        self._store(user_id, entry)
+        return entry
+
+    def _store(self, user_id: int, entry: Tuple[int, bool, float]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache(max_entries=settings.TOKEN_CACHE_SIZE)
+role_versions = RoleVersions(refresh_seconds=settings.ROLE_VERSION_REFRESH_SECONDS)
+user_token_versions = UserTokenVersions(
+    refresh_seconds=settings.TOKEN_VERSION_REFRESH_SECONDS, max_entries=settings.TOKEN_CACHE_SIZE
+)
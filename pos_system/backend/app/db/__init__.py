@@ -1,2 +1,2 @@
 # Database module
-from app.db.session import Base, get_db, init_db, engine
+from app.db.session import Base, get_db, init_db, engine, read_engine, pool_metrics
@@ -1,21 +1,263 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    future=True
-)
+
+class PoolMetrics:
+    """Time spent waiting for a pooled connection"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class StatementStats:
+    """SQL statements executed within a track_statements() block"""
+
+    __slots__ = ("count", "seconds", "rows", "pool_wait_seconds", "exempt")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.pool_wait_seconds = 0.0
+        self.exempt = 0  # Statements run under exempt_from_budget()
+
+    @property
+    def budgeted(self) -> int:
+        """Statements that count toward a query budget"""
+        return self.count - self.exempt
+
+
+_statement_stats: ContextVar[Optional[StatementStats]] = ContextVar("statement_stats", default=None)
+_budget_exempt: ContextVar[bool] = ContextVar("budget_exempt", default=False)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait time in pool_metrics"""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait_seconds = time.perf_counter() - started_at
+            pool_metrics.record(wait_seconds)
+            stats = _statement_stats.get()
+            if stats is not None:
+                stats.pool_wait_seconds += wait_seconds
+
+
+@contextmanager
+def track_statements() -> Iterator[StatementStats]:
+    """Count the statements run by the current task (e.g. one request)"""
+    stats = StatementStats()
+    token = _statement_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _statement_stats.reset(token)
+
+
+@contextmanager
+def exempt_from_budget() -> Iterator[None]:
+    """
+    Leave the statements of this block out of query budgets, e.g. resolving
+    the caller, which is cached across requests and so runs only on some
+    """
+    token = _budget_exempt.set(True)
+    try:
+        yield
+    finally:
+        _budget_exempt.reset(token)
+
+
+def count_statements(sync_engine) -> None:
+    """Record every statement of an engine in the active StatementStats"""
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        if _statement_stats.get() is not None:
+            conn.info["statement_started_at"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        stats = _statement_stats.get()
+        started_at = conn.info.pop("statement_started_at", None)
+        if stats is not None and started_at is not None:
+            stats.count += 1
+            stats.exempt += _budget_exempt.get()
+            stats.seconds += time.perf_counter() - started_at
+            # The async drivers buffer a non-streamed result on execute;
+            # streamed (yield_per) rows are not counted
+            rows = getattr(cursor, "_rows", None)
+            stats.rows += len(rows) if rows is not None else max(cursor.rowcount, 0)
+
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """create_async_engine keyword arguments for a database URL"""
+    url = make_url(database_url)
+    options: Dict[str, Any] = {
+        "echo": settings.DB_ECHO,
+        "future": True,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps its single StaticPool connection
+        return options
+
+    options.update({
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    })
+
+    if url.get_dialect().driver == "asyncpg":
+        options["connect_args"] = {
+            # asyncpg's own per-connection statement cache
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+
+    return options
+
+
+def _dialect_url(raw_url: str) -> str:
+    """Apply dialect URL parameters (asyncpg prepared statement cache)"""
+    url = make_url(raw_url)
+    if url.get_dialect().driver == "asyncpg" and "prepared_statement_cache_size" not in url.query:
+        url = url.update_query_dict({"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)})
+    return url.render_as_string(hide_password=False)
+
+
+def configure_sqlite(sync_engine) -> None:
+    """Apply SQLite pragmas to every new connection"""
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.close()
+
+
+# insert() of each supported dialect, the one with on_conflict_do_update()
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def upsert_insert(dialect: str):
+    if dialect not in UPSERT_INSERTS:
+        raise ValueError(
+            f"Unsupported database dialect {dialect!r}: bulk upserts need one of {', '.join(UPSERT_INSERTS)}"
+        )
+    return UPSERT_INSERTS[dialect]
+
+
+def create_engine_for(raw_url: str):
+    url = _dialect_url(raw_url)
+    # Fail at startup rather than halfway through a bulk request
+    upsert_insert(make_url(url).get_backend_name())
+    new_engine = create_async_engine(url, **engine_options(url))
+    if new_engine.dialect.name == "sqlite":
+        configure_sqlite(new_engine.sync_engine)
+    count_statements(new_engine.sync_engine)
+    return new_engine
+
+
+class RecentWrites:
+    """Users who wrote to the primary within the read-your-writes window"""
+
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self._until: Dict[int, float] = {}
+
+    def mark(self, user_id: int) -> None:
+        now = time.monotonic()
+        if len(self._until) > 10000:
+            self._until = {uid: until for uid, until in self._until.items() if until > now}
+        self._until[user_id] = now + self.window_seconds
+
+    def is_recent(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        return self._until.get(user_id, 0) > time.monotonic()
+
+
+recent_writes = RecentWrites(settings.READ_YOUR_WRITES_SECONDS)
+
+
+class PrimarySession(Session):
+    """Session on the primary engine; remembers whether it wrote anything"""
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _flag_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _flag_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _mark_recent_write(session):
+    # user_id is set on the request session by get_current_user
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        recent_writes.mark(session.info["user_id"])
+
+
+engine = create_engine_for(settings.DATABASE_URL)
+read_engine = create_engine_for(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=PrimarySession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False
 )
 
+ReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False
+) if read_engine is not engine else AsyncSessionLocal
+
 
 class Base(DeclarativeBase):
     pass
@@ -33,6 +275,24 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def read_session_factory(user_id: Optional[int] = None) -> async_sessionmaker:
+    """
+    Session factory for read-only work: the replica, unless the user wrote
+    within the read-your-writes window (or no replica is configured).
+    """
+    if recent_writes.is_recent(user_id):
+        return AsyncSessionLocal
+    return ReadSessionLocal
+
+
+def dialect_insert(db: AsyncSession):
+    """insert() of the session's dialect, the one with on_conflict_do_update()"""
+    return upsert_insert(db.get_bind().dialect.name)
+
+
 async def init_db():
+    from app.services.search import install_search
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await install_search(conn)
@@ -1,15 +1,36 @@
 """
 Script to initialize database with default data
-Run: python -m app.init_data
+Run: python -m app.init_data [--branches 10 --products 100000 --sales 2000000 --days 365]
+
+With any of the scale options it also generates a synthetic dataset on
+top of the default data (see seed_synthetic_data), e.g. for benchmarks
+(python -m app.benchmark) or a staging database. It is bulk-loaded
+(executemany on SQLite, COPY on PostgreSQL) and reports rows per second
+for each table.
 """
+import argparse
 import asyncio
-from sqlalchemy import select
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, Table, func, insert, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# app.core first: it resolves the app.core <-> app.db import order
+from app.core.config import settings
+from app.core.security import get_password_hash
 from app.db.session import AsyncSessionLocal, init_db
 from app.models.role import Role, Permission, role_permissions
-from app.models.user import User
-from app.models.branch import Branch
+from app.models.user import User, user_branches
+from app.models.branch import Branch, BranchProduct
 from app.models.product import Category, Product
-from app.core.security import get_password_hash
+from app.models.sale import DeliveryStatus, PaymentMethod, Sale, SaleItem, SaleStatus
+from app.models.stock import MovementKind, StockMovement
+from app.services.rollups import rebuild_rollups
+from app.services.stock_ledger import take_snapshot
 
 
 # Default permissions
@@ -160,6 +181,442 @@ SAMPLE_PRODUCTS = [
 ]
 
 
+# Synthetic dataset
+SYNTHETIC_SKU_PREFIX = "SYN"
+SYNTHETIC_PASSWORD = "password123"
+SEED_BATCH_SIZE = 20000  # Sales per batch (lines come along)
+INDEX_REBUILD_MIN_SALES = 100000  # From here on, sales indexes are built after the load
+
+SYNTHETIC_PRODUCT_NAMES = [
+    "Refresco de Cola", "Agua Mineral", "Jugo de Manzana", "Leche Entera", "Yogur Natural",
+    "Pan Blanco", "Tortillas de Maíz", "Arroz Blanco", "Frijol Negro", "Aceite Vegetal",
+    "Atún en Agua", "Galletas Saladas", "Cereal de Avena", "Café Molido", "Azúcar Estándar",
+    "Papas Adobadas", "Cacahuates Japoneses", "Chocolate con Leche", "Jabón de Tocador", "Detergente en Polvo",
+    "Papel Higiénico", "Cloro", "Suavizante de Telas", "Pasta Dental", "Shampoo",
+]
+SYNTHETIC_PRODUCT_SIZES = ["250ml", "500ml", "600ml", "1L", "2L", "100g", "250g", "500g", "1kg", "Paquete"]
+
+PAYMENT_METHOD_WEIGHTS = [(PaymentMethod.CASH, 60), (PaymentMethod.CARD, 30), (PaymentMethod.TRANSFER, 10)]
+CANCELLED_SALES_RATIO = 0.02
+DELIVERY_SALES_RATIO = 0.05
+
+SALE_COLUMNS = (
+    "id", "sale_number", "branch_id", "cashier_id", "customer_id", "delivery_person_id",
+    "subtotal", "tax_amount", "discount_amount", "total", "payment_method", "amount_received", "change_given",
+    "status", "delivery_status", "delivery_address", "created_at", "completed_at", "delivered_at",
+)
+SALE_ITEM_COLUMNS = (
+    "id", "sale_id", "product_id", "quantity", "unit_price", "tax_rate", "discount",
+    "subtotal", "tax_amount", "total", "product_name", "product_sku",
+)
+
+
+class BulkLoader:
+    """
+    Writes rows (tuples) straight through the driver, in the session's
+    transaction: executemany on SQLite, COPY on PostgreSQL, and a Core
+    executemany INSERT elsewhere. Values are converted with the columns'
+    own bind processors, so they are stored exactly as the ORM stores them;
+    columns left out get their Python-side defaults (one value per batch).
+    Keeps the rows written and seconds spent per table.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.rows: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    async def write(self, table: Table, columns: Sequence[str], rows: List[tuple]) -> None:
+        if not rows:
+            return
+        started_at = time.perf_counter()
+        dialect = self.db.get_bind().dialect
+        defaults = [
+            (column.name, column.default.arg(None) if column.default.is_callable else column.default.arg)
+            for column in table.columns
+            if column.name not in columns and column.default is not None and not column.default.is_sequence
+        ]
+        names = list(columns) + [name for name, _ in defaults]
+        extra = tuple(value for _, value in defaults)
+        processors = [table.c[name].type._cached_bind_processor(dialect) for name in names]
+        if extra or any(processors):
+            # Column by column: one processor call per value, no per-row branching
+            values = list(zip(*rows)) + [(value,) * len(rows) for value in extra]
+            for i, processor in enumerate(processors):
+                if processor:
+                    values[i] = [None if value is None else processor(value) for value in values[i]]
+            rows = list(zip(*values))
+
+        connection = await self.db.connection()
+        if dialect.name == "sqlite":
+            driver = (await connection.get_raw_connection()).driver_connection
+            placeholders = ", ".join("?" for _ in names)
+            await driver.executemany(f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({placeholders})", rows)
+        elif dialect.name == "postgresql":
+            driver = (await connection.get_raw_connection()).driver_connection
+            await driver.copy_records_to_table(table.name, records=rows, columns=names)
+        else:
+            await connection.execute(table.insert(), [dict(zip(names, row)) for row in rows])
+
+        self.rows[table.name] = self.rows.get(table.name, 0) + len(rows)
+        self.seconds[table.name] = self.seconds.get(table.name, 0.0) + time.perf_counter() - started_at
+
+
+async def _pipeline(batches: Iterator, write: Callable[[Any], Awaitable[None]]) -> None:
+    """
+    Write batches while the next one is generated: the driver works in its
+    own thread (aiosqlite) or on the server, so the event loop is free to
+    build the next batch in the meantime
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+
+    async def produce():
+        for batch in batches:
+            await queue.put(batch)
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (batch := await queue.get()) is not None:
+            await write(batch)
+    finally:
+        producer.cancel()
+
+
+@asynccontextmanager
+async def _indexes_dropped(db: AsyncSession, tables: Sequence[Table], loader: BulkLoader):
+    """
+    Drop the secondary indexes of tables for a large load and build them
+    again afterwards: one sorted build per index is far cheaper than
+    updating every index on every insert
+    """
+    indexes = [index for table in tables for index in table.indexes]
+    connection = await db.connection()
+    for index in indexes:
+        await connection.run_sync(lambda sync_connection, index=index: index.drop(sync_connection))
+    await db.commit()
+    try:
+        yield
+    finally:
+        started_at = time.perf_counter()
+        connection = await db.connection()
+        for index in indexes:
+            await connection.run_sync(lambda sync_connection, index=index: index.create(sync_connection))
+        await db.commit()
+        loader.seconds["indexes"] = time.perf_counter() - started_at
+
+
+async def _next_id(db: AsyncSession, model) -> int:
+    return ((await db.execute(select(func.max(model.id)))).scalar() or 0) + 1
+
+
+async def _sync_sequences(db: AsyncSession, models: Sequence) -> None:
+    """Move PostgreSQL id sequences past the ids assigned by the generator"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for model in models:
+        table = model.__tablename__
+        await db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def _synthetic_branches(start_id: int, count: int) -> List[tuple]:
+    return [
+        (branch_id, f"SUC{branch_id:03d}", f"Sucursal {branch_id}", "Ciudad de México", False)
+        for branch_id in range(start_id, start_id + count)
+    ]
+
+
+def _synthetic_users(
+    start_id: int,
+    branch_ids: List[int],
+    cashiers_per_branch: int,
+    customers: int,
+    role_ids: Dict[str, int],
+    hashed_password: str
+) -> Tuple[List[tuple], List[tuple]]:
+    """Cashiers and a delivery person per branch, plus customers; (users, user_branches)"""
+    users = []
+    memberships = []
+    user_id = start_id
+
+    def add(username: str, full_name: str, role: str, branch_id: Optional[int]) -> None:
+        nonlocal user_id
+        users.append((
+            user_id, f"{username}@posystem.com", username, hashed_password, full_name, role_ids[role], branch_id
+        ))
+        if branch_id is not None:
+            memberships.append((user_id, branch_id))
+        user_id += 1
+
+    for branch_id in branch_ids:
+        for n in range(1, cashiers_per_branch + 1):
+            add(f"cajero{branch_id}_{n}", f"Cajero {n} (Sucursal {branch_id})", "cashier", branch_id)
+        add(f"repartidor{branch_id}", f"Repartidor (Sucursal {branch_id})", "delivery", branch_id)
+    for _ in range(customers):
+        add(f"cliente_sintetico{user_id}", f"Cliente {user_id}", "customer", None)
+    return users, memberships
+
+
+def _synthetic_products(start_id: int, count: int, category_ids: List[int], rng: random.Random) -> List[tuple]:
+    products = []
+    for product_id in range(start_id, start_id + count):
+        cost = round(rng.uniform(5, 300), 2)
+        products.append((
+            product_id,
+            f"{SYNTHETIC_SKU_PREFIX}{product_id:07d}",
+            f"79{product_id:011d}",
+            f"{rng.choice(SYNTHETIC_PRODUCT_NAMES)} {rng.choice(SYNTHETIC_PRODUCT_SIZES)} #{product_id}",
+            round(cost * rng.uniform(1.2, 1.8), 2),
+            cost,
+            0.16,
+            rng.choice(category_ids),
+        ))
+    return products
+
+
+def _synthetic_stock(branch_ids: List[int], product_ids: List[int], rng: random.Random) -> Iterator[List[tuple]]:
+    """One batch per branch; a few rows start below their alert threshold"""
+    randint = rng.randint
+    random_ = rng.random
+    for branch_id in branch_ids:
+        yield [
+            (branch_id, product_id, randint(0, 4) if random_() < 0.05 else randint(50, 1000), 5, 1000)
+            for product_id in product_ids
+        ]
+
+
+def _synthetic_sales(
+    start_sale_id: int,
+    start_item_id: int,
+    count: int,
+    days: int,
+    branches: List[Tuple[int, str]],
+    products: List[Tuple[int, str, str, float, float]],
+    cashiers: Dict[int, List[int]],
+    delivery_people: Dict[int, int],
+    customer_ids: List[Optional[int]],
+    rng: random.Random
+) -> Iterator[Tuple[List[tuple], List[tuple]]]:
+    """
+    Batches of (sales, lines) spread evenly over the last days, oldest
+    first as they would have been rung up, each sale with 1 to 5 lines.
+    Products are skewed towards the start of the catalog, like real best
+    sellers. Rows are tuples in SALE_COLUMNS / SALE_ITEM_COLUMNS order.
+    """
+    # One entry per weight point: a weighted pick is a single index
+    methods = [method for method, weight in PAYMENT_METHOD_WEIGHTS for _ in range(weight)]
+    random_ = rng.random
+    choice = rng.choice
+    product_count = len(products)
+    method_count = len(methods)
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+    day_seconds = timedelta(days=1).total_seconds()
+    delivered_after = now - timedelta(days=1)
+    one_hour = timedelta(hours=1)
+    completed, cancelled = SaleStatus.COMPLETED, SaleStatus.CANCELLED
+    delivered_status, pending_status = DeliveryStatus.DELIVERED, DeliveryStatus.PENDING
+    not_required = DeliveryStatus.NOT_REQUIRED
+    cash = PaymentMethod.CASH
+
+    sale_id = start_sale_id
+    item_id = start_item_id
+    sales: List[tuple] = []
+    items: List[tuple] = []
+    for day in range(days):
+        # Sorted within the day; only one day of timestamps in memory
+        day_count = count * (day + 1) // days - count * day // days
+        day_start = start + timedelta(days=day)
+        for offset in sorted(random_() * day_seconds for _ in range(day_count)):
+            created_at = day_start + timedelta(seconds=offset)
+            branch_id, branch_code = choice(branches)
+            subtotal = tax_amount = 0.0
+            for _ in range(1 + int(random_() * 5)):
+                product_id, sku, name, price, tax_rate = products[int(product_count * random_() ** 3)]
+                quantity = 1 + int(random_() * 3)
+                line_subtotal = price * quantity
+                line_tax = line_subtotal * tax_rate
+                subtotal += line_subtotal
+                tax_amount += line_tax
+                items.append((
+                    item_id, sale_id, product_id, quantity, price, tax_rate, 0,
+                    line_subtotal, line_tax, line_subtotal + line_tax, name, sku,
+                ))
+                item_id += 1
+
+            total = subtotal + tax_amount
+            payment_method = methods[int(random_() * method_count)]
+            amount_received = float(-(-total // 50) * 50) if payment_method is cash else total
+            delivery = random_() < DELIVERY_SALES_RATIO
+            # Deliveries of the last day are still open
+            delivered = delivery and created_at < delivered_after
+            sales.append((
+                sale_id,
+                f"{branch_code}-S{sale_id:010d}",
+                branch_id,
+                choice(cashiers[branch_id]),
+                choice(customer_ids) if delivery else None,
+                delivery_people.get(branch_id) if delivered else None,
+                subtotal,
+                tax_amount,
+                0,
+                total,
+                payment_method,
+                amount_received,
+                amount_received - total,
+                cancelled if random_() < CANCELLED_SALES_RATIO else completed,
+                delivered_status if delivered else pending_status if delivery else not_required,
+                "Calle Falsa #123" if delivery else None,
+                created_at,
+                created_at,
+                created_at + one_hour if delivered else None,
+            ))
+            sale_id += 1
+            if len(sales) >= SEED_BATCH_SIZE:
+                yield sales, items
+                sales, items = [], []
+    if sales:
+        yield sales, items
+
+
+async def seed_synthetic_data(
+    db: AsyncSession,
+    branches: int = 0,
+    products: int = 0,
+    sales: int = 0,
+    days: int = 365,
+    cashiers_per_branch: int = 2,
+    customers: int = 100,
+    seed: int = 0,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> BulkLoader:
+    """
+    Add a synthetic dataset on top of the default data: branches more
+    branches, each with its cashiers and delivery person, customers,
+    products more products stocked in every branch, and sales over the
+    last days. Everything is generated as plain tuples and written by a
+    BulkLoader, with ids assigned up front so nothing is read back; sales
+    go through a pipeline that writes one batch while generating the next,
+    committing after each. Synthetic users share one password hash
+    (SYNTHETIC_PASSWORD). New branches get their opening stock snapshot and
+    the synthetic stock enters the ledger as restocks; synthetic sales are
+    history and leave stock alone. The same seed always generates the same data.
+    progress(sales_written, sales) is called after each batch of sales.
+    Returns the loader, with rows and seconds per table.
+    """
+    rng = random.Random(seed)
+    loader = BulkLoader(db)
+    is_sqlite = db.get_bind().dialect.name == "sqlite"
+    if is_sqlite:
+        # A crash mid-load means loading again: skip the fsyncs meanwhile
+        await db.execute(text("PRAGMA synchronous=OFF"))
+
+    first_branch_id = await _next_id(db, Branch)
+    await loader.write(
+        Branch.__table__, ("id", "code", "name", "city", "is_main"), _synthetic_branches(first_branch_id, branches)
+    )
+    all_branches = [tuple(row) for row in (await db.execute(select(Branch.id, Branch.code).order_by(Branch.id))).all()]
+    branch_ids = [branch_id for branch_id, _ in all_branches]
+    new_branch_ids = branch_ids[-branches:] if branches else []
+    opened_at = datetime.utcnow()
+    for branch_id in new_branch_ids:
+        await take_snapshot(db, branch_id, opened_at)
+
+    if new_branch_ids or customers:
+        role_ids = dict((await db.execute(select(Role.name, Role.id))).all())
+        hashed_password = get_password_hash(SYNTHETIC_PASSWORD)
+        users, memberships = _synthetic_users(
+            await _next_id(db, User), new_branch_ids, cashiers_per_branch, customers, role_ids, hashed_password
+        )
+        await loader.write(
+            User.__table__,
+            ("id", "email", "username", "hashed_password", "full_name", "role_id", "primary_branch_id"),
+            users
+        )
+        await loader.write(user_branches, ("user_id", "branch_id"), memberships)
+
+    category_ids = list((await db.execute(select(Category.id))).scalars())
+    first_product_id = await _next_id(db, Product)
+    await loader.write(
+        Product.__table__,
+        ("id", "sku", "barcode", "name", "price", "cost", "tax_rate", "category_id"),
+        _synthetic_products(first_product_id, products, category_ids, rng)
+    )
+    new_product_ids = list(range(first_product_id, first_product_id + products))
+    for batch in _synthetic_stock(branch_ids, new_product_ids, rng):
+        await loader.write(
+            BranchProduct.__table__, ("branch_id", "product_id", "stock", "min_stock", "max_stock"), batch
+        )
+    if new_product_ids:
+        # The initial stock enters the ledger as restocks, in one INSERT ... SELECT
+        started_at = time.perf_counter()
+        result = await db.execute(insert(StockMovement).from_select(
+            ["branch_id", "product_id", "kind", "quantity", "created_at"],
+            select(
+                BranchProduct.branch_id, BranchProduct.product_id,
+                literal(MovementKind.RESTOCK, StockMovement.kind.type), BranchProduct.stock,
+                literal(datetime.utcnow(), DateTime())
+            ).where((BranchProduct.product_id >= first_product_id) & (BranchProduct.stock > 0))
+        ))
+        loader.rows["stock_movements"] = result.rowcount
+        loader.seconds["stock_movements"] = time.perf_counter() - started_at
+    await db.commit()
+
+    if sales:
+        catalog = [
+            tuple(row) for row in (await db.execute(
+                select(Product.id, Product.sku, Product.name, Product.price, Product.tax_rate).order_by(Product.id)
+            )).all()
+        ]
+        staff = (await db.execute(
+            select(User.id, User.primary_branch_id, Role.name).join(Role).where(User.is_active == True)
+        )).all()
+        fallback_cashiers = [user_id for user_id, _, role in staff if role in ("cashier", "admin", "superadmin")]
+        cashiers = {branch_id: [] for branch_id in branch_ids}
+        delivery_people = {}
+        for user_id, branch_id, role in staff:
+            if role == "cashier" and branch_id in cashiers:
+                cashiers[branch_id].append(user_id)
+            elif role == "delivery" and branch_id is not None:
+                delivery_people.setdefault(branch_id, user_id)
+        for branch_id in branch_ids:
+            cashiers[branch_id] = cashiers[branch_id] or fallback_cashiers
+        customer_ids = [user_id for user_id, _, role in staff if role == "customer"] or [None]
+
+        written = 0
+
+        async def write_sales(batch: Tuple[List[tuple], List[tuple]]) -> None:
+            nonlocal written
+            sale_rows, item_rows = batch
+            await loader.write(Sale.__table__, SALE_COLUMNS, sale_rows)
+            await loader.write(SaleItem.__table__, SALE_ITEM_COLUMNS, item_rows)
+            await db.commit()
+            written += len(sale_rows)
+            if progress:
+                progress(written, sales)
+
+        generated = _synthetic_sales(
+            await _next_id(db, Sale), await _next_id(db, SaleItem), sales, days, all_branches, catalog,
+            cashiers, delivery_people, customer_ids, rng
+        )
+        if sales >= INDEX_REBUILD_MIN_SALES:
+            async with _indexes_dropped(db, (Sale.__table__, SaleItem.__table__), loader):
+                await _pipeline(generated, write_sales)
+        else:
+            await _pipeline(generated, write_sales)
+
+    await _sync_sequences(db, (Branch, User, Product, BranchProduct, Sale, SaleItem))
+    started_at = time.perf_counter()
+    await rebuild_rollups(db)
+    loader.seconds["sales_rollups"] = time.perf_counter() - started_at
+    await db.commit()
+    if is_sqlite:
+        await db.execute(text(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}"))
+    return loader
+
+
 async def init_data():
     """Initialize database with default data"""
     await init_db()
@@ -176,105 +633,87 @@ async def init_data():
             
             # Create permissions
             print("Creando permisos...")
-            permission_map = {}
-            for perm_data in DEFAULT_PERMISSIONS:
-                permission = Permission(**perm_data)
-                db.add(permission)
-                await db.flush()
-                permission_map[perm_data["code"]] = permission.id
+            await db.execute(insert(Permission), DEFAULT_PERMISSIONS)
+            permission_map = dict((await db.execute(select(Permission.code, Permission.id))).all())
             
             # Create roles
             print("Creando roles...")
-            role_map = {}
-            for role_data in DEFAULT_ROLES:
-                role = Role(
-                    name=role_data["name"],
-                    display_name=role_data["display_name"],
-                    description=role_data["description"],
-                    is_system=role_data["is_system"]
+            await db.execute(
+                insert(Role),
+                [{key: value for key, value in role_data.items() if key != "permissions"} for role_data in DEFAULT_ROLES]
+            )
+            role_map = dict((await db.execute(select(Role.name, Role.id))).all())
+            
+            # Assign permissions
+            await db.execute(role_permissions.insert(), [
+                {"role_id": role_map[role_data["name"]], "permission_id": permission_id}
+                for role_data in DEFAULT_ROLES
+                for permission_id in (
+                    permission_map.values() if "*" in role_data["permissions"]
+                    else [permission_map[code] for code in role_data["permissions"] if code in permission_map]
                 )
-                db.add(role)
-                await db.flush()
-                role_map[role_data["name"]] = role.id
-                
-                # Assign permissions
-                permissions = role_data["permissions"]
-                if "*" in permissions:
-                    # All permissions
-                    for perm_id in permission_map.values():
-                        await db.execute(
-                            role_permissions.insert().values(role_id=role.id, permission_id=perm_id)
-                        )
-                else:
-                    for perm_code in permissions:
-                        if perm_code in permission_map:
-                            await db.execute(
-                                role_permissions.insert().values(
-                                    role_id=role.id, 
-                                    permission_id=permission_map[perm_code]
-                                )
-                            )
+            ])
             
             # Create default branch
             print("Creando sucursal principal...")
-            branch = Branch(**DEFAULT_BRANCH)
-            db.add(branch)
-            await db.flush()
+            branch_id = (await db.execute(insert(Branch).values(**DEFAULT_BRANCH).returning(Branch.id))).scalar_one()
+            await take_snapshot(db, branch_id, datetime.utcnow())
             
             # Create default admin user
             print("Creando usuario administrador...")
-            admin_user = User(
+            await db.execute(insert(User).values(
                 email="admin@posystem.com",
                 username="admin",
                 hashed_password=get_password_hash("admin123"),
                 full_name="Administrador del Sistema",
                 phone="+52 55 1234 5678",
                 role_id=role_map["superadmin"],
-                primary_branch_id=branch.id,
+                primary_branch_id=branch_id,
                 is_superuser=True
-            )
-            db.add(admin_user)
+            ))
             
-            # Create sample users for each role
+            # Create sample users for each role, all with the same password: hash it once
             print("Creando usuarios de ejemplo...")
             sample_users = [
                 {"username": "cajero1", "email": "cajero1@posystem.com", "full_name": "Juan Pérez (Cajero)", "role": "cashier"},
                 {"username": "repartidor1", "email": "repartidor1@posystem.com", "full_name": "Carlos López (Repartidor)", "role": "delivery"},
                 {"username": "cliente1", "email": "cliente1@posystem.com", "full_name": "María García (Cliente)", "role": "customer"},
             ]
-            
-            for user_data in sample_users:
-                user = User(
-                    email=user_data["email"],
-                    username=user_data["username"],
-                    hashed_password=get_password_hash("password123"),
-                    full_name=user_data["full_name"],
-                    role_id=role_map[user_data["role"]],
-                    primary_branch_id=branch.id
-                )
-                db.add(user)
+            hashed_password = get_password_hash("password123")
+            await db.execute(insert(User), [
+                {
+                    "email": user_data["email"],
+                    "username": user_data["username"],
+                    "hashed_password": hashed_password,
+                    "full_name": user_data["full_name"],
+                    "role_id": role_map[user_data["role"]],
+                    "primary_branch_id": branch_id,
+                }
+                for user_data in sample_users
+            ])
             
             # Create categories
             print("Creando categorías...")
-            category_map = {}
-            for cat_data in DEFAULT_CATEGORIES:
-                category = Category(**cat_data)
-                db.add(category)
-                await db.flush()
-                category_map[cat_data["slug"]] = category.id
+            await db.execute(insert(Category), DEFAULT_CATEGORIES)
+            category_map = dict((await db.execute(select(Category.slug, Category.id))).all())
             
             # Create sample products
             print("Creando productos de ejemplo...")
-            for prod_data in SAMPLE_PRODUCTS:
-                product = Product(
-                    sku=prod_data["sku"],
-                    barcode=prod_data["barcode"],
-                    name=prod_data["name"],
-                    price=prod_data["price"],
-                    cost=prod_data["cost"],
-                    category_id=category_map[prod_data["category_slug"]]
-                )
-                db.add(product)
+            await db.execute(insert(Product), [
+                {
+                    "sku": prod_data["sku"],
+                    "barcode": prod_data["barcode"],
+                    "name": prod_data["name"],
+                    "price": prod_data["price"],
+                    "cost": prod_data["cost"],
+                    "category_id": category_map[prod_data["category_slug"]],
+                }
+                for prod_data in SAMPLE_PRODUCTS
+            ])
+            
+            # Empty rollups, marked as built so reports use them from the start
+            print("Preparando resúmenes de ventas...")
+            await rebuild_rollups(db)
             
             await db.commit()
             
@@ -288,12 +727,62 @@ async def init_data():
             print("Repartidor: repartidor1 / password123")
             print("Cliente:    cliente1 / password123")
             print("="*50)
-            
+        
         except Exception as e:
             await db.rollback()
             print(f"Error al inicializar: {e}")
             raise
 
 
+async def seed(args: argparse.Namespace):
+    """Default data, then the synthetic dataset asked for"""
+    await init_data()
+    if not (args.branches or args.products or args.sales):
+        return
+    
+    async with AsyncSessionLocal() as db:
+        print("Generando datos sintéticos...")
+        started_at = time.perf_counter()
+        
+        def progress(written: int, total: int) -> None:
+            elapsed = time.perf_counter() - started_at
+            print(f"  {written}/{total} ventas ({written / elapsed if elapsed else 0:.0f} ventas/s)", end="\r")
+        
+        loader = await seed_synthetic_data(
+            db,
+            branches=args.branches,
+            products=args.products,
+            sales=args.sales,
+            days=args.days,
+            cashiers_per_branch=args.cashiers_per_branch,
+            customers=args.customers,
+            seed=args.seed,
+            progress=progress
+        )
+        elapsed = time.perf_counter() - started_at
+        print()
+        for table, count in loader.rows.items():
+            seconds = loader.seconds[table]
+            print(f"  {table}: {count} filas en {seconds:.1f}s ({count / seconds if seconds else 0:.0f} filas/s)")
+        if "indexes" in loader.seconds:
+            print(f"  índices de ventas: reconstruidos en {loader.seconds['indexes']:.1f}s")
+        if "sales_rollups" in loader.seconds:
+            print(f"  sales_rollups: reconstruidos en {loader.seconds['sales_rollups']:.1f}s")
+        rows = sum(loader.rows.values())
+        print(f"{rows} filas en {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} filas/s)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inicializa la base de datos con datos por defecto y, opcionalmente, sintéticos")
+    parser.add_argument("--branches", type=int, default=0, help="Sucursales sintéticas a agregar")
+    parser.add_argument("--products", type=int, default=0, help="Productos sintéticos a agregar (con stock en cada sucursal)")
+    parser.add_argument("--sales", type=int, default=0, help="Ventas sintéticas a agregar")
+    parser.add_argument("--days", type=int, default=365, help="Días de historial de las ventas sintéticas")
+    parser.add_argument("--cashiers-per-branch", type=int, default=2, help="Cajeros por sucursal sintética")
+    parser.add_argument("--customers", type=int, default=100, help="Clientes sintéticos a agregar (con --branches, --products o --sales)")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador (mismos datos con la misma semilla)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(init_data())
+    asyncio.run(seed(parse_args()))
@@ -1,9 +1,14 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 from app.core.config import settings
-from app.db.session import init_db
+from app.core.hashing import PasswordHasherBusy, password_hasher
+from app.core.metrics import RequestMetricsMiddleware, request_metrics
+from app.db.session import init_db, pool_metrics
+from app.services.barcodes import barcode_index
+from app.services.low_stock import low_stock
 from app.api.v1 import api_router
 
 
@@ -13,7 +18,7 @@ async def lifespan(app: FastAPI):
     await init_db()
     yield
     # Shutdown
-    pass
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -21,10 +26,14 @@ app = FastAPI(
     description="Sistema de Punto de Venta Multi-Sucursal",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc"
 )
 
+# Per-request SQL statements, DB time, rows and pool wait
+app.add_middleware(RequestMetricsMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -32,12 +41,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor", "ETag",
+        "X-DB-Statements", "X-DB-Budgeted-Statements", "X-DB-Time-Ms", "X-DB-Rows", "X-DB-Pool-Wait-Ms", "X-DB-Query-Budget",
+    ],
 )
 
 # Include API routes
 app.include_router(api_router)
 
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Demasiados inicios de sesión simultáneos, intente de nuevo en unos segundos"},
+        headers={"Retry-After": str(exc.retry_after_seconds)}
+    )
+
+
 @app.get("/")
 async def root():
     return {
@@ -53,6 +75,22 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return PlainTextResponse(
+        request_metrics.render({
+            "password_hash": password_hasher.stats(),
+            "db_pool": pool_metrics.stats(),
+            "barcode_index": barcode_index.stats(),
+            "low_stock": low_stock.stats(),
+        }),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -4,6 +4,8 @@ from app.models.role import Role, Permission, RolePermission
 from app.models.branch import Branch, BranchProduct
 from app.models.product import Product, Category
 from app.models.sale import Sale, SaleItem, PaymentMethod, SaleStatus, DeliveryStatus
+from app.models.rollup import SalesRollup, SalesRollupState
+from app.models.stock import MovementKind, StockMovement, StockSnapshot, StockSnapshotItem
 
 __all__ = [
     "User",
@@ -18,5 +20,11 @@ __all__ = [
     "SaleItem",
     "PaymentMethod",
     "SaleStatus",
-    "DeliveryStatus"
+    "DeliveryStatus",
+    "SalesRollup",
+    "SalesRollupState",
+    "MovementKind",
+    "StockMovement",
+    "StockSnapshot",
+    "StockSnapshotItem"
 ]
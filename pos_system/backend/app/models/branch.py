@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, TYPE_CHECKING
-from sqlalchemy import String, Integer, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Boolean, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
@@ -41,8 +41,9 @@ class Branch(Base):
         secondary="user_branches", 
         back_populates="branches"
     )
-    products: Mapped[List["BranchProduct"]] = relationship("BranchProduct", back_populates="branch", lazy="selectin")
-    sales: Mapped[List["Sale"]] = relationship("Sale", back_populates="branch", lazy="selectin")
+    # Unbounded collections: load through app.models.loading profiles only
+    products: Mapped[List["BranchProduct"]] = relationship("BranchProduct", back_populates="branch", lazy="raise_on_sql")
+    sales: Mapped[List["Sale"]] = relationship("Sale", back_populates="branch", lazy="raise_on_sql")
     
     def __repr__(self):
         return f"<Branch {self.code}: {self.name}>"
@@ -51,12 +52,18 @@ class Branch(Base):
 class BranchProduct(Base):
     """Inventory per branch - tracks stock and prices per branch"""
     __tablename__ = "branch_products"
+    __table_args__ = (
+        # Stock row of a product in a branch (sales, catalog); one per pair, the key of stock upserts
+        Index("ix_branch_products_branch_product", "branch_id", "product_id", unique=True),
+        # Catalog versions and deltas per branch
+        Index("ix_branch_products_branch_updated_at", "branch_id", "updated_at"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     branch_id: Mapped[int] = mapped_column(Integer, ForeignKey("branches.id", ondelete='CASCADE'), nullable=False)
     product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id", ondelete='CASCADE'), nullable=False)
     
-    stock: Mapped[int] = mapped_column(Integer, default=0)
+    stock: Mapped[float] = mapped_column(Float, default=0)  # Fractional for products sold by weight
     min_stock: Mapped[int] = mapped_column(Integer, default=5)  # Alert threshold
     max_stock: Mapped[int] = mapped_column(Integer, default=100)
     
@@ -70,7 +77,7 @@ class BranchProduct(Base):
     
     # Relationships
     branch: Mapped["Branch"] = relationship("Branch", back_populates="products")
-    product: Mapped["Product"] = relationship("Product", back_populates="branch_stocks", lazy="selectin")
+    product: Mapped["Product"] = relationship("Product", back_populates="branch_stocks", lazy="raise_on_sql")
     
     def __repr__(self):
         return f"<BranchProduct branch={self.branch_id} product={self.product_id} stock={self.stock}>"
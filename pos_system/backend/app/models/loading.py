@@ -0,0 +1,54 @@
+"""
+Relationship loading profiles.
+
+Collections that grow with business volume (sales, sale items, branch stock)
+are mapped with lazy="raise_on_sql", so loading an entity never drags its
+history along. Endpoints declare the relationships they need by profile name:
+
+    select(Sale).options(*load_profile("sale.detail"))
+
+Profiles load only what their response shows: a ticket needs the names of
+the branch and the people on it, not their roles, permissions and branches.
+"""
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import ORMOption
+
+from app.models.branch import Branch
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.user import User
+
+
+def _profiles() -> Dict[str, Tuple[ORMOption, ...]]:
+    return {
+        # Sale with its lines and the names shown on a ticket: the names
+        # come joined to the sale row, the lines in a second statement
+        "sale.detail": (
+            selectinload(Sale.items),
+            joinedload(Sale.branch).load_only(Branch.name).lazyload("*"),
+            joinedload(Sale.cashier).load_only(User.full_name).lazyload("*"),
+            joinedload(Sale.customer).load_only(User.full_name).lazyload("*"),
+            joinedload(Sale.delivery_person).load_only(User.full_name).lazyload("*"),
+        ),
+        # Sale lines only (stock restoration on cancel)
+        "sale.items": (
+            selectinload(Sale.items),
+        ),
+        # Product with its category (ProductDetailResponse)
+        "product.detail": (
+            selectinload(Product.category),
+        ),
+    }
+
+
+LOADING_PROFILES = _profiles()
+
+
+def load_profile(name: str) -> List[ORMOption]:
+    """Get the loader options registered for a profile name"""
+    try:
+        return list(LOADING_PROFILES[name])
+    except KeyError:
+        raise ValueError(f"Unknown loading profile: {name}") from None
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, TYPE_CHECKING
-from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Boolean, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
@@ -28,7 +28,7 @@ class Category(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    products: Mapped[List["Product"]] = relationship("Product", back_populates="category", lazy="selectin")
+    products: Mapped[List["Product"]] = relationship("Product", back_populates="category", lazy="raise_on_sql")
     children: Mapped[List["Category"]] = relationship("Category", back_populates="parent", lazy="selectin")
     parent: Mapped[Optional["Category"]] = relationship("Category", back_populates="children", remote_side=[id])
     
@@ -38,6 +38,13 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Catalog listing order and keyset cursors
+        Index("ix_products_name_id", "name", "id"),
+        # Catalog versions and deltas
+        Index("ix_products_updated_at", "updated_at"),
+        Index("ix_products_category_id", "category_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     sku: Mapped[str] = mapped_column(String(50), unique=True, index=True, nullable=False)
@@ -66,9 +73,10 @@ class Product(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    category: Mapped["Category"] = relationship("Category", back_populates="products", lazy="selectin")
-    branch_stocks: Mapped[List["BranchProduct"]] = relationship("BranchProduct", back_populates="product", lazy="selectin")
-    sale_items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="product", lazy="selectin")
+    # Load through app.models.loading profiles only
+    category: Mapped["Category"] = relationship("Category", back_populates="products", lazy="raise_on_sql")
+    branch_stocks: Mapped[List["BranchProduct"]] = relationship("BranchProduct", back_populates="product", lazy="raise_on_sql")
+    sale_items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="product", lazy="raise_on_sql")
     
     @property
     def price_with_tax(self) -> float:
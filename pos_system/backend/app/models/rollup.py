@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Enum, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.session import Base
+from app.models.sale import PaymentMethod
+
+
+class SalesRollup(Base):
+    """Completed-sale totals per time bucket, branch, cashier and payment method"""
+    __tablename__ = "sales_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket_start", "branch_id", "cashier_id", "payment_method",
+            name="uq_sales_rollups_bucket"
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    granularity: Mapped[str] = mapped_column(String(10), nullable=False)  # hour, day
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    branch_id: Mapped[int] = mapped_column(Integer, ForeignKey("branches.id"), nullable=False)
+    cashier_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    payment_method: Mapped[PaymentMethod] = mapped_column(Enum(PaymentMethod), nullable=False)
+
+    sale_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_revenue: Mapped[float] = mapped_column(Float, default=0)
+    total_tax: Mapped[float] = mapped_column(Float, default=0)
+    total_discounts: Mapped[float] = mapped_column(Float, default=0)
+
+    def __repr__(self):
+        return f"<SalesRollup {self.granularity} {self.bucket_start} branch={self.branch_id}>"
+
+
+class SalesRollupState(Base):
+    """Single row written by the last full rebuild of sales_rollups"""
+    __tablename__ = "sales_rollup_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    rebuilt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_sale_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, TYPE_CHECKING
-from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Boolean, Text, Enum
+from sqlalchemy import String, Integer, Float, ForeignKey, DateTime, Boolean, Text, Enum, Index, bindparam, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
@@ -37,6 +37,22 @@ class DeliveryStatus(str, enum.Enum):
 
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        # Newest-first listings and keyset cursors, report date ranges
+        Index("ix_sales_created_at_id", "created_at", "id"),
+        # Listings scoped by branch, role or status, in listing order
+        Index("ix_sales_branch_created_at", "branch_id", "created_at", "id"),
+        Index("ix_sales_cashier_created_at", "cashier_id", "created_at", "id"),
+        Index("ix_sales_customer_created_at", "customer_id", "created_at", "id"),
+        Index("ix_sales_delivery_person_created_at", "delivery_person_id", "created_at", "id"),
+        Index("ix_sales_status_created_at", "status", "created_at", "id"),
+        # Open deliveries queue; see open_delivery_clause()
+        Index(
+            "ix_sales_open_deliveries", "created_at", "id",
+            sqlite_where=text("delivery_status IN ('PENDING', 'ASSIGNED')"),
+            postgresql_where=text("delivery_status IN ('PENDING', 'ASSIGNED')")
+        ),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     sale_number: Mapped[str] = mapped_column(String(50), unique=True, index=True, nullable=False)
@@ -75,18 +91,62 @@ class Sale(Base):
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
     # Relationships
-    branch: Mapped["Branch"] = relationship("Branch", back_populates="sales", lazy="selectin")
-    cashier: Mapped["User"] = relationship("User", back_populates="sales", foreign_keys=[cashier_id], lazy="selectin")
-    customer: Mapped[Optional["User"]] = relationship("User", foreign_keys=[customer_id], lazy="selectin")
-    delivery_person: Mapped[Optional["User"]] = relationship("User", back_populates="deliveries", foreign_keys=[delivery_person_id], lazy="selectin")
-    items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="sale", lazy="selectin", cascade="all, delete-orphan")
+    # Load through app.models.loading profiles only
+    branch: Mapped["Branch"] = relationship("Branch", back_populates="sales", lazy="raise_on_sql")
+    cashier: Mapped["User"] = relationship("User", back_populates="sales", foreign_keys=[cashier_id], lazy="raise_on_sql")
+    customer: Mapped[Optional["User"]] = relationship("User", foreign_keys=[customer_id], lazy="raise_on_sql")
+    delivery_person: Mapped[Optional["User"]] = relationship("User", back_populates="deliveries", foreign_keys=[delivery_person_id], lazy="raise_on_sql")
+    items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="sale", lazy="raise_on_sql", cascade="all, delete-orphan")
+    
+    # Names for SaleDetailResponse, from the relationships that are loaded
+    # (never loads one)
+    @property
+    def branch_name(self) -> Optional[str]:
+        branch = self.__dict__.get("branch")
+        return branch.name if branch is not None else None
+    
+    @property
+    def cashier_name(self) -> Optional[str]:
+        cashier = self.__dict__.get("cashier")
+        return cashier.full_name if cashier is not None else None
+    
+    @property
+    def customer_name(self) -> Optional[str]:
+        customer = self.__dict__.get("customer")
+        return customer.full_name if customer is not None else None
+    
+    @property
+    def delivery_person_name(self) -> Optional[str]:
+        delivery_person = self.__dict__.get("delivery_person")
+        return delivery_person.full_name if delivery_person is not None else None
     
     def __repr__(self):
         return f"<Sale {self.sale_number} total={self.total}>"
 
 
+def open_delivery_clause():
+    """
+    delivery_status IN ('PENDING', 'ASSIGNED') with the values rendered
+    inline: the planner only matches the partial index ix_sales_open_deliveries
+    against literal values, not bound parameters.
+    """
+    return Sale.delivery_status.in_(
+        bindparam(
+            "open_delivery_statuses",
+            [DeliveryStatus.PENDING, DeliveryStatus.ASSIGNED],
+            type_=Sale.__table__.c.delivery_status.type,
+            expanding=True,
+            literal_execute=True
+        )
+    )
+
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
+    __table_args__ = (
+        # Lines of a sale (detail, cancel)
+        Index("ix_sale_items_sale_id", "sale_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     sale_id: Mapped[int] = mapped_column(Integer, ForeignKey("sales.id", ondelete='CASCADE'), nullable=False)
@@ -107,7 +167,7 @@ class SaleItem(Base):
     
     # Relationships
     sale: Mapped["Sale"] = relationship("Sale", back_populates="items")
-    product: Mapped["Product"] = relationship("Product", back_populates="sale_items", lazy="selectin")
+    product: Mapped["Product"] = relationship("Product", back_populates="sale_items", lazy="raise_on_sql")
     
     def __repr__(self):
         return f"<SaleItem {self.product_name} x{self.quantity}>"
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Integer, Float, ForeignKey, DateTime, Enum, Index
+from sqlalchemy.orm import Mapped, mapped_column
+import enum
+
+from app.db.session import Base
+
+
+class MovementKind(str, enum.Enum):
+    SALE = "sale"
+    CANCEL = "cancel"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+
+
+class StockMovement(Base):
+    """Append-only change of a product's stock in a branch; rows are never updated"""
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_branch_created_at", "branch_id", "created_at"),
+        Index("ix_stock_movements_branch_product_created_at", "branch_id", "product_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    branch_id: Mapped[int] = mapped_column(Integer, ForeignKey("branches.id"), nullable=False)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), nullable=False)
+    kind: Mapped[MovementKind] = mapped_column(Enum(MovementKind), nullable=False)
+    quantity: Mapped[float] = mapped_column(Float, nullable=False)  # Signed: negative takes stock out
+
+    # Plain ids, not foreign keys: the ledger outlives the rows it mentions
+    sale_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    user_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<StockMovement {self.kind} {self.quantity:+g} product={self.product_id} branch={self.branch_id}>"
+
+
+class StockSnapshot(Base):
+    """Stock of a branch as of taken_at: every movement up to then is folded in"""
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        Index("ix_stock_snapshots_branch_taken_at", "branch_id", "taken_at", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    branch_id: Mapped[int] = mapped_column(Integer, ForeignKey("branches.id"), nullable=False)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StockSnapshot branch={self.branch_id} {self.taken_at}>"
+
+
+class StockSnapshotItem(Base):
+    """Non-zero stock of one product in a snapshot"""
+    __tablename__ = "stock_snapshot_items"
+
+    snapshot_id: Mapped[int] = mapped_column(Integer, ForeignKey("stock_snapshots.id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), primary_key=True)
+    stock: Mapped[float] = mapped_column(Float, nullable=False)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, TYPE_CHECKING
-from sqlalchemy import String, Boolean, Integer, ForeignKey, DateTime, Table, Column
+from sqlalchemy import String, Boolean, Integer, ForeignKey, DateTime, Table, Column, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -22,6 +22,10 @@ user_branches = Table(
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Newest-first listing and keyset cursors
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
@@ -31,6 +35,8 @@ class User(Base):
     phone: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_superuser: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Bumped on deactivation, password or profile change (see app.core.tokens)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     
     role_id: Mapped[int] = mapped_column(Integer, ForeignKey("roles.id"), nullable=False)
     primary_branch_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("branches.id"), nullable=True)
@@ -43,21 +49,19 @@ class User(Base):
     role: Mapped["Role"] = relationship("Role", back_populates="users", lazy="selectin")
     primary_branch: Mapped[Optional["Branch"]] = relationship("Branch", foreign_keys=[primary_branch_id], lazy="selectin")
     branches: Mapped[List["Branch"]] = relationship("Branch", secondary=user_branches, back_populates="users", lazy="selectin")
-    sales: Mapped[List["Sale"]] = relationship("Sale", back_populates="cashier", foreign_keys="Sale.cashier_id", lazy="selectin")
-    deliveries: Mapped[List["Sale"]] = relationship("Sale", back_populates="delivery_person", foreign_keys="Sale.delivery_person_id", lazy="selectin")
+    # Unbounded histories: load through app.models.loading profiles only
+    sales: Mapped[List["Sale"]] = relationship("Sale", back_populates="cashier", foreign_keys="Sale.cashier_id", lazy="raise_on_sql")
+    deliveries: Mapped[List["Sale"]] = relationship("Sale", back_populates="delivery_person", foreign_keys="Sale.delivery_person_id", lazy="raise_on_sql")
     
     async def get_permissions(self, db: AsyncSession) -> List[str]:
         """Get all permissions for this user"""
-        await db.refresh(self, ["role"])
-        if self.role:
-            from app.models.role import RolePermission, Permission
-            result = await db.execute(
-                select(Permission.code)
-                .join(RolePermission, Permission.id == RolePermission.permission_id)
-                .where(RolePermission.role_id == self.role_id)
-            )
-            return [row[0] for row in result.fetchall()]
-        return []
+        from app.models.role import Permission, role_permissions
+        result = await db.execute(
+            select(Permission.code)
+            .join(role_permissions, Permission.id == role_permissions.c.permission_id)
+            .where(role_permissions.c.role_id == self.role_id)
+        )
+        return [row[0] for row in result.fetchall()]
     
     def __repr__(self):
         return f"<User {self.username}>"
@@ -0,0 +1,29 @@
+"""
+Script to rebuild the pre-aggregated sales rollups from the sales table
+Run: python -m app.rebuild_rollups
+"""
+import asyncio
+import time
+from app.db.session import AsyncSessionLocal, init_db
+from app.services.rollups import rebuild_rollups as rebuild
+
+
+async def rebuild_rollups():
+    """Recompute every sales rollup bucket"""
+    await init_db()
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            print("Reconstruyendo resúmenes de ventas...")
+            started_at = time.perf_counter()
+            written = await rebuild(db)
+            await db.commit()
+            print(f"{written} resúmenes escritos en {time.perf_counter() - started_at:.1f}s")
+        except Exception as e:
+            await db.rollback()
+            print(f"Error al reconstruir: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_rollups())
@@ -17,12 +17,12 @@ from app.schemas.branch import (
 from app.schemas.product import (
     CategoryBase, CategoryCreate, CategoryUpdate, CategoryResponse,
     ProductBase, ProductCreate, ProductUpdate, ProductResponse,
-    ProductDetailResponse, ProductWithStockResponse
+    ProductDetailResponse, ProductWithStockResponse, BranchCatalogResponse
 )
 from app.schemas.sale import (
     PaymentMethodEnum, SaleStatusEnum, DeliveryStatusEnum,
     SaleItemBase, SaleItemCreate, SaleItemResponse,
     SaleBase, SaleCreate, SaleUpdate, SaleResponse, SaleDetailResponse,
     DeliveryAssignRequest, DeliveryUpdateRequest,
-    CartItem, CartSummary
+    CartItem, CartSummary, ColumnarExportRequest, ColumnarExportResponse
 )
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field, EmailStr
+from enum import Enum
 
 
 class BranchBase(BaseModel):
@@ -51,7 +52,7 @@ class BranchResponse(BranchBase):
 class BranchProductBase(BaseModel):
     branch_id: int
     product_id: int
-    stock: int = 0
+    stock: float = 0
     min_stock: int = 5
     max_stock: int = 100
     custom_price: Optional[float] = None
@@ -63,7 +64,7 @@ class BranchProductCreate(BranchProductBase):
 
 
 class BranchProductUpdate(BaseModel):
-    stock: Optional[int] = None
+    stock: Optional[float] = None
     min_stock: Optional[int] = None
     max_stock: Optional[int] = None
     custom_price: Optional[float] = None
@@ -80,5 +81,65 @@ class BranchProductResponse(BranchProductBase):
 
 
 class StockUpdateRequest(BaseModel):
-    quantity: int = Field(..., description="Cantidad a agregar (positivo) o quitar (negativo)")
+    quantity: float = Field(..., description="Cantidad a agregar (positivo) o quitar (negativo)")
     reason: Optional[str] = None
+
+
+class StockMovementRow(BaseModel):
+    """One line of a bulk stock movement: delta or absolute stock, plus optional settings"""
+    product_id: int
+    delta: Optional[float] = Field(None, description="Cantidad a agregar (positivo) o quitar (negativo)")
+    stock: Optional[float] = Field(None, ge=0, description="Stock absoluto, p. ej. de un conteo físico")
+    min_stock: Optional[int] = Field(None, ge=0)
+    max_stock: Optional[int] = Field(None, ge=0)
+    custom_price: Optional[float] = Field(None, ge=0)
+    is_available: Optional[bool] = None
+
+
+class StockMovementError(BaseModel):
+    row: int  # 1-based position in the request (data lines for CSV)
+    product_id: Optional[int] = None
+    detail: str
+
+
+class StockMovementResult(BaseModel):
+    received: int
+    applied: int
+    created: int  # Products stocked in the branch for the first time
+    failed: int
+    errors: List[StockMovementError]
+
+
+class MovementKindEnum(str, Enum):
+    SALE = "sale"
+    CANCEL = "cancel"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+
+
+class StockLedgerEntry(BaseModel):
+    """One movement of the stock ledger; quantity is negative when stock goes out"""
+    id: int
+    product_id: int
+    kind: MovementKindEnum
+    quantity: float
+    sale_id: Optional[int] = None
+    user_id: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class StockAtResponse(BaseModel):
+    product_id: int
+    stock: float
+
+
+class LowStockItem(BaseModel):
+    """A product at or below its minimum stock; reorder_quantity brings it back to max_stock"""
+    product_id: int
+    stock: float
+    min_stock: int
+    max_stock: int
+    reorder_quantity: float
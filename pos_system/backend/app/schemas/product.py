@@ -94,6 +94,53 @@ class ProductDetailResponse(ProductResponse):
 
 
 class ProductWithStockResponse(ProductDetailResponse):
-    stock: int = 0
+    stock: float = 0
     branch_price: Optional[float] = None
     is_available: bool = True
+
+
+class BranchCatalogResponse(BaseModel):
+    """Full catalog of a branch (since is None) or the products changed since a version"""
+    branch_id: int
+    version: str
+    since: Optional[str] = None
+    products: List[ProductWithStockResponse]
+
+
+class ProductImportRow(BaseModel):
+    """
+    One line of a catalog import, keyed by SKU. Fields left out keep their
+    current value; a new product needs at least name, price and category.
+    """
+    sku: str = Field(..., min_length=2, max_length=50)
+    barcode: Optional[str] = Field(None, max_length=100)
+    name: Optional[str] = Field(None, min_length=2, max_length=255)
+    description: Optional[str] = None
+    price: Optional[float] = Field(None, gt=0)
+    cost: Optional[float] = Field(None, ge=0)
+    tax_rate: Optional[float] = Field(None, ge=0, le=1)
+    category: Optional[str] = Field(None, description="Slug de la categoría")
+    category_id: Optional[int] = None
+    unit: Optional[str] = Field(None, max_length=20)
+    image_url: Optional[str] = Field(None, max_length=500)
+    is_active: Optional[bool] = None
+    is_featured: Optional[bool] = None
+    allow_decimal_qty: Optional[bool] = None
+
+
+class ProductImportError(BaseModel):
+    row: int  # 1-based position in the file (data lines for CSV)
+    sku: Optional[str] = None
+    detail: str
+
+
+class ProductImportResult(BaseModel):
+    # Counts of rows; rows merged into one SKU count once each
+    received: int
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    errors: List[ProductImportError]
+    seconds: float
+    rows_per_second: float
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from enum import Enum
@@ -149,3 +149,19 @@ class CartSummary(BaseModel):
     discount_amount: float
     total: float
     item_count: int
+
+
+class ColumnarExportRequest(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    branch_ids: Optional[List[int]] = None
+    force: bool = Field(False, description="Reescribir particiones ya exportadas")
+
+
+class ColumnarExportResponse(BaseModel):
+    partitions_written: int
+    partitions_skipped: int
+    sales: int
+    sale_items: int
+    bytes_written: int
+    days: List[str]
@@ -0,0 +1,221 @@
+"""
+Columnar (Parquet) export of sales and sale lines for analytics.
+
+Files are laid out as Hive-style partitions by branch and day, readable
+as one dataset by pyarrow, DuckDB, Spark or pandas:
+
+    <ANALYTICS_EXPORT_DIR>/sales/branch_id=1/date=2024-06-15/part-0.parquet
+    <ANALYTICS_EXPORT_DIR>/sale_items/branch_id=1/date=2024-06-15/part-0.parquet
+
+Each (branch, day) is read with one indexed range per table, streamed in
+batches of EXPORT_YIELD_PER rows. Batches are turned into Arrow columns
+without building Python objects per value: dates and enums come back as
+raw strings and are parsed/dictionary-encoded by Arrow. Row groups of
+ANALYTICS_ROW_GROUP_ROWS are written as they fill, so memory is bounded
+by one row group whatever the size of a day.
+
+Exports are incremental: a partition whose files exist is not read
+again, and only closed days (before today, UTC) are exported, so a day is
+written once it can no longer grow. Later changes to an exported day
+(a cancellation, say) need force=True for that range. Files are written
+under a temporary name and renamed, so a partition is never half there.
+"""
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import Enum, String, select, func, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.branch import Branch
+from app.models.sale import Sale, SaleItem
+from app.services.exports import EXPORT_COLUMNS
+
+# branch_id is the partition key, stored in the path (Hive layout)
+SALES_COLUMNS = tuple(column for column in EXPORT_COLUMNS if column.key != "branch_id")
+
+SALE_ITEM_COLUMNS = (
+    SaleItem.id, SaleItem.sale_id, SaleItem.product_id, SaleItem.product_sku, SaleItem.product_name,
+    SaleItem.quantity, SaleItem.unit_price, SaleItem.tax_rate, SaleItem.discount,
+    SaleItem.subtotal, SaleItem.tax_amount, SaleItem.total,
+)
+
+PARTITION_FILE = "part-0.parquet"
+
+
+@dataclass
+class ColumnarExportResult:
+    partitions_written: int = 0
+    partitions_skipped: int = 0
+    sales: int = 0
+    sale_items: int = 0
+    bytes_written: int = 0
+    days: List[str] = field(default_factory=list)
+
+
+def _arrow_type(column) -> pa.DataType:
+    if isinstance(column.type, Enum):
+        return pa.dictionary(pa.int8(), pa.string())
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return pa.timestamp("us")
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is bool:
+        return pa.bool_()
+    return pa.string()
+
+
+def _schema(columns) -> pa.Schema:
+    return pa.schema([pa.field(column.key, _arrow_type(column)) for column in columns])
+
+
+SALES_SCHEMA = _schema(SALES_COLUMNS)
+SALE_ITEMS_SCHEMA = _schema(SALE_ITEM_COLUMNS)
+
+
+def _raw(column):
+    """Select dates and enums as stored, for Arrow to convert in bulk"""
+    if isinstance(column.type, Enum) or column.type.python_type is datetime:
+        return type_coerce(column, String).label(column.key)
+    return column
+
+
+def _arrow_column(values: Sequence, column, arrow_type: pa.DataType) -> pa.Array:
+    if isinstance(column.type, Enum):
+        # Stored as member names; encode against the enum's values
+        members = list(column.type.enum_class)
+        indices = pc.index_in(pa.array(values, type=pa.string()), value_set=pa.array([m.name for m in members]))
+        return pa.DictionaryArray.from_arrays(indices.cast(pa.int8()), pa.array([m.value for m in members]))
+    if arrow_type == pa.timestamp("us"):
+        array = pa.array(values)
+        # SQLite returns text, PostgreSQL datetimes
+        return array.cast(arrow_type) if array.type != arrow_type else array
+    return pa.array(values, type=arrow_type)
+
+
+def _record_batch(rows: Sequence[Tuple], columns, schema: pa.Schema) -> pa.RecordBatch:
+    values = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [_arrow_column(values[i], column, schema.field(i).type) for i, column in enumerate(columns)],
+        schema=schema
+    )
+
+
+def partition_path(root: str, table: str, branch_id: int, day: date) -> str:
+    return os.path.join(root, table, f"branch_id={branch_id}", f"date={day.isoformat()}", PARTITION_FILE)
+
+
+async def _write_partition(db: AsyncSession, query, columns, schema: pa.Schema, path: str) -> Tuple[int, int]:
+    """Stream query into a Parquet file at path; returns (rows, bytes)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    writer = pq.ParquetWriter(temporary, schema, compression="zstd")
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    rows = 0
+    try:
+        result = await db.stream(query.execution_options(yield_per=settings.EXPORT_YIELD_PER))
+        async for partition in result.partitions():
+            batch = _record_batch(partition, columns, schema)
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            rows += batch.num_rows
+            if pending_rows >= settings.ANALYTICS_ROW_GROUP_ROWS:
+                await asyncio.to_thread(writer.write_table, pa.Table.from_batches(pending, schema))
+                pending, pending_rows = [], 0
+        if pending:
+            await asyncio.to_thread(writer.write_table, pa.Table.from_batches(pending, schema))
+    except BaseException:
+        writer.close()
+        os.remove(temporary)
+        raise
+    writer.close()
+    os.replace(temporary, path)
+    return rows, os.path.getsize(path)
+
+
+def _day_range(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def _days(date_from: date, date_to: date) -> Iterable[date]:
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += timedelta(days=1)
+
+
+async def export_columnar(
+    db: AsyncSession,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    branch_ids: Optional[List[int]] = None,
+    output_dir: Optional[str] = None,
+    force: bool = False
+) -> ColumnarExportResult:
+    """
+    Write the (branch, day) partitions of sales and sale lines between
+    date_from and date_to (inclusive) that are not exported yet.
+    Defaults: from the first sale, up to yesterday, every branch.
+    """
+    root = output_dir or settings.ANALYTICS_EXPORT_DIR
+    last_closed_day = datetime.utcnow().date() - timedelta(days=1)
+    date_to = min(date_to or last_closed_day, last_closed_day)
+    if date_from is None:
+        first_sale = (await db.execute(select(func.min(Sale.created_at)))).scalar()
+        if first_sale is None:
+            return ColumnarExportResult()
+        date_from = first_sale.date()
+    if branch_ids is None:
+        branch_ids = list((await db.execute(select(Branch.id).order_by(Branch.id))).scalars())
+
+    sales_columns = [_raw(column) for column in SALES_COLUMNS]
+    item_columns = [_raw(column) for column in SALE_ITEM_COLUMNS]
+    result = ColumnarExportResult()
+    written_days: Dict[str, None] = {}
+
+    for branch_id in branch_ids:
+        for day in _days(date_from, date_to):
+            sales_path = partition_path(root, "sales", branch_id, day)
+            items_path = partition_path(root, "sale_items", branch_id, day)
+            if not force and os.path.exists(sales_path) and os.path.exists(items_path):
+                result.partitions_skipped += 1
+                continue
+
+            start, end = _day_range(day)
+            in_day = (Sale.branch_id == branch_id) & (Sale.created_at >= start) & (Sale.created_at < end)
+            has_sales = (await db.execute(select(Sale.id).where(in_day).limit(1))).first() is not None
+            if not has_sales:
+                # Nothing to write; a closed empty day costs one index probe per run
+                continue
+
+            # Lines first: the sales file marks the partition as complete
+            items, items_bytes = await _write_partition(
+                db,
+                select(*item_columns).join(Sale, Sale.id == SaleItem.sale_id).where(in_day)
+                .order_by(SaleItem.sale_id, SaleItem.id),
+                SALE_ITEM_COLUMNS, SALE_ITEMS_SCHEMA, items_path
+            )
+            sales, sales_bytes = await _write_partition(
+                db,
+                select(*sales_columns).where(in_day).order_by(Sale.created_at, Sale.id),
+                SALES_COLUMNS, SALES_SCHEMA, sales_path
+            )
+            result.partitions_written += 1
+            result.sales += sales
+            result.sale_items += items
+            result.bytes_written += sales_bytes + items_bytes
+            written_days[day.isoformat()] = None
+
+    result.days = sorted(written_days)
+    return result
@@ -0,0 +1,127 @@
+"""
+Process-local scanner index.
+
+Maps barcodes and SKUs to the serialized ProductDetailResponse of their
+product, so a repeat scan is a dict lookup with no SQL, ORM or validation
+work. Codes that are not indexed yet are looked up in the database and
+added (barcode first, then SKU, one indexed equality each).
+
+Every change to the index bumps its version. A lookup that started before
+a change does not store its (possibly outdated) row afterwards. The product
+endpoints drop a product's entries after create, update and delete, and
+everything after a category change. Other worker processes only see those
+changes once their entries expire after BARCODE_INDEX_TTL_SECONDS. Entries
+are filled from the primary, never from a read replica that may lag.
+"""
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.loading import load_profile
+from app.models.product import Product
+from app.schemas.product import ProductDetailResponse
+
+
+class BarcodeIndex:
+    """code -> (expires_at, product_id, JSON body), with a product_id -> codes reverse map"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: Dict[str, Tuple[float, int, bytes]] = {}
+        self._codes: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, code: str) -> Optional[bytes]:
+        entry = self._entries.get(code)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(code)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[2]
+
+    def put(self, codes, product_id: int, body: bytes, version: int) -> None:
+        """Store body under codes unless the index changed since version"""
+        if not self.enabled or version != self.version:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        for code in codes:
+            if not code:
+                continue
+            if code not in self._entries and len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._entries[code] = (expires_at, product_id, body)
+            self._codes.setdefault(product_id, set()).add(code)
+
+    def invalidate_product(self, product_id: int) -> None:
+        self.version += 1
+        for code in self._codes.pop(product_id, set()):
+            self._entries.pop(code, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
+        self._codes.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "version": self.version, "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, code: str) -> None:
+        entry = self._entries.pop(code, None)
+        if entry is not None:
+            codes = self._codes.get(entry[1])
+            if codes is not None:
+                codes.discard(code)
+                if not codes:
+                    del self._codes[entry[1]]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+barcode_index = BarcodeIndex(
+    ttl_seconds=settings.BARCODE_INDEX_TTL_SECONDS,
+    max_entries=settings.BARCODE_INDEX_MAX_ENTRIES
+)
+
+
+async def lookup_code(
+    db: AsyncSession, code: str, primary_db: Optional[AsyncSession] = None
+) -> Optional[bytes]:
+    """
+    JSON ProductDetailResponse for a barcode or SKU, or None if unknown.
+    While the index is enabled, misses are read from primary_db when given:
+    a lagging replica would otherwise pin an outdated product for the TTL.
+    """
+    body = barcode_index.get(code)
+    if body is not None:
+        return body
+    if barcode_index.enabled and primary_db is not None:
+        db = primary_db
+
+    version = barcode_index.version
+    product = None
+    for column in (Product.barcode, Product.sku):
+        result = await db.execute(
+            select(Product).options(*load_profile("product.detail")).where(column == code)
+        )
+        product = result.scalar_one_or_none()
+        if product is not None:
+            break
+    if product is None:
+        return None
+
+    body = ProductDetailResponse.model_validate(product).model_dump_json().encode()
+    barcode_index.put((product.barcode, product.sku), product.id, body, version)
+    return body
@@ -0,0 +1,177 @@
+"""
+Branch catalog snapshots and deltas for tills.
+
+A branch catalog's version is the latest updated_at among products,
+categories and that branch's stock rows. It is computed with three index
+lookups, so a till polling for changes costs almost nothing:
+
+  - the full snapshot is served with ETag = version, and answered with
+    304 Not Modified while the till's If-None-Match still matches;
+  - since=<version> returns only the products whose product row, category
+    or branch stock row changed after that version. Deactivated products
+    are included (is_active false) so tills can drop them.
+
+updated_at is set when a statement runs, not when its transaction
+commits. A delta therefore reaches CATALOG_DELTA_OVERLAP_SECONDS further
+back than asked, so a slow transaction that commits after a till synced
+is still picked up. Tills upsert by id, so the repeats are harmless. For
+the same reason a version is only answered with 304 (and its snapshot
+cached) once it is older than that window.
+
+Serialized snapshots are kept per (branch, version) for the fleet of
+tills that will ask for the same one.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import select, func, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.branch import BranchProduct
+from app.models.loading import load_profile
+from app.models.product import Product, Category
+from app.schemas.product import BranchCatalogResponse, ProductWithStockResponse
+
+EMPTY_VERSION = "0"
+
+
+class InvalidCatalogVersion(ValueError):
+    pass
+
+
+def product_with_stock(product: Product, branch_product: Optional[BranchProduct]) -> ProductWithStockResponse:
+    """Response row for a product and its (optional) stock row in a branch"""
+    return ProductWithStockResponse(
+        id=product.id,
+        sku=product.sku,
+        barcode=product.barcode,
+        name=product.name,
+        description=product.description,
+        price=product.price,
+        cost=product.cost,
+        tax_rate=product.tax_rate,
+        category_id=product.category_id,
+        unit=product.unit,
+        image_url=product.image_url,
+        allow_decimal_qty=product.allow_decimal_qty,
+        is_active=product.is_active,
+        is_featured=product.is_featured,
+        created_at=product.created_at,
+        updated_at=product.updated_at,
+        category=product.category,
+        price_with_tax=product.price_with_tax,
+        stock=branch_product.stock if branch_product else 0,
+        branch_price=branch_product.custom_price if branch_product else None,
+        is_available=branch_product.is_available if branch_product else True
+    )
+
+
+def parse_version(version: str) -> Optional[datetime]:
+    if version == EMPTY_VERSION:
+        return None
+    try:
+        return datetime.fromisoformat(version)
+    except ValueError:
+        raise InvalidCatalogVersion(version)
+
+
+def version_settled(version: str) -> bool:
+    """Whether no transaction still running can commit rows older than version"""
+    stamp = parse_version(version)
+    if stamp is None:
+        return True
+    return stamp <= datetime.utcnow() - timedelta(seconds=settings.CATALOG_DELTA_OVERLAP_SECONDS)
+
+
+async def catalog_version(db: AsyncSession, branch_id: int) -> str:
+    result = await db.execute(
+        select(
+            select(func.max(Product.updated_at)).scalar_subquery(),
+            select(func.max(Category.updated_at)).scalar_subquery(),
+            select(func.max(BranchProduct.updated_at))
+            .where(BranchProduct.branch_id == branch_id)
+            .scalar_subquery(),
+        )
+    )
+    stamps = [stamp for stamp in result.one() if stamp is not None]
+    return max(stamps).isoformat() if stamps else EMPTY_VERSION
+
+
+def _catalog_query(branch_id: int):
+    return (
+        select(Product, BranchProduct)
+        .options(*load_profile("product.detail"))
+        .outerjoin(
+            BranchProduct,
+            (BranchProduct.product_id == Product.id) & (BranchProduct.branch_id == branch_id)
+        )
+        .order_by(Product.id)
+    )
+
+
+async def catalog_snapshot(db: AsyncSession, branch_id: int, version: str) -> BranchCatalogResponse:
+    """Every active product with its stock in the branch"""
+    result = await db.execute(_catalog_query(branch_id).where(Product.is_active == True))
+    return BranchCatalogResponse(
+        branch_id=branch_id,
+        version=version,
+        products=[product_with_stock(product, branch_product) for product, branch_product in result.all()]
+    )
+
+
+async def catalog_delta(db: AsyncSession, branch_id: int, since: str, version: str) -> BranchCatalogResponse:
+    """Products (active or not) changed after since, with their stock in the branch"""
+    since_at = parse_version(since)
+    if since_at is None:
+        changed = None
+    else:
+        cutoff = since_at - timedelta(seconds=settings.CATALOG_DELTA_OVERLAP_SECONDS)
+        # One indexed range per source instead of an OR across the join
+        changed = union(
+            select(Product.id).where(Product.updated_at > cutoff),
+            select(BranchProduct.product_id).where(
+                (BranchProduct.branch_id == branch_id) & (BranchProduct.updated_at > cutoff)
+            ),
+            select(Product.id).where(
+                Product.category_id.in_(select(Category.id).where(Category.updated_at > cutoff))
+            ),
+        )
+
+    query = _catalog_query(branch_id)
+    query = query.where(Product.id.in_(changed)) if changed is not None else query.where(Product.is_active == True)
+    result = await db.execute(query)
+    return BranchCatalogResponse(
+        branch_id=branch_id,
+        version=version,
+        since=since,
+        products=[product_with_stock(product, branch_product) for product, branch_product in result.all()]
+    )
+
+
+class SnapshotCache:
+    """LRU of serialized snapshots keyed by (branch_id, version)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], bytes]" = OrderedDict()
+
+    def get(self, branch_id: int, version: str) -> Optional[bytes]:
+        body = self._entries.get((branch_id, version))
+        if body is not None:
+            self._entries.move_to_end((branch_id, version))
+        return body
+
+    def set(self, branch_id: int, version: str, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        # An older version of this branch will not be asked for again
+        for key in [key for key in self._entries if key[0] == branch_id]:
+            del self._entries[key]
+        self._entries[(branch_id, version)] = body
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+snapshot_cache = SnapshotCache(max_entries=settings.CATALOG_SNAPSHOT_CACHE_SIZE)
@@ -0,0 +1,93 @@
+"""
+Row streams for bulk imports.
+
+Bulk endpoints and CLIs read their input as it arrives instead of
+buffering it: csv_rows and ndjson_rows turn a stream of byte chunks into
+one dict per line, and the importers (app.services.stock_import,
+app.services.product_import) validate and write them in chunks. Memory
+stays bounded by the chunk size whatever the size of the file.
+"""
+import codecs
+import csv
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Union
+
+import orjson
+from pydantic import ValidationError
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def json_rows(body: bytes, key: str) -> List[Any]:
+    """Rows of a JSON body, {key: [...]} or a bare array; ValueError if malformed"""
+    data = orjson.loads(body)
+    rows = data.get(key) if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise ValueError(f"Expected a list of {key}")
+    return rows
+
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[List[str]]:
+    """Complete lines of a UTF-8 stream, in batches as the bytes arrive"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+async def csv_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Rows of a CSV stream, header first; empty cells are left out"""
+    header: Optional[List[str]] = None
+    async for lines in _lines(chunks):
+        for values in csv.reader(lines):
+            if not values:
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield {name: value.strip() for name, value in zip(header, values) if value.strip()}
+
+
+async def ndjson_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """
+    Rows of a newline-delimited JSON stream. A line that is not valid JSON
+    is passed on as its text, for the importer to report as an invalid row.
+    """
+    async for lines in _lines(chunks):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                yield line
+
+
+def validation_detail(error: ValidationError) -> str:
+    """"field: message" of a row's first validation error"""
+    first = error.errors()[0]
+    field = ".".join(str(part) for part in first["loc"])
+    return f"{field}: {first['msg']}" if field else first["msg"]
+
+
+async def iterate(rows: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    """Async iteration over rows already in memory (e.g. a parsed JSON body) or a stream"""
+    if isinstance(rows, AsyncIterable):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def file_chunks(path: str, size: int = FILE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Chunks of a local file, for the import CLIs"""
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
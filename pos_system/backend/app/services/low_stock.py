@@ -0,0 +1,250 @@
+"""
+Incremental low-stock tracking.
+
+Instead of dashboards polling GET /branches/{id}/inventory?low_stock=true,
+which scans the branch's stock rows on every poll, each worker keeps the
+set of products at or below their min_stock per branch and pushes changes
+to it:
+
+  - every stock write (app.services.stock, app.services.stock_import,
+    adding a product to a branch) reads back the rows it changed with
+    RETURNING, at no extra statement, and stages them on the session with
+    stage_levels();
+  - when the transaction commits, the staged rows are applied: a product
+    that falls to its threshold enters the set, one restocked above it
+    leaves, and either crossing (or a change of a product still in the
+    set) is sent to the branch's subscribers, the server-sent event
+    stream of GET /branches/{id}/inventory/low-stock/stream. A rolled
+    back transaction changes nothing.
+
+A branch's set is read from the database the first time it is asked for
+and again every LOW_STOCK_RESYNC_SECONDS, which is how writes made by other
+worker processes show up; what a resync changes is pushed as well.
+Reorder suggestions bring a product back up to its max_stock.
+"""
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+import orjson
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.session import PrimarySession
+from app.models.branch import BranchProduct
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+
+# What stock writes read back (RETURNING) for stage_levels()
+LEVEL_COLUMNS = (BranchProduct.product_id, BranchProduct.stock, BranchProduct.min_stock, BranchProduct.max_stock)
+
+
+class StockLevel(NamedTuple):
+    stock: float
+    min_stock: int
+    max_stock: int
+
+
+def reorder_quantity(level: StockLevel) -> float:
+    """Quantity that brings a product back up to its max_stock"""
+    return max(level.max_stock - level.stock, 0)
+
+
+def level_event(kind: str, branch_id: int, product_id: int, level: StockLevel) -> Dict:
+    return {
+        "event": kind,
+        "branch_id": branch_id,
+        "product_id": product_id,
+        "stock": level.stock,
+        "min_stock": level.min_stock,
+        "max_stock": level.max_stock,
+        "reorder_quantity": reorder_quantity(level),
+    }
+
+
+def stage_levels(db: AsyncSession, branch_id: int, rows: Iterable[Tuple[int, float, int, int]]) -> None:
+    """
+    Stage (product_id, stock, min_stock, max_stock) rows just written, to be
+    applied to the tracker when the session commits
+    """
+    levels = db.info.setdefault("stock_levels", {})
+    for product_id, stock, min_stock, max_stock in rows:
+        levels[(branch_id, product_id)] = StockLevel(stock, min_stock, max_stock)
+
+
+class LowStockTracker:
+    """branch_id -> {product_id: StockLevel} of the products at or below min_stock"""
+
+    def __init__(self, resync_seconds: int):
+        self.resync_seconds = resync_seconds
+        self._items: Dict[int, Dict[int, StockLevel]] = {}
+        self._loaded_at: Dict[int, float] = {}
+        self._versions: Dict[int, int] = {}
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.loads = 0
+        self.reads = 0
+        self.crossings = 0
+        self.events = 0
+
+    def is_due(self, branch_id: int) -> bool:
+        loaded_at = self._loaded_at.get(branch_id)
+        return loaded_at is None or time.monotonic() - loaded_at >= self.resync_seconds
+
+    def tracked(self, branch_id: int) -> Optional[Dict[int, StockLevel]]:
+        """The branch's set as last applied, without reading the database (None if never read)"""
+        return self._items.get(branch_id)
+
+    async def items(self, db: AsyncSession, branch_id: int) -> Dict[int, StockLevel]:
+        """The branch's low-stock products, read from the database only when due"""
+        self.reads += 1
+        if self.is_due(branch_id):
+            await self.load(db, branch_id)
+        return self._items[branch_id]
+
+    async def load(self, db: AsyncSession, branch_id: int) -> None:
+        """Read the branch's set again and push what changed since the last read"""
+        query = select(*LEVEL_COLUMNS).where(
+            (BranchProduct.branch_id == branch_id) & (BranchProduct.stock <= BranchProduct.min_stock)
+        )
+        # A commit applied while the query ran may be newer than its rows: read again
+        for _ in range(3):
+            version = self._versions.get(branch_id, 0)
+            rows = (await db.execute(query)).all()
+            self.loads += 1
+            if version == self._versions.get(branch_id, 0):
+                break
+
+        fresh = {product_id: StockLevel(stock, min_stock, max_stock) for product_id, stock, min_stock, max_stock in rows}
+        previous = self._items.get(branch_id)
+        self._items[branch_id] = fresh
+        self._loaded_at[branch_id] = time.monotonic()
+        if previous is None:
+            return
+        for product_id in previous.keys() - fresh.keys():
+            self._publish(branch_id, level_event("restored", branch_id, product_id, previous[product_id]))
+            self.crossings += 1
+        for product_id, level in fresh.items():
+            if product_id not in previous:
+                self._publish(branch_id, level_event("low", branch_id, product_id, level))
+                self.crossings += 1
+            elif previous[product_id] != level:
+                self._publish(branch_id, level_event("changed", branch_id, product_id, level))
+
+    def apply(self, levels: Dict[Tuple[int, int], StockLevel]) -> None:
+        """Apply committed stock rows ((branch_id, product_id) -> level)"""
+        for (branch_id, product_id), level in levels.items():
+            self._versions[branch_id] = self._versions.get(branch_id, 0) + 1
+            items = self._items.get(branch_id)
+            if items is None:
+                continue  # Not tracked yet: read in full when first asked for
+
+            was_low = product_id in items
+            is_low = level.stock <= level.min_stock
+            if is_low:
+                items[product_id] = level
+            else:
+                items.pop(product_id, None)
+
+            if is_low and not was_low:
+                self.crossings += 1
+                self._publish(branch_id, level_event("low", branch_id, product_id, level))
+            elif was_low and not is_low:
+                self.crossings += 1
+                self._publish(branch_id, level_event("restored", branch_id, product_id, level))
+            elif is_low:
+                self._publish(branch_id, level_event("changed", branch_id, product_id, level))
+
+    def subscribe(self, branch_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(branch_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, branch_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(branch_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[branch_id]
+
+    def _publish(self, branch_id: int, payload: Dict) -> None:
+        for queue in self._subscribers.get(branch_id, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # A subscriber this far behind gets a fresh snapshot instead (None)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+            self.events += 1
+
+    async def stream(
+        self,
+        branch_id: int,
+        session_factory: async_sessionmaker,
+        is_disconnected: Callable[[], Awaitable[bool]]
+    ) -> AsyncIterator[bytes]:
+        """
+        Server-sent events of a branch: a snapshot of the set first, then
+        low, restored and changed events as they commit. Resyncs when due
+        while idle, with a keepalive comment.
+        """
+        queue = self.subscribe(branch_id)
+        try:
+            snapshot_due = True
+            while not await is_disconnected():
+                if snapshot_due:
+                    async with session_factory() as db:
+                        items = await self.items(db, branch_id)
+                    yield _sse("snapshot", {
+                        "branch_id": branch_id,
+                        "items": [level_event("low", branch_id, product_id, level) for product_id, level in items.items()],
+                    })
+                    snapshot_due = False
+
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=min(KEEPALIVE_SECONDS, self.resync_seconds))
+                except asyncio.TimeoutError:
+                    if self.is_due(branch_id):
+                        # What changed comes back through the queue
+                        async with session_factory() as db:
+                            await self.load(db, branch_id)
+                    yield b": keepalive\n\n"
+                    continue
+                if payload is None:
+                    snapshot_due = True
+                else:
+                    yield _sse(payload["event"], payload)
+        finally:
+            self.unsubscribe(branch_id, queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "branches": len(self._items),
+            "products": sum(len(items) for items in self._items.values()),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "loads_total": self.loads,
+            "reads_total": self.reads,
+            "crossings_total": self.crossings,
+            "events_total": self.events,
+        }
+
+
+def _sse(kind: str, payload: Dict) -> bytes:
+    return b"event: " + kind.encode() + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+
+
+low_stock = LowStockTracker(settings.LOW_STOCK_RESYNC_SECONDS)
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _apply_stock_levels(session):
+    levels = session.info.pop("stock_levels", None)
+    if levels:
+        low_stock.apply(levels)
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _drop_stock_levels(session):
+    session.info.pop("stock_levels", None)
@@ -0,0 +1,197 @@
+"""
+Bulk catalog upsert keyed by SKU.
+
+A supplier catalog of tens of thousands of SKUs is read as a stream (CSV
+or NDJSON, see app.services.ingest) and applied in chunks of
+PRODUCT_IMPORT_CHUNK_SIZE rows within the caller's single transaction:
+
+  1. rows are validated one by one (ProductImportRow) and their category
+     slugs resolved through a slug -> id map read once per import; rows
+     naming the same SKU are merged in order, later fields winning;
+  2. one set query reads the products that hold any of the chunk's SKUs
+     or barcodes. A barcode that belongs to another SKU, or that two SKUs
+     of the chunk claim, is reported as a conflict, as is a new SKU
+     without name, price or category;
+  3. each SKU's fields are laid over its current values (or the column
+     defaults). Rows that change nothing are counted and skipped, so a
+     daily re-import of the same catalog leaves catalog versions alone;
+     the rest go out in one INSERT ... ON CONFLICT (sku) DO UPDATE.
+
+Rows that fail are reported, the rest are applied. The search index is
+kept in sync by its triggers; the barcode index holds serialized products
+and must be invalidated for updated_ids once the transaction commits.
+"""
+import time
+from datetime import datetime
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import dialect_insert
+from app.models.product import Category, Product
+from app.schemas.product import ProductImportError, ProductImportResult, ProductImportRow
+from app.services.ingest import iterate, validation_detail
+
+PRODUCT_IMPORT_CHUNK_SIZE = 1000
+
+# Product columns an import can set, with their value for a new product
+IMPORT_DEFAULTS: Dict[str, Any] = {
+    "barcode": None,
+    "name": None,
+    "description": None,
+    "price": None,
+    "cost": Product.cost.default.arg,
+    "tax_rate": Product.tax_rate.default.arg,
+    "category_id": None,
+    "unit": Product.unit.default.arg,
+    "image_url": None,
+    "is_active": Product.is_active.default.arg,
+    "is_featured": Product.is_featured.default.arg,
+    "allow_decimal_qty": Product.allow_decimal_qty.default.arg,
+}
+REQUIRED_FIELDS = ("name", "price", "category_id")
+
+_row_adapter = TypeAdapter(ProductImportRow)
+
+
+class ProductImport:
+    """Running totals of one catalog import"""
+
+    def __init__(self, category_ids: Dict[str, int]):
+        self.category_ids = category_ids  # slug -> id
+        self.known_category_ids: Set[int] = set(category_ids.values())
+        self.received = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.updated_ids: List[int] = []
+        self.errors: List[ProductImportError] = []
+        self.started_at = time.perf_counter()
+
+    def fail(self, row: int, sku: Optional[str], detail: str) -> None:
+        self.errors.append(ProductImportError(row=row, sku=sku, detail=detail))
+
+    def result(self) -> ProductImportResult:
+        seconds = time.perf_counter() - self.started_at
+        return ProductImportResult(
+            received=self.received,
+            created=self.created,
+            updated=self.updated,
+            unchanged=self.unchanged,
+            failed=len(self.errors),
+            errors=sorted(self.errors, key=lambda error: error.row),
+            seconds=round(seconds, 3),
+            rows_per_second=round(self.received / seconds, 1) if seconds else 0.0
+        )
+
+
+async def import_products(
+    db: AsyncSession,
+    rows: Union[Iterable[Any], AsyncIterable[Any]]
+) -> ProductImport:
+    """
+    Validate and upsert catalog rows (dicts) in the caller's transaction;
+    invalid and conflicting rows are reported, not raised
+    """
+    state = ProductImport(dict((await db.execute(select(Category.slug, Category.id))).all()))
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    async for raw in iterate(rows):
+        state.received += 1
+        try:
+            row = _row_adapter.validate_python(raw)
+        except ValidationError as e:
+            sku = raw.get("sku") if isinstance(raw, dict) else None
+            state.fail(state.received, sku if isinstance(sku, str) else None, validation_detail(e))
+            continue
+
+        fields = row.model_dump(exclude_unset=True)
+        slug = fields.pop("category", None)
+        if slug is not None:
+            if slug not in state.category_ids:
+                state.fail(state.received, row.sku, f"Categoría no encontrada: {slug}")
+                continue
+            fields["category_id"] = state.category_ids[slug]
+        elif fields.get("category_id") is not None and fields["category_id"] not in state.known_category_ids:
+            state.fail(state.received, row.sku, f"Categoría no encontrada: {fields['category_id']}")
+            continue
+
+        chunk.append((state.received, fields))
+        if len(chunk) >= PRODUCT_IMPORT_CHUNK_SIZE:
+            await _apply_chunk(db, state, chunk)
+            chunk = []
+    if chunk:
+        await _apply_chunk(db, state, chunk)
+    return state
+
+
+async def _apply_chunk(db: AsyncSession, state: ProductImport, chunk: List[Tuple[int, Dict[str, Any]]]) -> None:
+    # SKU -> merged fields and the rows merged into them
+    merged: Dict[str, Dict[str, Any]] = {}
+    numbers: Dict[str, List[int]] = {}
+    for number, fields in chunk:
+        sku = fields.pop("sku")
+        merged.setdefault(sku, {}).update(fields)
+        numbers.setdefault(sku, []).append(number)
+
+    barcodes = {fields["barcode"] for fields in merged.values() if fields.get("barcode")}
+    columns = [Product.id, Product.sku, *(getattr(Product, name) for name in IMPORT_DEFAULTS)]
+    condition = Product.sku.in_(list(merged))
+    if barcodes:
+        condition = or_(condition, Product.barcode.in_(list(barcodes)))
+    current: Dict[str, Dict[str, Any]] = {}
+    barcode_owners: Dict[str, str] = {}
+    for product in (await db.execute(select(*columns).where(condition))).all():
+        if product.sku in merged:
+            current[product.sku] = product._asdict()
+        if product.barcode:
+            barcode_owners[product.barcode] = product.sku
+
+    now = datetime.utcnow()
+    claimed: Dict[str, str] = {}  # barcode -> SKU of this chunk
+    upserts = []
+    for sku, fields in merged.items():
+        existing = current.get(sku)
+        values = {name: (existing or IMPORT_DEFAULTS)[name] for name in IMPORT_DEFAULTS}
+        values.update(fields)
+        barcode = values["barcode"]
+        error = None
+        if barcode and barcode_owners.get(barcode, sku) != sku:
+            error = f"El código de barras {barcode} ya pertenece al SKU {barcode_owners[barcode]}"
+        elif barcode and claimed.get(barcode, sku) != sku:
+            error = f"El código de barras {barcode} está repetido en el archivo (SKU {claimed[barcode]})"
+        elif existing is None and any(values[name] is None for name in REQUIRED_FIELDS):
+            missing = ", ".join(name for name in REQUIRED_FIELDS if values[name] is None)
+            error = f"Faltan campos para crear el producto: {missing}"
+        elif any(name in fields and fields[name] is None for name in REQUIRED_FIELDS):
+            error = "name, price y category no pueden quedar vacíos"
+        if error:
+            for number in numbers[sku]:
+                state.fail(number, sku, error)
+            continue
+
+        if barcode:
+            claimed[barcode] = sku
+        if existing is not None and all(existing[name] == values[name] for name in IMPORT_DEFAULTS):
+            state.unchanged += len(numbers[sku])
+            continue
+        upserts.append({"sku": sku, **values, "created_at": now, "updated_at": now})
+
+    if not upserts:
+        return
+
+    stmt = dialect_insert(db)(Product.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sku"],
+        set_={
+            **{name: getattr(stmt.excluded, name) for name in IMPORT_DEFAULTS},
+            "updated_at": stmt.excluded.updated_at,
+        }
+    ).returning(Product.id, Product.sku)
+    for product_id, sku in (await db.execute(stmt, upserts)).all():
+        if sku in current:
+            state.updated += len(numbers[sku])
+            state.updated_ids.append(product_id)
+        else:
+            state.created += len(numbers[sku])
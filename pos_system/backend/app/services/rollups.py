@@ -0,0 +1,267 @@
+"""
+Pre-aggregated sales totals.
+
+sales_rollups holds the count, revenue, tax and discounts of completed sales
+per hour and per day, broken down by branch, cashier and payment method.
+create_sale adds each sale to its two buckets and cancel_sale takes it out
+again, in the same transaction as the sale itself.
+
+A summary over a date range is answered from the largest buckets that fit
+entirely inside it (days, then hours at either end). Only the partial hours
+at the very edges of the range are aggregated from the sales table, which
+is a bounded amount of rows whatever the size of the history.
+
+Rollups are trusted once a full rebuild has run (python -m
+app.rebuild_rollups), which is also how existing sales are backfilled. Until
+then summaries aggregate the sales table directly.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, literal, union_all, text, String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import dialect_insert
+from app.models.sale import Sale, SaleStatus
+from app.models.rollup import SalesRollup, SalesRollupState
+
+GRANULARITIES = ("hour", "day")
+
+# Breakdown name -> (sales column, rollup column)
+GROUP_COLUMNS = {
+    "branch": (Sale.branch_id, SalesRollup.branch_id),
+    "cashier": (Sale.cashier_id, SalesRollup.cashier_id),
+    "payment_method": (Sale.payment_method, SalesRollup.payment_method),
+}
+
+_ready = False
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_ceil(value: datetime, granularity: str) -> datetime:
+    start = bucket_start(value, granularity)
+    if start == value:
+        return start
+    return start + (timedelta(hours=1) if granularity == "hour" else timedelta(days=1))
+
+
+def _bucket_expression(db: AsyncSession, granularity: str):
+    """SQL expression truncating sales.created_at to a bucket start"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return func.date_trunc(granularity, Sale.created_at)
+    # Same text layout SQLAlchemy uses to store DateTime on SQLite
+    fmt = "%Y-%m-%d %H:00:00.000000" if granularity == "hour" else "%Y-%m-%d 00:00:00.000000"
+    return func.strftime(fmt, Sale.created_at)
+
+
+async def record_sale(db: AsyncSession, sale: Sale, sign: int = 1) -> None:
+    """Add a completed sale to its hour and day buckets (sign=-1 removes it)"""
+    insert = dialect_insert(db)
+    rows = [
+        {
+            "granularity": granularity,
+            "bucket_start": bucket_start(sale.created_at, granularity),
+            "branch_id": sale.branch_id,
+            "cashier_id": sale.cashier_id,
+            "payment_method": sale.payment_method,
+            "sale_count": sign,
+            "total_revenue": sign * sale.total,
+            "total_tax": sign * sale.tax_amount,
+            "total_discounts": sign * (sale.discount_amount or 0),
+        }
+        for granularity in GRANULARITIES
+    ]
+    stmt = insert(SalesRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start", "branch_id", "cashier_id", "payment_method"],
+        set_={
+            "sale_count": SalesRollup.sale_count + stmt.excluded.sale_count,
+            "total_revenue": SalesRollup.total_revenue + stmt.excluded.total_revenue,
+            "total_tax": SalesRollup.total_tax + stmt.excluded.total_tax,
+            "total_discounts": SalesRollup.total_discounts + stmt.excluded.total_discounts,
+        }
+    )
+    await db.execute(stmt)
+
+
+async def remove_sale(db: AsyncSession, sale: Sale) -> None:
+    await record_sale(db, sale, sign=-1)
+
+
+async def rebuild_rollups(db: AsyncSession) -> int:
+    """
+    Recompute every bucket from the sales table. Runs in the caller's
+    transaction; returns the number of buckets written.
+    """
+    global _ready
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Sales being recorded wait for the rebuild instead of updating
+        # buckets that are about to be replaced
+        await db.execute(text("LOCK TABLE sales_rollups IN EXCLUSIVE MODE"))
+
+    await db.execute(delete(SalesRollup))
+
+    written = 0
+    for granularity in GRANULARITIES:
+        bucket = _bucket_expression(db, granularity)
+        source = (
+            select(
+                literal(granularity, String),
+                bucket,
+                Sale.branch_id,
+                Sale.cashier_id,
+                Sale.payment_method,
+                func.count(Sale.id),
+                func.sum(Sale.total),
+                func.sum(Sale.tax_amount),
+                func.coalesce(func.sum(Sale.discount_amount), 0),
+            )
+            .where(Sale.status == SaleStatus.COMPLETED)
+            .group_by(bucket, Sale.branch_id, Sale.cashier_id, Sale.payment_method)
+        )
+        result = await db.execute(
+            SalesRollup.__table__.insert().from_select(
+                [
+                    "granularity", "bucket_start", "branch_id", "cashier_id", "payment_method",
+                    "sale_count", "total_revenue", "total_tax", "total_discounts",
+                ],
+                source
+            )
+        )
+        written += max(result.rowcount, 0)
+
+    last_sale_id = await db.scalar(select(func.max(Sale.id)))
+    await db.execute(delete(SalesRollupState))
+    db.add(SalesRollupState(id=1, rebuilt_at=datetime.utcnow(), last_sale_id=last_sale_id))
+    await db.flush()
+
+    _ready = True
+    return written
+
+
+async def rollups_ready(db: AsyncSession) -> bool:
+    global _ready
+
+    if not _ready:
+        _ready = await db.scalar(select(SalesRollupState.id).limit(1)) is not None
+    return _ready
+
+
+def plan_segments(
+    date_from: Optional[datetime],
+    date_to: Optional[datetime]
+) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """
+    Split [date_from, date_to] into (source, start, end) half-open segments,
+    source being "sales", "hour" or "day". None means unbounded.
+    """
+    start = date_from
+    # date_to is inclusive; DateTime has microsecond resolution
+    end = date_to + timedelta(microseconds=1) if date_to else None
+
+    hour_start = _bucket_ceil(start, "hour") if start else None
+    hour_end = bucket_start(end, "hour") if end else None
+    if hour_start and hour_end and hour_start >= hour_end:
+        return [("sales", start, end)]
+
+    segments = []
+    if start and start < hour_start:
+        segments.append(("sales", start, hour_start))
+
+    day_start = _bucket_ceil(hour_start, "day") if hour_start else None
+    day_end = bucket_start(hour_end, "day") if hour_end else None
+    if day_start and day_end and day_start >= day_end:
+        segments.append(("hour", hour_start, hour_end))
+    else:
+        if hour_start and hour_start < day_start:
+            segments.append(("hour", hour_start, day_start))
+        segments.append(("day", day_start, day_end))
+        if hour_end and day_end < hour_end:
+            segments.append(("hour", day_end, hour_end))
+
+    if end and hour_end < end:
+        segments.append(("sales", hour_end, end))
+    return segments
+
+
+def _segment_query(
+    source: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    branch_id: Optional[int],
+    group_by: Optional[str]
+):
+    if source == "sales":
+        columns = [
+            func.count(Sale.id),
+            func.sum(Sale.total),
+            func.sum(Sale.tax_amount),
+            func.sum(Sale.discount_amount),
+        ]
+        query = select(*columns).where(Sale.status == SaleStatus.COMPLETED)
+        time_column, branch_column = Sale.created_at, Sale.branch_id
+        group_index = 0
+    else:
+        columns = [
+            func.sum(SalesRollup.sale_count),
+            func.sum(SalesRollup.total_revenue),
+            func.sum(SalesRollup.total_tax),
+            func.sum(SalesRollup.total_discounts),
+        ]
+        query = select(*columns).where(SalesRollup.granularity == source)
+        time_column, branch_column = SalesRollup.bucket_start, SalesRollup.branch_id
+        group_index = 1
+
+    if group_by:
+        group_column = GROUP_COLUMNS[group_by][group_index]
+        query = query.add_columns(group_column).group_by(group_column)
+    if branch_id:
+        query = query.where(branch_column == branch_id)
+    if start:
+        query = query.where(time_column >= start)
+    if end:
+        query = query.where(time_column < end)
+    return query
+
+
+async def summarize_sales(
+    db: AsyncSession,
+    branch_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    group_by: Optional[str] = None
+) -> Dict[object, Dict[str, float]]:
+    """
+    Totals of completed sales, keyed by the group_by column value (None when
+    not grouping). One statement whatever the number of segments.
+    """
+    if await rollups_ready(db):
+        segments = plan_segments(date_from, date_to)
+    else:
+        segments = [("sales", date_from, date_to + timedelta(microseconds=1) if date_to else None)]
+
+    queries = [_segment_query(source, start, end, branch_id, group_by) for source, start, end in segments]
+    result = await db.execute(union_all(*queries) if len(queries) > 1 else queries[0])
+
+    totals: Dict[object, Dict[str, float]] = {}
+    for row in result.all():
+        key = row[4] if group_by else None
+        entry = totals.setdefault(key, {"total_sales": 0, "total_revenue": 0.0, "total_tax": 0.0, "total_discounts": 0.0})
+        entry["total_sales"] += int(row[0] or 0)
+        entry["total_revenue"] += float(row[1] or 0)
+        entry["total_tax"] += float(row[2] or 0)
+        entry["total_discounts"] += float(row[3] or 0)
+
+    if group_by:
+        # Buckets emptied by cancellations
+        totals = {key: entry for key, entry in totals.items() if entry["total_sales"]}
+    for entry in totals.values():
+        entry["average_sale"] = entry["total_revenue"] / entry["total_sales"] if entry["total_sales"] else 0.0
+    return totals
@@ -0,0 +1,229 @@
+"""
+Product search.
+
+Replaces the leading-wildcard ILIKE over name, SKU and barcode, which no
+index can serve, with indexed matching on both backends:
+
+  - SQLite: an FTS5 table over product names (external content on
+    products, kept in sync by triggers) with the unicode61 tokenizer
+    folding case and accents.
+  - PostgreSQL: GIN indexes on the unaccented, lower-cased name, one
+    trigram index for "name starts with" and one tsvector index for word
+    prefixes. Expression indexes follow the products table by themselves.
+
+product_matches() returns the same (product_id, rank) subquery on both, to
+be joined to any products query. Lower rank is better:
+
+    0  SKU or barcode equals the term
+    1  SKU or barcode starts with the term
+    2  name starts with the term ("coca co" -> "Coca Cola 600ml")
+    3  every word of the term starts a word of the name ("cola 600")
+
+Matching ignores case and accents: "cafe" finds "Café". Words are matched
+by prefix, so results narrow as the user types.
+"""
+import logging
+import re
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, func, literal, literal_column, or_, select, text, union_all
+from sqlalchemy.sql import ColumnElement, Subquery
+
+from app.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+# FTS5 virtual table; created by install_search(), not by metadata.create_all
+product_search = Table(
+    "product_search",
+    MetaData(),
+    Column("rowid", Integer),
+    Column("name", Text),
+)
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        name, content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_search_insert AFTER INSERT ON products BEGIN
+        INSERT INTO product_search(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_search_delete AFTER DELETE ON products BEGIN
+        INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_search_update AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO product_search(product_search, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO product_search(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+]
+
+POSTGRESQL_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # unaccent() is only STABLE; indexes need an IMMUTABLE wrapper
+    """
+    CREATE OR REPLACE FUNCTION pos_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products
+    USING gin (pos_unaccent(lower(name)) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_products_name_tsv ON products
+    USING gin (to_tsvector('simple', pos_unaccent(lower(name))))
+    """,
+    # Code prefixes with LIKE 'abc%' under any collation
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_prefix ON products (sku text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_barcode_prefix ON products (barcode text_pattern_ops)",
+]
+
+# Dialect name -> whether the search structures are installed
+_installed = {}
+
+
+def normalize(value: str) -> str:
+    """Lower-case, strip accents and collapse whitespace"""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.lower().split())
+
+
+def search_words(term: str) -> List[str]:
+    return re.findall(r"\w+", normalize(term))
+
+
+async def install_search(conn) -> bool:
+    """Create the search table/indexes for the connection's backend if missing"""
+    dialect = conn.dialect.name
+    try:
+        if dialect == "sqlite":
+            result = await conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'")
+            )
+            exists = result.first() is not None
+            for statement in SQLITE_SEARCH_DDL:
+                await conn.execute(text(statement))
+            if not exists:
+                # Index the products that were there before the table
+                await conn.execute(text("INSERT INTO product_search(product_search) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            async with conn.begin_nested():
+                for statement in POSTGRESQL_SEARCH_DDL:
+                    await conn.execute(text(statement))
+        else:
+            _installed[dialect] = False
+            return False
+    except Exception as e:
+        # e.g. SQLite without FTS5 or no rights to create extensions:
+        # search keeps working, without indexes
+        logger.warning("Product search indexes not available on %s: %s", dialect, e)
+        _installed[dialect] = False
+        return False
+
+    _installed[dialect] = True
+    return True
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _starts_with(dialect: str, column, prefix: str) -> ColumnElement:
+    if dialect == "sqlite":
+        # SQLite's LIKE ignores case and cannot use the unique indexes;
+        # a range on the raw value can
+        return (column >= prefix) & (column < prefix + "\U0010ffff")
+    return column.like(_escape_like(prefix) + "%", escape="\\")
+
+
+def _code_matches(dialect: str, term: str):
+    """Tiers 0 and 1: SKU / barcode equal to or starting with the term"""
+    variants = sorted({term, term.upper()})
+    selects = []
+    for column in (Product.sku, Product.barcode):
+        selects.append(
+            select(Product.id.label("product_id"), literal(0).label("rank")).where(column.in_(variants))
+        )
+        selects.append(
+            select(Product.id.label("product_id"), literal(1).label("rank"))
+            .where(or_(*[_starts_with(dialect, column, variant) for variant in variants]))
+        )
+    return selects
+
+
+def _fts_quote(word: str) -> str:
+    return '"' + word.replace('"', '""') + '"'
+
+
+def _sqlite_name_matches(words: List[str]):
+    rowid = product_search.c.rowid
+    match = literal_column("product_search").op("MATCH")
+    return [
+        # Phrase at the start of the name, last word as a prefix
+        select(rowid.label("product_id"), literal(2).label("rank"))
+        .where(match("^" + _fts_quote(" ".join(words)) + " *")),
+        # Every word anywhere, each as a prefix
+        select(rowid.label("product_id"), literal(3).label("rank"))
+        .where(match(" ".join(_fts_quote(word) + " *" for word in words))),
+    ]
+
+
+def _postgresql_name_matches(term: str, words: List[str]):
+    # Inline constants so the planner matches the expression indexes
+    name = func.pos_unaccent(func.lower(Product.name))
+    simple = literal_column("'simple'::regconfig")
+    query = " & ".join(f"{word}:*" for word in words)
+    return [
+        select(Product.id.label("product_id"), literal(2).label("rank"))
+        .where(name.like(_escape_like(normalize(term)) + "%", escape="\\")),
+        select(Product.id.label("product_id"), literal(3).label("rank"))
+        .where(func.to_tsvector(simple, name).op("@@")(func.to_tsquery(simple, query))),
+    ]
+
+
+def _fallback_name_matches(words: List[str]):
+    # Unindexed: used only when install_search() could not run
+    name = func.lower(Product.name)
+    return [
+        select(Product.id.label("product_id"), literal(3).label("rank"))
+        .where(*[name.like(f"%{_escape_like(word)}%", escape="\\") for word in words])
+    ]
+
+
+def product_matches(dialect: str, term: str) -> Optional[Subquery]:
+    """
+    Subquery of (product_id, rank) for the products matching term, or None
+    for a blank term. Join it to a products query and order by rank.
+    """
+    term = term.strip()
+    if not term:
+        return None
+
+    selects = _code_matches(dialect, term)
+    words = search_words(term)
+    if words:
+        if not _installed.get(dialect):
+            selects += _fallback_name_matches(words)
+        elif dialect == "sqlite":
+            selects += _sqlite_name_matches(words)
+        else:
+            selects += _postgresql_name_matches(term, words)
+
+    matches = union_all(*selects).subquery("search_matches")
+    return (
+        select(matches.c.product_id, func.min(matches.c.rank).label("rank"))
+        .group_by(matches.c.product_id)
+        .subquery("product_matches")
+    )
@@ -0,0 +1,188 @@
+"""
+Stock reservation engine.
+
+Every stock write is a conditional UPDATE evaluated by the database, so
+concurrent tills in one branch can neither oversell nor overwrite each
+other's changes:
+
+    UPDATE branch_products SET stock = stock - :q
+    WHERE branch_id = :b AND product_id = :p AND stock >= :q
+
+A whole basket is written with one statement. Its rows are first locked in
+product_id order (SELECT ... FOR UPDATE where the backend supports it), so
+two baskets that share SKUs always take their locks in the same order and
+cannot deadlock. On SQLite the database-wide write lock serializes writers
+and the WHERE clause alone is the guard.
+
+Each function also appends what it changed to the movement ledger
+(app.services.stock_ledger) in the same transaction, so the column and
+the ledger never disagree, and reads the written rows back (RETURNING)
+for the low-stock tracker (app.services.low_stock). Products without a
+branch_products row are not stock-tracked and are left out. Failures
+raise InsufficientStockError; the caller's transaction must be rolled
+back (get_db does this when the error propagates).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.branch import BranchProduct
+from app.models.stock import MovementKind
+from app.services.low_stock import LEVEL_COLUMNS, stage_levels
+from app.services.stock_ledger import record_movements
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, product_id: int, requested: float, available: float):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Insufficient stock for product {product_id}: requested {requested}, available {available}"
+        )
+
+
+async def lock_stock(
+    db: AsyncSession,
+    branch_id: int,
+    product_ids: Iterable[int]
+) -> Dict[int, float]:
+    """Lock branch stock rows in product_id order and return their stock"""
+    result = await db.execute(
+        select(BranchProduct.product_id, BranchProduct.stock)
+        .where(
+            (BranchProduct.branch_id == branch_id) &
+            (BranchProduct.product_id.in_(list(product_ids)))
+        )
+        .order_by(BranchProduct.product_id)
+        .with_for_update()
+    )
+    return {product_id: stock for product_id, stock in result.all()}
+
+
+async def reserve_stock(
+    db: AsyncSession,
+    branch_id: int,
+    quantities: Dict[int, float],
+    sale_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> Dict[int, float]:
+    """
+    Take quantities (product_id -> quantity) sold in a sale from branch
+    stock, all or nothing. Returns the quantities that were taken from
+    tracked products.
+    """
+    if not quantities:
+        return {}
+
+    locked = await lock_stock(db, branch_id, quantities)
+    tracked = {product_id: quantities[product_id] for product_id in sorted(locked)}
+    if not tracked:
+        return {}
+
+    for product_id, quantity in tracked.items():
+        if locked[product_id] < quantity:
+            raise InsufficientStockError(product_id, quantity, locked[product_id])
+
+    amount = case(tracked, value=BranchProduct.product_id)
+    result = await db.execute(
+        update(BranchProduct)
+        .where(
+            (BranchProduct.branch_id == branch_id) &
+            (BranchProduct.product_id.in_(list(tracked))) &
+            (BranchProduct.stock >= amount)
+        )
+        .values(stock=BranchProduct.stock - amount)
+        .returning(*LEVEL_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    levels = result.all()
+
+    if len(levels) != len(tracked):
+        # Another writer got in between the read and the update (no row
+        # locks on SQLite): report the first product that is now short
+        current = await lock_stock(db, branch_id, tracked)
+        for product_id, quantity in tracked.items():
+            if current.get(product_id, 0) < quantity:
+                raise InsufficientStockError(product_id, quantity, current.get(product_id, 0))
+        product_id = next(iter(tracked))
+        raise InsufficientStockError(product_id, tracked[product_id], current.get(product_id, 0))
+
+    stage_levels(db, branch_id, levels)
+    await record_movements(
+        db, branch_id, MovementKind.SALE, {product_id: -quantity for product_id, quantity in tracked.items()},
+        sale_id=sale_id, user_id=user_id
+    )
+    return tracked
+
+
+async def release_stock(
+    db: AsyncSession,
+    branch_id: int,
+    quantities: Dict[int, float],
+    sale_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> Dict[int, float]:
+    """Return quantities (product_id -> quantity) of a cancelled sale to branch stock"""
+    if not quantities:
+        return {}
+
+    locked = await lock_stock(db, branch_id, quantities)
+    tracked = {product_id: quantities[product_id] for product_id in sorted(locked)}
+    if not tracked:
+        return {}
+
+    amount = case(tracked, value=BranchProduct.product_id)
+    result = await db.execute(
+        update(BranchProduct)
+        .where(
+            (BranchProduct.branch_id == branch_id) &
+            (BranchProduct.product_id.in_(list(tracked)))
+        )
+        .values(stock=BranchProduct.stock + amount)
+        .returning(*LEVEL_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    stage_levels(db, branch_id, result.all())
+    await record_movements(db, branch_id, MovementKind.CANCEL, tracked, sale_id=sale_id, user_id=user_id)
+    return tracked
+
+
+async def adjust_stock(
+    db: AsyncSession,
+    branch_id: int,
+    product_id: int,
+    delta: float,
+    user_id: Optional[int] = None
+) -> None:
+    """
+    Add (positive, a restock) or remove (negative, an adjustment) stock
+    without going below zero
+    """
+    values = {"stock": BranchProduct.stock + delta}
+    if delta > 0:
+        values["last_restock"] = datetime.utcnow()
+
+    result = await db.execute(
+        update(BranchProduct)
+        .where(
+            (BranchProduct.branch_id == branch_id) &
+            (BranchProduct.product_id == product_id) &
+            (BranchProduct.stock + delta >= 0)
+        )
+        .values(**values)
+        .returning(*LEVEL_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    levels = result.all()
+
+    if len(levels) != 1:
+        current = await lock_stock(db, branch_id, [product_id])
+        raise InsufficientStockError(product_id, -delta, current.get(product_id, 0))
+
+    stage_levels(db, branch_id, levels)
+
+    kind = MovementKind.RESTOCK if delta > 0 else MovementKind.ADJUSTMENT
+    await record_movements(db, branch_id, kind, {product_id: delta}, user_id=user_id)
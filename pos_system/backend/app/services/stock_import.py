@@ -0,0 +1,260 @@
+"""
+Bulk stock movements for one branch.
+
+A delivery receipt or a physical count arrives as thousands of rows of
+(product_id, delta or absolute stock, min/max, custom price). Instead of
+one PUT .../stock (select, update, commit, refresh) per SKU, the rows are
+applied in chunks of STOCK_IMPORT_CHUNK_SIZE within the caller's single
+transaction, with a fixed number of statements per chunk:
+
+  1. the chunk's stock rows are read and locked in product_id order (the
+     same order as sales, so the two cannot deadlock), plus one lookup of
+     the products the branch does not stock yet;
+  2. rows are folded per product in order, in memory, against that
+     snapshot; a row that is invalid, names an unknown product or would
+     leave stock below zero is reported and skipped, the rest still apply;
+  3. the outcome is written with two upserts on (branch_id, product_id),
+     each one statement run over all the chunk's products: absolute stock
+     is set as such, deltas are added by the database (stock = stock +
+     delta, guarded by stock + delta >= 0) so a sale committed meanwhile
+     is never overwritten.
+
+Both are recorded in the movement ledger (app.services.stock_ledger) in the
+same transaction: an absolute stock as an adjustment of the difference with
+the stock as it is when written (computed by the database, just before
+the upsert; a count that matches is recorded as a zero adjustment), a
+delta as a restock or an adjustment once its upsert went through. The
+rows written are read back for the low-stock tracker.
+
+Products seen for the first time in the branch get a new stock row. A
+product whose delta no longer fits when written (possible on SQLite,
+which has no row locks) has all its rows of that chunk reported.
+
+Rows come from a JSON body or a CSV stream (app.services.ingest) with a
+header naming StockMovementRow's fields.
+"""
+from datetime import datetime
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Tuple, Union
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import bindparam, func, insert as core_insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import dialect_insert
+from app.models.branch import BranchProduct
+from app.models.product import Product
+from app.models.stock import MovementKind, StockMovement
+from app.schemas.branch import StockMovementError, StockMovementResult, StockMovementRow
+from app.services.ingest import iterate, validation_detail
+from app.services.low_stock import LEVEL_COLUMNS, stage_levels
+from app.services.stock_ledger import record_movements
+
+STOCK_IMPORT_CHUNK_SIZE = 1000
+
+_row_adapter = TypeAdapter(StockMovementRow)
+
+# Stock row settings a movement can change, with their value for a new row
+SETTINGS_DEFAULTS = {
+    "min_stock": BranchProduct.min_stock.default.arg,
+    "max_stock": BranchProduct.max_stock.default.arg,
+    "custom_price": None,
+    "is_available": True,
+}
+
+
+class StockImport:
+    """Running totals of one bulk movement request"""
+
+    def __init__(self, branch_id: int, user_id: Optional[int] = None):
+        self.branch_id = branch_id
+        self.user_id = user_id
+        self.received = 0
+        self.applied = 0
+        self.created = 0
+        self.errors: List[StockMovementError] = []
+
+    def fail(self, row: int, product_id: Optional[int], detail: str) -> None:
+        self.errors.append(StockMovementError(row=row, product_id=product_id, detail=detail))
+
+    def result(self) -> StockMovementResult:
+        return StockMovementResult(
+            received=self.received,
+            applied=self.applied,
+            created=self.created,
+            failed=len(self.errors),
+            errors=sorted(self.errors, key=lambda error: error.row)
+        )
+
+
+async def import_stock_movements(
+    db: AsyncSession,
+    branch_id: int,
+    rows: Union[Iterable[Any], AsyncIterable[Any]],
+    user_id: Optional[int] = None
+) -> StockMovementResult:
+    """
+    Validate and apply movement rows (dicts) to a branch's stock in the
+    caller's transaction; invalid rows are reported, not raised
+    """
+    state = StockImport(branch_id, user_id)
+    chunk: List[Tuple[int, StockMovementRow]] = []
+    async for raw in iterate(rows):
+        state.received += 1
+        try:
+            movement = _row_adapter.validate_python(raw)
+        except ValidationError as e:
+            product_id = raw.get("product_id") if isinstance(raw, dict) else None
+            state.fail(state.received, product_id if isinstance(product_id, int) else None, validation_detail(e))
+            continue
+        chunk.append((state.received, movement))
+        if len(chunk) >= STOCK_IMPORT_CHUNK_SIZE:
+            await _apply_chunk(db, state, chunk)
+            chunk = []
+    if chunk:
+        await _apply_chunk(db, state, chunk)
+    return state.result()
+
+
+async def _apply_chunk(db: AsyncSession, state: StockImport, chunk: List[Tuple[int, StockMovementRow]]) -> None:
+    branch_id = state.branch_id
+    product_ids = sorted({movement.product_id for _, movement in chunk})
+    result = await db.execute(
+        select(
+            BranchProduct.product_id, BranchProduct.stock, BranchProduct.last_restock,
+            *(getattr(BranchProduct, name) for name in SETTINGS_DEFAULTS)
+        )
+        .where((BranchProduct.branch_id == branch_id) & (BranchProduct.product_id.in_(product_ids)))
+        .order_by(BranchProduct.product_id)
+        .with_for_update()
+    )
+    current = {row.product_id: row._asdict() for row in result.all()}
+    missing = [product_id for product_id in product_ids if product_id not in current]
+    known = set((await db.execute(select(Product.id).where(Product.id.in_(missing)))).scalars()) if missing else set()
+
+    # product_id -> snapshot stock, running values and the rows folded into them
+    products: Dict[int, Dict[str, Any]] = {}
+    for number, movement in chunk:
+        product_id = movement.product_id
+        if movement.delta is not None and movement.stock is not None:
+            state.fail(number, product_id, "Indica delta o stock, no ambos")
+            continue
+        if product_id not in current and product_id not in known:
+            state.fail(number, product_id, "Producto no encontrado")
+            continue
+
+        entry = products.get(product_id)
+        if entry is None:
+            snapshot = current.get(product_id) or {"stock": 0.0, "last_restock": None, **SETTINGS_DEFAULTS}
+            entry = products[product_id] = {
+                **snapshot, "snapshot": snapshot["stock"], "absolute": False, "new": product_id not in current, "rows": []
+            }
+
+        stock = movement.stock if movement.stock is not None else entry["stock"] + (movement.delta or 0)
+        if stock < 0:
+            state.fail(number, product_id, f"El stock no puede ser negativo (disponible: {entry['stock']:g})")
+            continue
+        values = {
+            name: getattr(movement, name) if getattr(movement, name) is not None else entry[name]
+            for name in SETTINGS_DEFAULTS
+        }
+        if values["min_stock"] > values["max_stock"]:
+            state.fail(number, product_id, "El stock mínimo no puede ser mayor que el máximo")
+            continue
+
+        entry.update(values, stock=stock)
+        entry["absolute"] = entry["absolute"] or movement.stock is not None
+        entry["rows"].append(number)
+
+    if not any(entry["rows"] for entry in products.values()):
+        return
+
+    now = datetime.utcnow()
+    absolute_rows = []
+    delta_rows = []
+    for product_id, entry in products.items():
+        if not entry["rows"]:
+            continue
+        row = {
+            "branch_id": branch_id,
+            "product_id": product_id,
+            # Absolute: the final stock; delta: what to add to the stock as it is when written
+            "stock": entry["stock"] if entry["absolute"] else entry["stock"] - entry["snapshot"],
+            "last_restock": now if entry["stock"] > entry["snapshot"] else entry["last_restock"],
+            "updated_at": now,
+            **{name: entry[name] for name in SETTINGS_DEFAULTS},
+        }
+        (absolute_rows if entry["absolute"] else delta_rows).append(row)
+
+    if absolute_rows:
+        await db.execute(_count_movements(), [
+            {
+                "m_branch_id": branch_id,
+                "m_product_id": row["product_id"],
+                "m_stock": row["stock"],
+                "m_user_id": state.user_id,
+                "m_created_at": now,
+            }
+            for row in absolute_rows
+        ])
+
+    insert = dialect_insert(db)
+    written = set()
+    for rows, absolute in ((absolute_rows, True), (delta_rows, False)):
+        if not rows:
+            continue
+        stmt = insert(BranchProduct.__table__)
+        stock = stmt.excluded.stock if absolute else BranchProduct.stock + stmt.excluded.stock
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["branch_id", "product_id"],
+            set_={
+                "stock": stock,
+                "last_restock": stmt.excluded.last_restock,
+                "updated_at": stmt.excluded.updated_at,
+                **{name: getattr(stmt.excluded, name) for name in SETTINGS_DEFAULTS},
+            },
+            where=None if absolute else stock >= 0
+        ).returning(*LEVEL_COLUMNS)
+        levels = (await db.execute(stmt, rows)).all()
+        written.update(product_id for product_id, *_ in levels)
+        stage_levels(db, branch_id, levels)
+
+    for kind, added in ((MovementKind.RESTOCK, True), (MovementKind.ADJUSTMENT, False)):
+        await record_movements(
+            db, branch_id, kind,
+            {
+                row["product_id"]: row["stock"]
+                for row in delta_rows
+                if row["product_id"] in written and (row["stock"] > 0) == added
+            },
+            user_id=state.user_id
+        )
+
+    for product_id, entry in products.items():
+        if not entry["rows"]:
+            continue
+        if product_id in written:
+            state.applied += len(entry["rows"])
+            state.created += entry["new"]
+        else:
+            # Sold in between (no row locks on SQLite): the delta no longer fits
+            for number in entry["rows"]:
+                state.fail(number, product_id, "El stock no puede ser negativo")
+
+
+def _count_movements():
+    """
+    Ledger INSERT of absolute stock rows: the difference between the new
+    stock and the current one (none yet: 0), read by the statement itself
+    """
+    current = select(BranchProduct.stock).where(
+        (BranchProduct.branch_id == bindparam("m_branch_id")) &
+        (BranchProduct.product_id == bindparam("m_product_id"))
+    ).scalar_subquery()
+    return core_insert(StockMovement.__table__).values(
+        branch_id=bindparam("m_branch_id"),
+        product_id=bindparam("m_product_id"),
+        kind=MovementKind.ADJUSTMENT,
+        quantity=bindparam("m_stock") - func.coalesce(current, 0),
+        user_id=bindparam("m_user_id"),
+        created_at=bindparam("m_created_at")
+    )
@@ -0,0 +1,176 @@
+"""
+Stock movement ledger.
+
+Every change to branch_products.stock is also appended to stock_movements
+(sale, cancel, restock, adjustment; signed quantity) by the same function
+and in the same transaction that updates the column (app.services.stock,
+app.services.stock_import), so the column is always the ledger's running
+sum. Movements are never updated or deleted.
+
+Stock at a past time T is the latest per-branch snapshot taken at or
+before T plus the movements between the snapshot and T: one indexed
+lookup and one aggregate over at most a snapshot interval of movements,
+whatever the length of the history. Snapshots are taken every
+STOCK_SNAPSHOT_INTERVAL_HOURS by python -m app.snapshot_stock, each one
+from the previous plus its tail. They stop STOCK_SNAPSHOT_SETTLE_SECONDS
+short of now, so a transaction that stamped its movements but had not
+committed yet is not left out of a snapshot.
+
+A branch's first snapshot is its opening balance (empty for a new
+branch, the stock column for one that predates the ledger). Stock before
+it is unknown and raises NoStockHistoryError.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.branch import Branch, BranchProduct
+from app.models.stock import MovementKind, StockMovement, StockSnapshot, StockSnapshotItem
+
+
+class NoStockHistoryError(Exception):
+    def __init__(self, branch_id: int, at: datetime):
+        self.branch_id = branch_id
+        self.at = at
+        super().__init__(f"No stock history for branch {branch_id} at {at}")
+
+
+async def record_movements(
+    db: AsyncSession,
+    branch_id: int,
+    kind: MovementKind,
+    quantities: Dict[int, float],
+    sale_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> None:
+    """Append signed quantities (product_id -> quantity) to the ledger with one statement"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "branch_id": branch_id,
+            "product_id": product_id,
+            "kind": kind,
+            "quantity": quantity,
+            "sale_id": sale_id,
+            "user_id": user_id,
+            "created_at": now,
+        }
+        for product_id, quantity in quantities.items()
+        if quantity
+    ]
+    if rows:
+        await db.execute(insert(StockMovement), rows)
+
+
+async def _snapshot_before(db: AsyncSession, branch_id: int, at: datetime):
+    """(id, taken_at) of the branch's latest snapshot at or before at, or None"""
+    result = await db.execute(
+        select(StockSnapshot.id, StockSnapshot.taken_at)
+        .where((StockSnapshot.branch_id == branch_id) & (StockSnapshot.taken_at <= at))
+        .order_by(StockSnapshot.taken_at.desc())
+        .limit(1)
+    )
+    return result.first()
+
+
+async def stock_at(
+    db: AsyncSession,
+    branch_id: int,
+    at: datetime,
+    product_ids: Optional[Iterable[int]] = None
+) -> Dict[int, float]:
+    """
+    Stock of a branch's products (all, or product_ids) at a past time:
+    product_id -> stock, leaving out products that never had any
+    """
+    snapshot = await _snapshot_before(db, branch_id, at)
+    if snapshot is None:
+        raise NoStockHistoryError(branch_id, at)
+
+    items = select(StockSnapshotItem.product_id, StockSnapshotItem.stock.label("quantity")).where(
+        StockSnapshotItem.snapshot_id == snapshot.id
+    )
+    tail = select(StockMovement.product_id, StockMovement.quantity).where(
+        (StockMovement.branch_id == branch_id) &
+        (StockMovement.created_at > snapshot.taken_at) &
+        (StockMovement.created_at <= at)
+    )
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        items = items.where(StockSnapshotItem.product_id.in_(product_ids))
+        tail = tail.where(StockMovement.product_id.in_(product_ids))
+
+    stock = union_all(items, tail).subquery()
+    result = await db.execute(
+        select(stock.c.product_id, func.sum(stock.c.quantity)).group_by(stock.c.product_id)
+    )
+    return dict(result.all())
+
+
+async def take_snapshot(db: AsyncSession, branch_id: int, at: datetime) -> int:
+    """
+    Snapshot a branch's stock as of at (not in the future of any
+    uncommitted movement) and return its id. The first snapshot of a branch
+    is its opening balance: the stock column minus the movements after at.
+    """
+    previous = await _snapshot_before(db, branch_id, at)
+    if previous is not None and previous.taken_at == at:
+        return previous.id
+
+    if previous is not None:
+        stock = await stock_at(db, branch_id, at)
+    else:
+        later = await db.execute(
+            select(StockSnapshot.id).where((StockSnapshot.branch_id == branch_id) & (StockSnapshot.taken_at > at)).limit(1)
+        )
+        if later.first() is not None:
+            raise NoStockHistoryError(branch_id, at)
+        current = select(BranchProduct.product_id, BranchProduct.stock.label("quantity")).where(
+            BranchProduct.branch_id == branch_id
+        )
+        since = select(StockMovement.product_id, -StockMovement.quantity).where(
+            (StockMovement.branch_id == branch_id) & (StockMovement.created_at > at)
+        )
+        opening = union_all(current, since).subquery()
+        stock = dict((await db.execute(
+            select(opening.c.product_id, func.sum(opening.c.quantity)).group_by(opening.c.product_id)
+        )).all())
+
+    snapshot_id = (await db.execute(
+        insert(StockSnapshot).values(branch_id=branch_id, taken_at=at).returning(StockSnapshot.id)
+    )).scalar_one()
+    items = [
+        {"snapshot_id": snapshot_id, "product_id": product_id, "stock": quantity}
+        for product_id, quantity in stock.items()
+        if quantity
+    ]
+    if items:
+        await db.execute(insert(StockSnapshotItem), items)
+    return snapshot_id
+
+
+async def take_due_snapshots(db: AsyncSession, now: Optional[datetime] = None) -> List[int]:
+    """
+    Snapshot every branch whose latest snapshot is older than
+    STOCK_SNAPSHOT_INTERVAL_HOURS, or that has none; returns their ids
+    """
+    at = (now or datetime.utcnow()) - timedelta(seconds=settings.STOCK_SNAPSHOT_SETTLE_SECONDS)
+    due_before = at - timedelta(hours=settings.STOCK_SNAPSHOT_INTERVAL_HOURS)
+    latest = (
+        select(StockSnapshot.branch_id, func.max(StockSnapshot.taken_at).label("taken_at"))
+        .group_by(StockSnapshot.branch_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(Branch.id)
+        .outerjoin(latest, latest.c.branch_id == Branch.id)
+        .where((latest.c.taken_at.is_(None)) | (latest.c.taken_at <= due_before))
+        .order_by(Branch.id)
+    )
+    branch_ids = list(result.scalars())
+    for branch_id in branch_ids:
+        await take_snapshot(db, branch_id, at)
+    return branch_ids